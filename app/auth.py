@@ -1,18 +1,216 @@
+import asyncio
+import functools
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional
 from jose import JWTError, jwt
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from .database import get_db, get_user_by_email, verify_password, User
+from .database import get_db, get_user_by_email, verify_and_update_password, User
+from .processing_pool import PoolBusyError
+
+logger = logging.getLogger(__name__)
 
 # JWT settings
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
+# Also put the user id in new tokens, so cache misses load users by primary key
+JWT_INCLUDE_USER_ID = os.getenv("JWT_INCLUDE_USER_ID", "true").lower() == "true"
 
 security = HTTPBearer()
+# Lets anonymous requests through to optional_get_current_user
+optional_security = HTTPBearer(auto_error=False)
+
+
+class UserCache:
+    """
+    Authenticated users by email, so a request with a valid token does not
+    query the users table
+    Entries live for AUTH_CACHE_TTL_SECONDS, which bounds how long another
+    worker's change to a user can go unseen; the least recently used users
+    are dropped once AUTH_CACHE_SIZE are cached. Cached users are detached
+    from their session and shared between requests, so they are read-only.
+    """
+
+    def __init__(self):
+        self.ttl = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+        self.max_size = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+        self._users: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, email: str) -> Optional[User]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._users.get(email)
+            if cached is not None and cached[1] > now:
+                self._users.move_to_end(email)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+            return None
+
+    def put(self, user: User) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._users[user.email] = (user, time.monotonic() + self.ttl)
+            self._users.move_to_end(user.email)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, email: str) -> None:
+        """Drop a user whose row changed, e.g. on login or signup"""
+        with self._lock:
+            if self._users.pop(email, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Hit and miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+user_cache = UserCache()
+
+
+class PasswordPool:
+    """
+    Runs bcrypt hashing and verification in a small dedicated thread pool
+    bcrypt is deliberately slow, so it never runs on the event loop, and a
+    login storm can only occupy PASSWORD_HASH_WORKERS threads, leaving the
+    remaining CPU to statement processing. Once that many checks are running
+    and PASSWORD_HASH_QUEUE_SIZE more are waiting, new ones are refused with
+    PoolBusyError.
+    """
+
+    def __init__(self):
+        self.max_workers = int(
+            os.getenv("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 1) // 2))
+        )
+        self.max_queue = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))
+        self.retry_after = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a call that hashes or verifies a password in the pool"""
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            logger.warning(f"Password hashing queue full ({self.in_flight} in flight)")
+            raise PoolBusyError(self.retry_after)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="password"
+            )
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._executor, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        return result
+
+    def stats(self) -> dict:
+        """Queue depth counters"""
+        return {
+            "workers": self.max_workers,
+            "queue_size": self.max_queue,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        """Stop the hashing threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordPool()
+
+
+class RateLimiter:
+    """
+    Token bucket per client: burst attempts at once, then rate_per_minute
+    A rate of 0 turns limiting off. Buckets are kept for the most recently
+    seen max_clients only. Counts are per process, so with several workers
+    a client gets the allowance of each.
+    """
+
+    def __init__(self, rate_per_minute: int, burst: int, max_clients: int = 10000):
+        self.rate = rate_per_minute / 60
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def acquire(self, client: str) -> int:
+        """Take one attempt; returns 0 when allowed, else seconds to wait"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[client] = (tokens, now)
+                self.limited += 1
+                return max(1, int((1 - tokens) / self.rate + 0.999))
+            self._buckets[client] = (tokens - 1, now)
+            self._buckets.move_to_end(client)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return 0
+
+
+login_limiter = RateLimiter(
+    rate_per_minute=int(os.getenv("LOGIN_RATE_PER_MINUTE", "20")),
+    burst=int(os.getenv("LOGIN_RATE_BURST", "10")),
+)
+
+
+def limit_login_rate(request: Request) -> None:
+    """Dependency refusing login and signup attempts over the client's rate"""
+    client = request.client.host if request.client else "unknown"
+    retry_after = login_limiter.acquire(client)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please retry shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def token_claims(user: User) -> dict:
+    """Claims identifying a user in their access token"""
+    claims = {"sub": user.email}
+    if JWT_INCLUDE_USER_ID:
+        claims["uid"] = user.id
+    return claims
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -28,22 +226,26 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def verify_token(token: str):
-    """Verify and decode JWT token"""
+def decode_token(token: str) -> dict:
+    """Verify a JWT token and return its claims"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token"
-            )
-        return email
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
+    if payload.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
+        )
+    return payload
+
+
+def verify_token(token: str):
+    """Verify and decode JWT token"""
+    return decode_token(token)["sub"]
 
 
 def authenticate_user(db: Session, email: str, password: str):
@@ -51,8 +253,13 @@ def authenticate_user(db: Session, email: str, password: str):
     user = get_user_by_email(db, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was made; the caller's commit
+        # stores the hash at the current work factor
+        user.hashed_password = new_hash
     return user
 
 
@@ -62,21 +269,34 @@ async def get_current_user(
 ) -> User:
     """Get current authenticated user"""
     token = credentials.credentials
-    email = verify_token(token)
-    user = get_user_by_email(db, email)
+    claims = decode_token(token)
+    email = claims["sub"]
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+
+    # Tokens issued before user ids were added only carry the email
+    user = db.get(User, claims["uid"]) if "uid" in claims else None
+    if user is None or user.email != email:
+        user = get_user_by_email(db, email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
+    # Detached so commits in this request's session do not expire it
+    db.expunge(user)
+    user_cache.put(user)
     return user
 
 
 async def optional_get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
     db: Session = Depends(get_db)
 ) -> Optional[User]:
     """Get current user if authenticated, None otherwise"""
+    if credentials is None:
+        return None
     try:
         return await get_current_user(credentials, db)
     except HTTPException:
@@ -0,0 +1,140 @@
+import asyncio
+import io
+import logging
+import os
+import zipfile
+from typing import TYPE_CHECKING, Union
+
+from .processing_pool import PoolBusyError, processing_pool
+from .profiling import pipeline_profile
+
+# pandas and the parsers are loaded with the first batch, not on import
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_EXTENSIONS = (".xlsx", ".xls", ".xlsm")
+SOURCE_COLUMN = "Source File"
+
+
+class BatchResult:
+    """Processed statements of a batch and the files that failed"""
+
+    def __init__(self):
+        self.results: list[tuple[str, "pd.DataFrame"]] = []
+        self.failures: list[dict[str, str]] = []
+
+    def merged_csv(self) -> bytes:
+        """All results as one CSV, with the statement each row came from"""
+        import pandas as pd
+
+        frames = [
+            df.assign(**{SOURCE_COLUMN: name})[[SOURCE_COLUMN, *df.columns]]
+            for name, df in self.results
+        ]
+        return pd.concat(frames, ignore_index=True).to_csv(index=False).encode()
+
+    def zipped_csvs(self) -> bytes:
+        """One CSV per statement inside a zip, plus failures.csv if any failed"""
+        import pandas as pd
+
+        buffer = io.BytesIO()
+        used = set()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, df in self.results:
+                # Statements from different zips may share a name
+                stem = os.path.splitext(os.path.basename(name))[0]
+                member, n = f"{stem}.csv", 1
+                while member in used:
+                    n += 1
+                    member = f"{stem}_{n}.csv"
+                used.add(member)
+                archive.writestr(member, df.to_csv(index=False))
+            if self.failures:
+                archive.writestr(
+                    "failures.csv", pd.DataFrame(self.failures).to_csv(index=False)
+                )
+        return buffer.getvalue()
+
+
+def expand_upload(
+    filename: str, content: bytes, max_size: int, max_files: int, max_total_size: int
+) -> list[tuple[str, bytes]]:
+    """
+    Split an uploaded zip into the statements it contains
+    Other uploads are returned as they are. The member count and sizes come
+    from the zip's directory and are checked before any member is extracted,
+    so a zip bomb is never inflated
+    """
+    if not filename.lower().endswith(".zip"):
+        return [(filename, content)]
+
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        raise ValueError(f"{filename} is not a valid zip file")
+
+    with archive:
+        members = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(STATEMENT_EXTENSIONS)
+        ]
+        if len(members) > max_files:
+            raise ValueError(f"{filename} holds more than {max_files} statements")
+        total_size = 0
+        for info in members:
+            if info.file_size > max_size:
+                raise ValueError(
+                    f"{info.filename} in {filename} must be less than "
+                    f"{max_size // (1024 * 1024)}MB"
+                )
+            total_size += info.file_size
+            if total_size > max_total_size:
+                raise ValueError(
+                    f"Statements in {filename} must be less than "
+                    f"{max_total_size // (1024 * 1024)}MB in total"
+                )
+        return [(f"{filename}/{info.filename}", archive.read(info)) for info in members]
+
+
+async def process_batch(statements: list[tuple[str, Union[bytes, str]]]) -> BatchResult:
+    """
+    Process statements in parallel across the processing pool
+    Each statement is given as its bytes or the path of a spooled upload
+    A statement that fails is recorded and does not stop the others
+    """
+    from .toll_processor import process_to_frame
+
+    batch = BatchResult()
+    # One statement per worker at a time, leaving queue slots for other requests
+    slots = asyncio.Semaphore(processing_pool.max_workers)
+
+    async def process_one(name: str, content: Union[bytes, str]):
+        async with slots:
+            while True:
+                try:
+                    return await processing_pool.run_cpu(
+                        process_to_frame,
+                        content,
+                        filename=os.path.basename(name),
+                        streaming=name.lower().endswith((".xlsx", ".xlsm")),
+                    )
+                except PoolBusyError as e:
+                    await asyncio.sleep(e.retry_after)
+
+    outcomes = await asyncio.gather(
+        *(process_one(name, content) for name, content in statements),
+        return_exceptions=True,
+    )
+    for (name, _), outcome in zip(statements, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Batch file {name} failed: {str(outcome)}")
+            batch.failures.append({"file": name, "error": str(outcome)})
+        else:
+            df, report = outcome
+            pipeline_profile.record(report)
+            batch.results.append((name, df))
+    return batch
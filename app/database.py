@@ -1,10 +1,25 @@
+import functools
 import os
 import sqlite3
+import time
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from typing import Optional
+from sqlalchemy import (
+    create_engine,
+    event,
+    or_,
+    Column,
+    Index,
+    Integer,
+    String,
+    DateTime,
+    Text,
+    JSON,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from passlib.context import CryptContext
+
+from .metrics import db_query_duration, metrics, statement_kind
 
 # Database setup
 DATABASE_URL = "sqlite:///./toll_automation.db"  # Local development
@@ -13,14 +28,97 @@ if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
     if os.environ.get("DATABASE_URL"):
         DATABASE_URL = os.environ.get("DATABASE_URL")
     else:
-        DATABASE_URL = "sqlite:///tmp/toll_automation.db"
+        # Absolute path, where DatabaseBackup ships it from
+        DATABASE_URL = "sqlite:////tmp/toll_automation.db"
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# SQLite tuning, applied to every new connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "16384"))
+if SQLITE_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"Invalid SQLITE_SYNCHRONOUS '{SQLITE_SYNCHRONOUS}'")
+
+# Connection pool; the app, the I/O threads and background tasks all check
+# out sessions, so the pool is sized for them rather than left at 5
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+
+
+def _engine_options() -> dict:
+    """create_engine arguments for the configured database"""
+    if IS_SQLITE:
+        return {
+            # Sessions are handed between the event loop and I/O threads
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        # Managed databases drop idle connections; recycle them first and
+        # check each one on checkout so a dropped one is replaced, not failed
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+engine = create_engine(DATABASE_URL, **_engine_options())
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers run alongside a writer and keeps commits to an
+        # append, so incremental backups only see the pages that changed
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Wait for a competing writer instead of failing with "database is locked"
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        # In WAL mode NORMAL only syncs at checkpoints: a commit stays atomic
+        # and durable across crashes of the app, without an fsync per commit
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.close()
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    context.metrics_started = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    db_query_duration.observe(
+        time.perf_counter() - context.metrics_started, statement_kind(statement)
+    )
+    metrics.start_flusher()
+
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt work factor; hashes made with another one are upgraded on login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+
+# Password hashing; passlib and its bcrypt backend are loaded by the first
+# request that checks a password rather than on every cold start
+@functools.lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+    )
 
 
 class User(Base):
@@ -35,20 +133,51 @@ class User(Base):
 
 class UploadHistory(Base):
     __tablename__ = "upload_history"
+    __table_args__ = (
+        # History pages: a user's uploads, newest first
+        Index("ix_upload_history_user_date", "user_id", "upload_date"),
+        # Download ownership checks
+        Index("ix_upload_history_user_processed", "user_id", "processed_filename"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False)
     original_filename = Column(String, nullable=False)
-    processed_filename = Column(String, nullable=False)
+    # Indexed for result cache lookups
+    processed_filename = Column(String, nullable=False, index=True)
     file_size = Column(Integer, nullable=False)
     upload_date = Column(DateTime, default=datetime.utcnow)
     s3_key = Column(String)  # S3 path for processed file
+
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+
+    id = Column(String, primary_key=True, index=True)  # uuid
+    user_id = Column(Integer)  # None for anonymous submissions
+    original_filename = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=False)
+    # queued, running, completed or failed
+    status = Column(String, nullable=False, default="queued")
+    stage = Column(String)  # pipeline stage currently running
+    progress = Column(JSON, default=dict)  # seconds taken by each finished stage
+    processed_filename = Column(String)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
     
 
 def create_tables():
     """Create database tables"""
     Base.metadata.create_all(bind=engine)
 
+    # create_all skips tables that already exist, so indexes added since a
+    # database was created are built here
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
 
 def get_db():
     """Database dependency for FastAPI"""
@@ -61,12 +190,19 @@ def get_db():
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    """Verify password against hash, with a new hash if the work factor changed"""
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Hash password"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def get_user_by_email(db, email: str):
@@ -93,6 +229,39 @@ def get_user_uploads(db, user_id: int, days: int = 30, limit: int = 10):
     ).order_by(UploadHistory.upload_date.desc()).limit(limit).all()
 
 
+def get_user_uploads_page(
+    db, user_id: int, limit: int = 20, before: Optional[tuple[datetime, int]] = None
+):
+    """
+    One page of a user's upload history, newest first
+    before is the (upload_date, id) of the last upload of the previous page;
+    seeking past it uses the (user_id, upload_date) index however deep the page
+    """
+    query = db.query(UploadHistory).filter(UploadHistory.user_id == user_id)
+    if before is not None:
+        upload_date, upload_id = before
+        # Written as a range on upload_date so SQLite can seek the index to it
+        query = query.filter(
+            UploadHistory.upload_date <= upload_date,
+            or_(UploadHistory.upload_date < upload_date, UploadHistory.id < upload_id),
+        )
+    return query.order_by(
+        UploadHistory.upload_date.desc(), UploadHistory.id.desc()
+    ).limit(limit).all()
+
+
+def find_upload(db, processed_filename: str, user_id: Optional[int] = None):
+    """Get an upload of a processed file, by any user unless user_id is given"""
+    query = db.query(UploadHistory).filter(
+        UploadHistory.processed_filename == processed_filename
+    )
+    if user_id is not None:
+        query = query.filter(UploadHistory.user_id == user_id)
+    else:
+        query = query.filter(UploadHistory.s3_key.isnot(None))
+    return query.first()
+
+
 def add_upload_record(db, user_id: int, original_filename: str, 
                      processed_filename: str, file_size: int, s3_key: str = None):
     """Add upload record to history"""
@@ -106,4 +275,39 @@ def add_upload_record(db, user_id: int, original_filename: str,
     db.add(record)
     db.commit()
     db.refresh(record)
-    return record
\ No newline at end of file
+    return record
+
+
+def create_job(db, job_id: str, user_id: Optional[int], original_filename: str,
+               file_size: int):
+    """Add a queued processing job"""
+    job = ProcessingJob(
+        id=job_id,
+        user_id=user_id,
+        original_filename=original_filename,
+        file_size=file_size,
+        status="queued",
+        progress={}
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db, job_id: str):
+    """Get processing job by id"""
+    return db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+
+
+def update_job(db, job_id: str, **fields):
+    """Update fields of a processing job"""
+    db.query(ProcessingJob).filter(ProcessingJob.id == job_id).update(fields)
+    db.commit()
+
+
+def get_unfinished_jobs(db):
+    """Get jobs that were queued or running, oldest first"""
+    return db.query(ProcessingJob).filter(
+        ProcessingJob.status.in_(["queued", "running"])
+    ).order_by(ProcessingJob.created_at).all()
@@ -1,53 +1,331 @@
-import boto3
+import hashlib
 import os
 import logging
-from botocore.exceptions import ClientError
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+import zlib
+from typing import Optional
+from botocore.exceptions import BotoCoreError, ClientError
+
+from .s3_service import s3_service
 
 logger = logging.getLogger(__name__)
 
+# Page delta layout: magic, page size, page count after the delta, number of
+# pages, base digest and resulting digest, then (page number, page) records
+DELTA_MAGIC = b"TADELTA1"
+DELTA_HEADER = struct.Struct(">8sIII32s32s")
+PAGE_NUMBER = struct.Struct(">I")
+
+
+def _page_hashes(data: bytes, page_size: int) -> list[bytes]:
+    return [
+        hashlib.blake2b(data[offset:offset + page_size], digest_size=16).digest()
+        for offset in range(0, len(data), page_size)
+    ]
+
+
+def _digest(hashes: list[bytes]) -> bytes:
+    """Identity of a database image, compared along the delta chain"""
+    return hashlib.sha256(b"".join(hashes)).digest()
+
+
 class DatabaseBackup:
+    """
+    Incremental S3 backup of the Lambda SQLite database
+    Backups are grouped in generations: a compressed snapshot followed by
+    numbered page deltas holding only the pages changed since the previous
+    backup, so shipping costs are proportional to the change. Every delta
+    names the digest of the image it applies to and restore stops at the
+    first delta that does not chain, so backups from concurrent Lambdas never
+    corrupt each other; a writer that finds its chain taken over starts a new
+    generation. After DB_SNAPSHOT_INTERVAL deltas, or once the deltas outweigh
+    the snapshot, a new generation is started, which bounds restore time.
+    """
+
     def __init__(self):
-        self.s3_client = boto3.client('s3', region_name='us-east-1')
-        self.bucket_name = 'toll-automation-processed-files'
+        # Shares the app's S3 client, connection pool and transfer settings
+        self.s3 = s3_service
+        self.bucket_name = s3_service.bucket_name
+        # Whole-file backups of earlier versions
         self.db_backup_key = 'database/toll_automation.db'
+        self.generations_prefix = 'database/generations/'
         self.local_db_path = '/tmp/toll_automation.db'
-    
+        self.snapshot_interval = int(os.environ.get('DB_SNAPSHOT_INTERVAL', '50'))
+        self.generations_kept = int(os.environ.get('DB_GENERATIONS_KEPT', '2'))
+
+        self._lock = threading.Lock()
+        self._generation: Optional[str] = None
+        self._sequence = 0
+        self._page_size = 0
+        self._hashes: list[bytes] = []
+        self._snapshot_bytes = 0
+        self._delta_bytes = 0
+        self._last_stamp = 0
+
     def restore_database_from_s3(self) -> bool:
         """Restore database from S3 backup on Lambda startup"""
         if not os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
             return False  # Only for Lambda environment
-        
-        try:
-            # Check if backup exists in S3
-            self.s3_client.head_object(Bucket=self.bucket_name, Key=self.db_backup_key)
-            
-            # Download database backup
-            self.s3_client.download_file(self.bucket_name, self.db_backup_key, self.local_db_path)
-            logger.info(f"Database restored from S3: {self.db_backup_key}")
-            return True
-        except ClientError as e:
-            if e.response['Error']['Code'] == '404':
-                logger.info("No database backup found in S3, starting with fresh database")
-            else:
+
+        with self._lock:
+            try:
+                generation = self._latest_generation()
+                if generation is None:
+                    return self._restore_whole_file()
+
+                image = bytearray(self._get(f"{generation}snapshot.db"))
+                page_size = self._image_page_size(image)
+                hashes = _page_hashes(image, page_size)
+                sequence = 0
+                for key in self._delta_keys(generation):
+                    delta = self._get(key)
+                    if not self._apply_delta(image, hashes, delta):
+                        logger.warning(
+                            f"Database delta {key} does not chain, "
+                            "restoring up to the previous one"
+                        )
+                        break
+                    sequence = int(key.rsplit("/", 1)[1].split(".")[0])
+
+                self._write_local(bytes(image))
+                self._generation = generation
+                self._sequence = sequence
+                self._page_size = page_size
+                self._hashes = hashes
+                self._snapshot_bytes = len(image)
+                self._delta_bytes = 0
+                logger.info(
+                    f"Database restored from S3: {generation} up to delta {sequence}"
+                )
+                return True
+            except (ClientError, BotoCoreError, ValueError, zlib.error) as e:
                 logger.error(f"Failed to restore database from S3: {e}")
-            return False
-    
+                return False
+
     def backup_database_to_s3(self) -> bool:
-        """Backup current database to S3"""
+        """Ship the pages changed since the last backup to S3"""
         if not os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
             return False  # Only for Lambda environment
-        
+
         if not os.path.exists(self.local_db_path):
             logger.warning("No local database file found to backup")
             return False
-        
+
+        with self._lock:
+            try:
+                image = self._consistent_image()
+                page_size = self._image_page_size(image)
+                hashes = _page_hashes(image, page_size)
+
+                if self._needs_snapshot(page_size):
+                    return self._ship_snapshot(image, page_size, hashes)
+
+                changed = [
+                    page for page, page_hash in enumerate(hashes)
+                    if page >= len(self._hashes) or self._hashes[page] != page_hash
+                ]
+                if not changed and len(hashes) == len(self._hashes):
+                    return True
+
+                # Another writer extended this generation: our image no
+                # longer follows its chain, so start a fresh one
+                if self._delta_keys(self._generation, after=self._sequence):
+                    logger.warning(
+                        f"Database generation {self._generation} was continued "
+                        "elsewhere, starting a new one"
+                    )
+                    return self._ship_snapshot(image, page_size, hashes)
+
+                delta = self._encode_delta(image, page_size, hashes, changed)
+                sequence = self._sequence + 1
+                self._put(f"{self._generation}{sequence:010d}.delta", delta)
+                self._sequence = sequence
+                self._hashes = hashes
+                self._delta_bytes += len(delta)
+                logger.info(
+                    f"Database backed up to S3: {len(changed)} changed pages "
+                    f"as delta {sequence}"
+                )
+                return True
+            except (ClientError, BotoCoreError, sqlite3.Error) as e:
+                logger.error(f"Failed to backup database to S3: {e}")
+                return False
+
+    def _consistent_image(self) -> bytes:
+        """A transactionally consistent copy of the database, WAL included"""
+        source = sqlite3.connect(self.local_db_path)
+        copy = sqlite3.connect(":memory:")
+        try:
+            source.backup(copy)
+            return copy.serialize()
+        finally:
+            copy.close()
+            source.close()
+
+    def _image_page_size(self, image: bytes) -> int:
+        if len(image) < 100 or not image.startswith(b"SQLite format 3\0"):
+            raise ValueError("Backup is not an SQLite database")
+        page_size = struct.unpack(">H", image[16:18])[0]
+        return 65536 if page_size == 1 else page_size
+
+    def _needs_snapshot(self, page_size: int) -> bool:
+        return (
+            self._generation is None
+            or page_size != self._page_size
+            or self._sequence >= self.snapshot_interval
+            or self._delta_bytes > self._snapshot_bytes
+        )
+
+    def _ship_snapshot(self, image: bytes, page_size: int, hashes: list[bytes]) -> bool:
+        """Start a new generation from a full snapshot and drop old ones"""
+        generation = self._new_generation()
+        snapshot = zlib.compress(image)
+        self._put(f"{generation}snapshot.db", snapshot)
+        self._generation = generation
+        self._sequence = 0
+        self._page_size = page_size
+        self._hashes = hashes
+        self._snapshot_bytes = len(snapshot)
+        self._delta_bytes = 0
+        logger.info(f"Database snapshot backed up to S3: {generation}")
+        self._drop_old_generations()
+        return True
+
+    def _new_generation(self) -> str:
+        """
+        A generation prefix that sorts after every one started before it
+        Fixed-width nanosecond time, bumped past the last one this process
+        used so generations from the same instant keep their order; the
+        random suffix keeps names from different Lambdas apart
+        """
+        stamp = max(time.time_ns(), self._last_stamp + 1)
+        self._last_stamp = stamp
+        return f"{self.generations_prefix}{stamp:020d}-{uuid.uuid4().hex[:8]}/"
+
+    def _encode_delta(
+        self, image: bytes, page_size: int, hashes: list[bytes], changed: list[int]
+    ) -> bytes:
+        parts = [
+            DELTA_HEADER.pack(
+                DELTA_MAGIC, page_size, len(hashes), len(changed),
+                _digest(self._hashes), _digest(hashes)
+            )
+        ]
+        for page in changed:
+            parts.append(PAGE_NUMBER.pack(page))
+            parts.append(image[page * page_size:(page + 1) * page_size])
+        return zlib.compress(b"".join(parts))
+
+    def _apply_delta(self, image: bytearray, hashes: list[bytes], delta: bytes) -> bool:
+        """Apply a delta in place; False when it was not made from this image"""
+        header = DELTA_HEADER.unpack_from(delta)
+        magic, page_size, page_count, changed, base, result = header
+        if magic != DELTA_MAGIC or base != _digest(hashes):
+            return False
+
+        del image[page_count * page_size:]
+        image.extend(bytes(page_count * page_size - len(image)))
+        del hashes[page_count:]
+        hashes.extend([b""] * (page_count - len(hashes)))
+
+        offset = DELTA_HEADER.size
+        for _ in range(changed):
+            page = PAGE_NUMBER.unpack_from(delta, offset)[0]
+            offset += PAGE_NUMBER.size
+            content = delta[offset:offset + page_size]
+            offset += page_size
+            image[page * page_size:(page + 1) * page_size] = content
+            hashes[page] = hashlib.blake2b(content, digest_size=16).digest()
+        return _digest(hashes) == result
+
+    def _write_local(self, image: bytes) -> None:
+        temp_path = f"{self.local_db_path}.restore"
+        with open(temp_path, "wb") as f:
+            f.write(image)
+        # A WAL left from before the restore belongs to another image
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(self.local_db_path + suffix):
+                os.remove(self.local_db_path + suffix)
+        os.replace(temp_path, self.local_db_path)
+
+    def _restore_whole_file(self) -> bool:
+        """Restore a whole-file backup written before incremental backups"""
         try:
-            self.s3_client.upload_file(self.local_db_path, self.bucket_name, self.db_backup_key)
-            logger.info(f"Database backed up to S3: {self.db_backup_key}")
+            # Check if backup exists in S3
+            self.s3.s3_client.head_object(
+                Bucket=self.bucket_name, Key=self.db_backup_key
+            )
+
+            # Download database backup
+            self.s3.s3_client.download_file(
+                self.bucket_name, self.db_backup_key, self.local_db_path,
+                Config=self.s3.transfer_config
+            )
+            logger.info(f"Database restored from S3: {self.db_backup_key}")
             return True
         except ClientError as e:
-            logger.error(f"Failed to backup database to S3: {e}")
+            if e.response['Error']['Code'] == '404':
+                logger.info("No database backup found in S3, starting with fresh database")
+            else:
+                logger.error(f"Failed to restore database from S3: {e}")
             return False
 
+    def _generations(self) -> list[str]:
+        """Generation prefixes holding a snapshot, oldest first"""
+        paginator = self.s3.s3_client.get_paginator("list_objects_v2")
+        generations = []
+        for page in paginator.paginate(
+            Bucket=self.bucket_name, Prefix=self.generations_prefix, Delimiter="/"
+        ):
+            generations.extend(
+                prefix["Prefix"] for prefix in page.get("CommonPrefixes", [])
+            )
+        return sorted(generations)
+
+    def _latest_generation(self) -> Optional[str]:
+        for generation in reversed(self._generations()):
+            try:
+                self.s3.s3_client.head_object(
+                    Bucket=self.bucket_name, Key=f"{generation}snapshot.db"
+                )
+                return generation
+            except ClientError:
+                # Snapshot still being written, or lost
+                continue
+        return None
+
+    def _delta_keys(self, generation: str, after: int = 0) -> list[str]:
+        paginator = self.s3.s3_client.get_paginator("list_objects_v2")
+        keys = []
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=generation):
+            keys.extend(
+                item["Key"] for item in page.get("Contents", [])
+                if item["Key"].endswith(".delta")
+                and int(item["Key"].rsplit("/", 1)[1].split(".")[0]) > after
+            )
+        return sorted(keys)
+
+    def _drop_old_generations(self) -> None:
+        for generation in self._generations()[:-self.generations_kept]:
+            paginator = self.s3.s3_client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=generation):
+                objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+                if objects:
+                    self.s3.s3_client.delete_objects(
+                        Bucket=self.bucket_name, Delete={"Objects": objects}
+                    )
+            logger.info(f"Dropped old database generation {generation}")
+
+    def _get(self, key: str) -> bytes:
+        body = self.s3.s3_client.get_object(Bucket=self.bucket_name, Key=key)["Body"]
+        return zlib.decompress(body.read())
+
+    def _put(self, key: str, data: bytes) -> None:
+        self.s3.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=data)
+
 # Create singleton instance
-db_backup = DatabaseBackup()
\ No newline at end of file
+db_backup = DatabaseBackup()
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from datetime import datetime
+from typing import Optional
+
+from .database import (
+    SessionLocal,
+    add_upload_record,
+    engine,
+    get_job,
+    get_unfinished_jobs,
+    update_job,
+)
+from .processing_pool import PoolBusyError, processing_pool
+from .profiling import pipeline_profile
+from .s3_service import s3_service
+
+logger = logging.getLogger(__name__)
+
+
+def run_processing_job(
+    job_id: str, input_path: str, output_path: str, filename: str, streaming: bool
+) -> dict:
+    """
+    Process a job's statement in the processing pool, recording the running
+    stage and the time taken by each finished stage on the job row
+    Returns the profile report of the run
+    """
+    from .toll_processor import process_to_csv
+
+    if multiprocessing.parent_process() is not None:
+        # Connections inherited from the parent process must not be reused
+        engine.dispose(close=False)
+
+    db = SessionLocal()
+    try:
+        update_job(db, job_id, status="running", started_at=datetime.utcnow())
+        progress = {}
+
+        def on_stage(stage: str, seconds: Optional[float]) -> None:
+            if seconds is None:
+                update_job(db, job_id, stage=stage)
+            else:
+                progress[stage] = round(seconds, 3)
+                update_job(db, job_id, progress=dict(progress))
+
+        return process_to_csv(
+            input_path,
+            output_path,
+            filename=filename,
+            streaming=streaming,
+            on_stage=on_stage,
+        )
+    finally:
+        db.close()
+
+
+class JobRunner:
+    """
+    Runs submitted processing jobs in the background
+    Job state lives in the processing_jobs table and the uploaded statement is
+    kept in jobs_dir until the job finishes, so queued jobs are picked up again
+    by resume() after a restart. Jobs need a long-running server: Lambda
+    freezes the process once the response is sent.
+    """
+
+    def __init__(self, jobs_dir: str, output_dir: str):
+        self.jobs_dir = jobs_dir
+        self.output_dir = output_dir
+        self.concurrency = int(os.environ.get("JOB_CONCURRENCY", "2"))
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: list[asyncio.Task] = []
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def input_path(self, job_id: str, filename: str) -> str:
+        """Where a job's uploaded statement is kept until it is processed"""
+        return os.path.join(self.jobs_dir, f"{job_id}_{os.path.basename(filename)}")
+
+    def output_filename(self, job_id: str) -> str:
+        return f"processed_toll_data_{job_id}.csv"
+
+    def _ensure_started(self) -> None:
+        # Workers belong to the running event loop; start them on first use
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._workers = [
+                loop.create_task(self._work(self._queue))
+                for _ in range(self.concurrency)
+            ]
+
+    async def submit(self, job_id: str) -> None:
+        """Queue a job that has been created and whose input has been saved"""
+        self._ensure_started()
+        await self._queue.put(job_id)
+
+    async def resume(self) -> None:
+        """Queue jobs left unfinished by a previous run"""
+        db = SessionLocal()
+        try:
+            jobs = await processing_pool.run_io(get_unfinished_jobs, db)
+            for job in jobs:
+                if os.path.exists(self.input_path(job.id, job.original_filename)):
+                    await processing_pool.run_io(
+                        update_job, db, job.id, status="queued"
+                    )
+                    await self.submit(job.id)
+                else:
+                    await processing_pool.run_io(
+                        update_job, db, job.id, status="failed",
+                        error="Input was lost before the job could run",
+                        finished_at=datetime.utcnow()
+                    )
+            if jobs:
+                logger.info(f"Resumed {len(jobs)} unfinished processing jobs")
+        finally:
+            db.close()
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Processing job {job_id} crashed: {str(e)}")
+            finally:
+                queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        db = SessionLocal()
+        job = None
+        # The input is kept until the job completes or fails, so a job
+        # cancelled by shutdown is run again by resume()
+        finished = False
+        try:
+            job = await processing_pool.run_io(get_job, db, job_id)
+            if job is None:
+                return
+
+            input_path = self.input_path(job.id, job.original_filename)
+            output_filename = self.output_filename(job.id)
+            output_path = os.path.join(self.output_dir, output_filename)
+            streaming = job.original_filename.lower().endswith((".xlsx", ".xlsm"))
+
+            while True:
+                try:
+                    report = await processing_pool.run_cpu(
+                        run_processing_job,
+                        job.id,
+                        input_path,
+                        output_path,
+                        job.original_filename,
+                        streaming,
+                    )
+                    pipeline_profile.record(report)
+                    break
+                except PoolBusyError as e:
+                    # Jobs wait for capacity instead of failing
+                    await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    logger.error(f"Processing job {job.id} failed: {str(e)}")
+                    await processing_pool.run_io(
+                        update_job, db, job.id, status="failed", error=str(e),
+                        finished_at=datetime.utcnow()
+                    )
+                    finished = True
+                    return
+
+            # Upload to S3 and record the upload like /process-toll-data does,
+            # so the result is fetched through /download
+            if job.user_id is not None:
+                s3_key = s3_service.generate_s3_key(job.user_id, output_filename)
+                if not await s3_service.upload_file_async(output_path, s3_key):
+                    s3_key = None
+                await processing_pool.run_io(
+                    add_upload_record,
+                    db=db,
+                    user_id=job.user_id,
+                    original_filename=job.original_filename,
+                    processed_filename=output_filename,
+                    file_size=job.file_size,
+                    s3_key=s3_key
+                )
+
+            await processing_pool.run_io(
+                update_job, db, job.id, status="completed", stage=None,
+                processed_filename=output_filename, finished_at=datetime.utcnow()
+            )
+            finished = True
+        finally:
+            db.close()
+            if finished and os.path.exists(input_path):
+                os.remove(input_path)
+
+    def stats(self) -> dict:
+        """Queue depth of the background job runner"""
+        return {
+            "workers": self.concurrency,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    def shutdown(self) -> None:
+        """Stop the background workers; unfinished jobs resume on next start"""
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._loop = None
+        self._queue = None
@@ -1,19 +1,80 @@
+import base64
+import json
 import os
+import shutil
+import tempfile
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional
-
-from fastapi import FastAPI, File, HTTPException, UploadFile, Depends
-from fastapi.responses import FileResponse
+from typing import BinaryIO, Optional, Union
+
+from fastapi import (
+    BackgroundTasks,
+    FastAPI,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    UploadFile,
+    Depends,
+)
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
-from .toll_processor import TollProcessor
-from .database import get_db, create_tables, create_user, get_user_by_email, add_upload_record, get_user_uploads, User, UploadHistory
-from .auth import authenticate_user, create_access_token, get_current_user, optional_get_current_user
-from .models import UserCreate, UserLogin, Token, UserResponse, UserDashboard, UploadHistoryResponse
+from .database import (
+    SessionLocal,
+    get_db,
+    create_tables,
+    create_user,
+    get_user_by_email,
+    add_upload_record,
+    find_upload,
+    get_user_uploads,
+    get_user_uploads_page,
+    create_job,
+    get_job,
+    User,
+    UploadHistory,
+)
+from .auth import (
+    authenticate_user,
+    create_access_token,
+    get_current_user,
+    limit_login_rate,
+    login_limiter,
+    optional_get_current_user,
+    password_pool,
+    token_claims,
+    user_cache,
+)
+from .models import (
+    UserCreate,
+    UserLogin,
+    Token,
+    UserResponse,
+    UserDashboard,
+    UploadHistoryPage,
+    UploadHistoryResponse,
+    JobResponse,
+    JobSubmitResponse,
+)
 from .s3_service import s3_service
 from .database_backup import db_backup
+from .processing_pool import PoolBusyError, processing_pool
+from .profiling import pipeline_profile, profile_header, server_timing
+from .metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    MetricsMiddleware,
+    metrics,
+    upload_size,
+)
+from .jobs import JobRunner
+from .result_cache import ResultCache
+from .batch import expand_upload, process_batch
+from .result_stream import stream_result, stream_s3_object
+from .output_formats import (
+    OUTPUT_FORMATS, OutputFormat, convert_result, format_for_filename, negotiate_format
+)
 
 app = FastAPI(
     title="Toll Automation API",
@@ -30,6 +91,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Initialize database tables on startup
 @app.on_event("startup")
 def startup_event():
@@ -39,35 +103,81 @@ def startup_event():
     
     create_tables()
 
+# Pick up processing jobs left unfinished by a previous run
+@app.on_event("startup")
+async def resume_jobs():
+    if not os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        await job_runner.resume()
+
 # Backup database on shutdown (for Lambda)
 @app.on_event("shutdown")
 def shutdown_event():
     if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
         db_backup.backup_database_to_s3()
 
+    job_runner.shutdown()
+    processing_pool.shutdown()
+    password_pool.shutdown()
+    s3_service.shutdown()
+    metrics.flush()
+
 # Use local directories for development, /tmp for Lambda
+# Uploads are parsed from memory, so only processed output goes to disk;
+# statements read with streaming are spooled to the system temp directory
 import os
 if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
     # Running in Lambda
-    UPLOAD_DIR = "/tmp/uploads"
     OUTPUT_DIR = "/tmp/outputs"
+    JOBS_DIR = "/tmp/jobs"
 else:
     # Running locally
-    UPLOAD_DIR = "uploads"
     OUTPUT_DIR = "outputs"
+    JOBS_DIR = "jobs"
 
 # Ensure directories exist
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Background runner for /jobs; keeps queued uploads in JOBS_DIR
+job_runner = JobRunner(JOBS_DIR, OUTPUT_DIR)
+
+# Processed CSVs in OUTPUT_DIR double as a cache of results by upload content
+result_cache = ResultCache(OUTPUT_DIR)
+
+# Upload size limits; streamed .xlsx processing keeps memory bounded, so it
+# accepts much larger statements
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+MAX_STREAMING_UPLOAD_SIZE = (
+    int(os.environ.get("MAX_STREAMING_UPLOAD_MB", "200")) * 1024 * 1024
+)
+MAX_BATCH_FILES = int(os.environ.get("MAX_BATCH_FILES", "100"))
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_MB", "1024")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# An upload as read by read_upload: its bytes, or the path of its spooled copy
+Statement = Union[bytes, str]
+
 
 @app.get("/api")
 async def root() -> dict[str, str]:
     return {"message": "Toll Automation API is running"}
 
 
+async def run_password_check(fn, *args):
+    """Run password hashing work in the password pool, off the event loop"""
+    try:
+        return await password_pool.run(fn, *args)
+    except PoolBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
 # Authentication endpoints
-@app.post("/auth/signup", response_model=Token)
+@app.post(
+    "/auth/signup", response_model=Token, dependencies=[Depends(limit_login_rate)]
+)
 async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
@@ -78,14 +188,17 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    user = create_user(db, user_data.email, user_data.password)
+    user = await run_password_check(
+        create_user, db, user_data.email, user_data.password
+    )
+    user_cache.invalidate(user.email)
     
     # Create access token
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data=token_claims(user))
     
     # Backup database after user creation (in Lambda)
     if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
-        db_backup.backup_database_to_s3()
+        await s3_service.call(db_backup.backup_database_to_s3)
     
     return {
         "access_token": access_token,
@@ -94,22 +207,25 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     }
 
 
-@app.post("/auth/login", response_model=Token)
+@app.post("/auth/login", response_model=Token, dependencies=[Depends(limit_login_rate)])
 async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     """Login user"""
-    user = authenticate_user(db, user_data.email, user_data.password)
+    user = await run_password_check(
+        authenticate_user, db, user_data.email, user_data.password
+    )
     if not user:
         raise HTTPException(
             status_code=401,
             detail="Invalid email or password"
         )
     
-    # Update last login time
+    # Update last login time, along with a hash upgraded to the current work factor
     user.last_login = datetime.utcnow()
     db.commit()
+    user_cache.invalidate(user.email)
     
     # Create access token
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data=token_claims(user))
     
     return {
         "access_token": access_token,
@@ -124,10 +240,28 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
 
+def with_download_urls(uploads: list[UploadHistory]) -> list[UploadHistoryResponse]:
+    """Uploads with presigned download links, signed in one pass"""
+    download_urls = s3_service.generate_presigned_urls(
+        [upload.s3_key for upload in uploads if upload.s3_key], expiration=3600
+    )
+    return [
+        UploadHistoryResponse.model_validate(upload).model_copy(
+            update={"download_url": download_urls.get(upload.s3_key)}
+        )
+        for upload in uploads
+    ]
+
+
 @app.get("/dashboard", response_model=UserDashboard)
 async def get_user_dashboard(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get user dashboard with upload history (last 30 days, max 10 items)"""
-    recent_uploads = get_user_uploads(db, current_user.id, days=30, limit=10)
+    recent_uploads = await processing_pool.run_io(
+        get_user_uploads, db, current_user.id, days=30, limit=10
+    )
+
+    # Sign every download link in one pass so the UI needs no extra requests
+    recent_uploads = with_download_urls(recent_uploads)
     
     return {
         "user": current_user,
@@ -136,20 +270,86 @@ async def get_user_dashboard(current_user: User = Depends(get_current_user), db:
     }
 
 
+def encode_history_cursor(upload: UploadHistory) -> str:
+    """Opaque cursor pointing just past an upload in the history order"""
+    position = f"{upload.upload_date.isoformat()}|{upload.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    upload_date, upload_id = base64.urlsafe_b64decode(padded).decode().split("|")
+    return datetime.fromisoformat(upload_date), int(upload_id)
+
+
+@app.get("/history", response_model=UploadHistoryPage)
+async def get_upload_history(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the user's whole upload history, newest first, a page at a time
+    Pass the next_cursor of a page to get the one after it
+    """
+    before = None
+    if cursor:
+        try:
+            before = decode_history_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # One extra row tells whether another page follows
+    uploads = await processing_pool.run_io(
+        get_user_uploads_page, db, current_user.id, limit=limit + 1, before=before
+    )
+    next_cursor = (
+        encode_history_cursor(uploads[limit - 1]) if len(uploads) > limit else None
+    )
+    return {"uploads": with_download_urls(uploads[:limit]), "next_cursor": next_cursor}
+
+
 @app.get("/health")
 async def health_check() -> dict[str, str]:
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 
-@app.post("/process-toll-data")
-async def process_toll_data(
-    file: UploadFile = File(...), 
-    current_user: Optional[User] = Depends(optional_get_current_user),
-    db: Session = Depends(get_db)
-) -> FileResponse:
+def spool_upload(upload: BinaryIO, max_size: int, suffix: str) -> tuple[str, int]:
     """
-    Process toll transaction data from uploaded Excel file
-    Returns processed data as CSV download
+    Copy an upload to a temporary file in chunks, stopping once it is over
+    max_size, so it is never held in memory whole; the file keeps the
+    upload's extension, which openpyxl checks
+    Returns the file's path and the upload's size
+    """
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            while size <= max_size:
+                chunk = upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                spool.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, size
+
+
+def discard_upload(statement: Statement) -> None:
+    """Remove the spooled copy of an upload, if it has one"""
+    if isinstance(statement, str) and os.path.exists(statement):
+        os.remove(statement)
+
+
+async def read_upload(file: UploadFile, streaming: bool) -> tuple[Statement, int, bool]:
+    """
+    Validate an uploaded statement and read it
+    Statements read with streaming are spooled to a temporary file, whose path
+    is returned instead of the content for the caller to discard_upload
+    Returns the statement, its size and whether streaming applies to it
     """
     # File validation
     if not file.filename or not file.filename.endswith((".xlsx", ".xls", ".xlsm")):
@@ -157,122 +357,620 @@ async def process_toll_data(
             status_code=400, detail="File must be an Excel file (.xlsx, .xls, .xlsm)"
         )
 
-    # Read file content and check size (5MB limit)
-    content = await file.read()
-    if len(content) > 5 * 1024 * 1024:  # 5MB limit
-        raise HTTPException(status_code=413, detail="File size must be less than 5MB")
+    # Streaming only applies to the zip-based formats openpyxl can read
+    streaming = streaming and file.filename.lower().endswith((".xlsx", ".xlsm"))
+    max_size = MAX_STREAMING_UPLOAD_SIZE if streaming else MAX_UPLOAD_SIZE
 
-    try:
-        # Generate unique filename for processing
-        file_id = str(uuid.uuid4())
-        temp_filename = f"{file_id}_{file.filename}"
-        upload_path = os.path.join(UPLOAD_DIR, temp_filename)
-
-        # Save uploaded file (content already read for size check)
-        with open(upload_path, "wb") as f:
-            f.write(content)
-        
-        # Verify file was written correctly
-        if not os.path.exists(upload_path) or os.path.getsize(upload_path) != len(content):
-            raise HTTPException(status_code=500, detail="File upload verification failed")
-        
-        # Additional file format validation
-        if not file.filename.lower().endswith(('.xlsx', '.xls', '.xlsm')):
-            raise HTTPException(status_code=400, detail="Invalid file format. Please upload .xlsx, .xls, or .xlsm files only")
+    # Read file content and check size
+    if streaming:
+        await file.seek(0)
+        statement, size = await processing_pool.run_io(
+            spool_upload, file.file, max_size, os.path.splitext(file.filename)[1]
+        )
+    else:
+        statement = await file.read()
+        size = len(statement)
+    upload_size.observe(size, "statement")
+    if size > max_size:
+        discard_upload(statement)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File size must be less than {max_size // (1024 * 1024)}MB",
+        )
+    return statement, size, streaming
 
-        # Process the file
-        processor = TollProcessor()
-        processed_data = processor.process_excel_file(upload_path)
 
-        # Save as CSV
-        output_filename = f"processed_toll_data_{file_id}.csv"
-        output_path = os.path.join(OUTPUT_DIR, output_filename)
-        processed_data.to_csv(output_path, index=False)
+def profile_headers(report: dict) -> dict[str, str]:
+    """Response headers carrying a processing profile report"""
+    return {
+        "Server-Timing": server_timing(report),
+        "X-Processing-Profile": profile_header(report),
+    }
 
-        # Upload to S3 if user is authenticated
-        s3_key = None
-        if current_user:
-            s3_key = s3_service.generate_s3_key(current_user.id, output_filename)
-            if s3_service.upload_file(output_path, s3_key):
-                # Track upload in database with S3 key
-                add_upload_record(
+
+async def stream_toll_data(
+    statement: Statement,
+    file_size: int,
+    original_filename: str,
+    output_filename: str,
+    download_filename: str,
+    streaming: bool,
+    fmt: OutputFormat,
+    cached: Optional[str],
+    current_user: Optional[User],
+    db: Session,
+    profile: bool = False
+) -> StreamingResponse:
+    """
+    Stream a result to the client without writing it to OUTPUT_DIR
+    A result cached in S3 is relayed from there; otherwise the statement is
+    processed and the result is uploaded to S3 while it is sent
+    """
+    headers = {"Content-Disposition": f'attachment; filename="{download_filename}"'}
+
+    if cached == "s3":
+        existing = await processing_pool.run_io(find_upload, db, output_filename)
+        body = await s3_service.call(s3_service.open_file, existing.s3_key)
+        if body is not None:
+            if current_user and not await processing_pool.run_io(
+                find_upload, db, output_filename, current_user.id
+            ):
+                await processing_pool.run_io(
+                    add_upload_record,
                     db=db,
                     user_id=current_user.id,
-                    original_filename=file.filename,
+                    original_filename=original_filename,
                     processed_filename=output_filename,
-                    file_size=len(content),
-                    s3_key=s3_key
+                    file_size=file_size,
+                    s3_key=existing.s3_key
                 )
-            else:
+            return StreamingResponse(
+                stream_s3_object(body), media_type=fmt.media_type, headers=headers
+            )
+
+    from .toll_processor import process_to_frame
+
+    processed_data, report = await processing_pool.run_cpu(
+        process_to_frame, statement, filename=original_filename, streaming=streaming,
+        track_memory=profile
+    )
+    pipeline_profile.record(report)
+    if profile:
+        headers.update(profile_headers(report))
+
+    if not current_user:
+        return StreamingResponse(
+            stream_result(processed_data, fmt),
+            media_type=fmt.media_type,
+            headers=headers,
+        )
+
+    s3_key = s3_service.generate_s3_key(current_user.id, output_filename)
+    upload = await s3_service.call(
+        s3_service.start_multipart_upload, s3_key, fmt.media_type
+    )
+    user_id = current_user.id
+
+    async def record_upload(uploaded: bool):
+        # The request's session is closed by the time the stream ends
+        record_db = SessionLocal()
+        try:
+            await processing_pool.run_io(
+                add_upload_record,
+                db=record_db,
+                user_id=user_id,
+                original_filename=original_filename,
+                processed_filename=output_filename,
+                file_size=file_size,
+                s3_key=s3_key if uploaded else None
+            )
+        finally:
+            record_db.close()
+
+    return StreamingResponse(
+        stream_result(processed_data, fmt, upload, on_complete=record_upload),
+        media_type=fmt.media_type,
+        headers=headers,
+    )
+
+
+async def store_result(user_id: int, original_filename: str, output_filename: str,
+                       output_path: str, file_size: int) -> None:
+    """
+    Upload a processed file to S3 and add it to the user's history, unless
+    the user already has this result in their history
+    """
+    # Runs after the response, when the request's session is closed
+    db = SessionLocal()
+    try:
+        if await processing_pool.run_io(find_upload, db, output_filename, user_id):
+            return
+
+        # An identical result already in S3 is shared rather than re-uploaded
+        existing = await processing_pool.run_io(find_upload, db, output_filename)
+        if existing:
+            s3_key = existing.s3_key
+        else:
+            s3_key = s3_service.generate_s3_key(user_id, output_filename)
+            if not await s3_service.upload_file_async(output_path, s3_key):
                 # Fallback: still track without S3 key if upload fails
-                add_upload_record(
-                    db=db,
-                    user_id=current_user.id,
-                    original_filename=file.filename,
-                    processed_filename=output_filename,
-                    file_size=len(content)
-                )
+                s3_key = None
+
+        # Track upload in database with S3 key
+        await processing_pool.run_io(
+            add_upload_record,
+            db=db,
+            user_id=user_id,
+            original_filename=original_filename,
+            processed_filename=output_filename,
+            file_size=file_size,
+            s3_key=s3_key
+        )
+    finally:
+        db.close()
+
+
+@app.post("/process-toll-data")
+async def process_toll_data(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...), 
+    streaming: bool = False,
+    stream_output: bool = False,
+    profile: bool = False,
+    output_format: Optional[str] = Query(None, alias="format"),
+    accept: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(optional_get_current_user),
+    db: Session = Depends(get_db)
+) -> Response:
+    """
+    Process toll transaction data from uploaded Excel file
+    Returns processed data as CSV download, or as parquet, arrow, ndjson or
+    xlsx when chosen with ?format= or the Accept header
+    With streaming=true, .xlsx/.xlsm files are read row by row and may be larger
+    With stream_output=true, CSV and NDJSON are sent while they are encoded
+    and uploaded to S3 at the same time, without writing a local output file
+    With profile=true, the time, memory and row counts of each pipeline stage
+    are returned in the Server-Timing and X-Processing-Profile headers; the
+    run traces allocations with tracemalloc, which makes it slower
+    """
+    try:
+        fmt = negotiate_format(output_format, accept)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    statement, file_size, streaming = await read_upload(file, streaming)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    download_filename = f"processed_toll_data_{timestamp}.{fmt.extension}"
+
+    try:
+        # Additional file format validation
+        if not file.filename.lower().endswith(('.xlsx', '.xls', '.xlsm')):
+            raise HTTPException(status_code=400, detail="Invalid file format. Please upload .xlsx, .xls, or .xlsm files only")
 
-        # Clean up uploaded file
-        os.remove(upload_path)
+        # Outputs are named after the upload content, so a statement that was
+        # processed before is served from the cache
+        cache_key = await processing_pool.run_io(result_cache.key, statement)
+        output_filename = result_cache.output_filename(cache_key, fmt.extension)
+        output_path = os.path.join(OUTPUT_DIR, output_filename)
+        stream_output = stream_output and fmt.streamable
+        cached = await processing_pool.run_io(
+            result_cache.lookup, db, output_filename, fetch=not stream_output
+        )
+
+        if stream_output and cached != "local":
+            return await stream_toll_data(
+                statement, file_size, file.filename, output_filename, download_filename,
+                streaming, fmt, cached, current_user, db, profile
+            )
+
+        headers = {}
+        if cached is None:
+            # Process the upload straight from memory and save the result, in the
+            # worker pool so the event loop stays free for other requests.
+            # Written under a temporary name so concurrent identical uploads
+            # never see a partial file
+            from .toll_processor import process_to_csv
+
+            temp_path = result_cache.temp_path(output_path)
+            try:
+                report = await processing_pool.run_cpu(
+                    process_to_csv,
+                    statement,
+                    temp_path,
+                    filename=file.filename,
+                    streaming=streaming,
+                    output_format=fmt.name,
+                    track_memory=profile,
+                )
+                await processing_pool.run_io(result_cache.store, temp_path, output_path)
+                pipeline_profile.record(report)
+                if profile:
+                    headers.update(profile_headers(report))
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        # Upload to S3 and track the upload once the response has been sent,
+        # so S3 latency does not add to the request
+        if current_user:
+            background_tasks.add_task(
+                store_result, current_user.id, file.filename, output_filename,
+                output_path, file_size
+            )
 
-        # Return CSV file
+        # Return the processed file
         return FileResponse(
             path=output_path,
-            filename=f"processed_toll_data_"
-            f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            media_type="text/csv",
+            filename=download_filename,
+            media_type=fmt.media_type,
+            headers=headers,
         )
 
+    except PoolBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy processing other files, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
-        # Clean up files on error
-        if os.path.exists(upload_path):
-            os.remove(upload_path)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    finally:
+        discard_upload(statement)
+
+
+@app.post("/process-toll-data/batch")
+async def process_toll_data_batch(
+    files: list[UploadFile] = File(...),
+    output: str = "merged",
+) -> Response:
+    """
+    Process many Excel files, or zips of them, in parallel
+    Returns one merged CSV with a source column (output=merged) or a zip with
+    one CSV per file (output=zip). Files that fail are listed in the
+    X-Failed-Files header, and in failures.csv inside the zip. Batch results
+    are only returned, not added to the upload history
+    """
+    if output not in ("merged", "zip"):
+        raise HTTPException(status_code=400, detail="output must be 'merged' or 'zip'")
+
+    statements = []
+    # Spooled statements are removed once the batch has been processed
+    try:
+        batch_size = 0
+        for file in files:
+            if file.filename and file.filename.lower().endswith(".zip"):
+                content = await file.read()
+                upload_size.observe(len(content), "zip")
+                if len(content) > MAX_STREAMING_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=(
+                            "File size must be less than "
+                            f"{MAX_STREAMING_UPLOAD_SIZE // (1024 * 1024)}MB"
+                        ),
+                    )
+                try:
+                    expanded = expand_upload(
+                        file.filename,
+                        content,
+                        MAX_STREAMING_UPLOAD_SIZE,
+                        max_files=MAX_BATCH_FILES - len(statements),
+                        max_total_size=MAX_BATCH_SIZE - batch_size,
+                    )
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+                expanded_size = sum(len(content) for _, content in expanded)
+            else:
+                statement, size, _ = await read_upload(file, streaming=True)
+                expanded = [(file.filename, statement)]
+                expanded_size = size
+            statements.extend(expanded)
+            batch_size += expanded_size
+            if len(statements) > MAX_BATCH_FILES:
+                raise HTTPException(
+                    status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch"
+                )
+            if batch_size > MAX_BATCH_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=(
+                        "Batch must be less than "
+                        f"{MAX_BATCH_SIZE // (1024 * 1024)}MB in total"
+                    ),
+                )
+
+        if not statements:
+            raise HTTPException(
+                status_code=400, detail="No Excel files found in upload"
+            )
+
+        batch = await process_batch(statements)
+    finally:
+        for _, statement in statements:
+            discard_upload(statement)
+
+    if not batch.results:
+        raise HTTPException(status_code=422, detail={"failed_files": batch.failures})
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if output == "zip":
+        content = await processing_pool.run_io(batch.zipped_csvs)
+        filename, media_type = f"processed_toll_data_{timestamp}.zip", "application/zip"
+    else:
+        content = await processing_pool.run_io(batch.merged_csv)
+        filename, media_type = f"processed_toll_data_{timestamp}.csv", "text/csv"
+
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Failed-Files": json.dumps(batch.failures),
+        },
+    )
+
+
+def require_background_jobs():
+    """
+    Refuse /jobs in Lambda, which freezes the process once a response is sent
+    Queued work would stall until the next invocation of the same container,
+    and the jobs table lives in that container's /tmp database
+    """
+    if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        raise HTTPException(
+            status_code=501,
+            detail="Background jobs are not available on this deployment; "
+                   "use /process-toll-data or /process-toll-data/batch",
+        )
+
+
+@app.post(
+    "/jobs",
+    response_model=JobSubmitResponse,
+    status_code=202,
+    dependencies=[Depends(require_background_jobs)],
+)
+async def submit_jobs(
+    files: list[UploadFile] = File(...),
+    current_user: Optional[User] = Depends(optional_get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Queue one or more Excel files for background processing
+    Returns a job id per file at once; poll /jobs/{job_id} for progress
+    """
+    # Validate every file before queueing any of them
+    uploads = []
+    try:
+        for file in files:
+            statement, size, _ = await read_upload(file, streaming=True)
+            uploads.append((file.filename, statement, size))
+    except HTTPException:
+        for _, statement, _ in uploads:
+            discard_upload(statement)
+        raise
+
+    jobs = []
+    for filename, statement, size in uploads:
+        job_id = str(uuid.uuid4())
+        input_path = job_runner.input_path(job_id, filename)
+        if isinstance(statement, str):
+            await processing_pool.run_io(shutil.move, statement, input_path)
+        else:
+            with open(input_path, "wb") as f:
+                f.write(statement)
+
+        job = await processing_pool.run_io(
+            create_job,
+            db=db,
+            job_id=job_id,
+            user_id=current_user.id if current_user else None,
+            original_filename=filename,
+            file_size=size
+        )
+        await job_runner.submit(job_id)
+        jobs.append(job)
+
+    return {"jobs": jobs}
+
+
+@app.get(
+    "/jobs/{job_id}",
+    response_model=JobResponse,
+    dependencies=[Depends(require_background_jobs)],
+)
+async def get_job_status(
+    job_id: str,
+    current_user: Optional[User] = Depends(optional_get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the state and per-stage progress of a processing job"""
+    job = await processing_pool.run_io(get_job, db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # Jobs submitted by a user are only visible to that user
+    if job.user_id is not None and (not current_user or current_user.id != job.user_id):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    response = JobResponse.model_validate(job)
+    if job.status == "completed":
+        response.download_url = f"/download/{job.processed_filename}"
+    return response
+
+
+@app.get("/stats")
+async def get_stats() -> dict:
+    """Runtime counters for capacity monitoring"""
+    return {
+        "processing": processing_pool.stats(),
+        "jobs": job_runner.stats(),
+        "result_cache": result_cache.stats(),
+        "presigned_urls": s3_service.presigned_stats(),
+        "auth_cache": user_cache.stats(),
+        "pipeline": pipeline_profile.stats(),
+        "password_hashing": {
+            **password_pool.stats(),
+            "rate_limited": login_limiter.limited,
+        },
+    }
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """
+    Request, upload, pipeline, S3 and database metrics in the Prometheus
+    text format, summed over all workers when METRICS_DIR is shared
+    """
+    content = await processing_pool.run_io(metrics.render)
+    return Response(content=content, media_type=METRICS_CONTENT_TYPE)
 
 
 @app.get("/processed-files")
 async def list_processed_files() -> dict[str, list[str] | int]:
-    """List all processed CSV files"""
+    """List all processed files"""
     try:
-        files = [f for f in os.listdir(OUTPUT_DIR) if f.endswith(".csv")]
+        files = [f for f in os.listdir(OUTPUT_DIR) if format_for_filename(f)]
         return {"files": files, "count": len(files)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing files: {str(e)}")
 
 
+def find_user_result(
+    db: Session, user_id: int, filename: str
+) -> Optional[UploadHistory]:
+    """
+    The user's upload of a processed file, or of the same result stored in
+    another format
+    """
+    stem = os.path.splitext(filename)[0]
+    names = [f"{stem}.{fmt.extension}" for fmt in OUTPUT_FORMATS.values()]
+    return db.query(UploadHistory).filter(
+        UploadHistory.user_id == user_id,
+        UploadHistory.processed_filename.in_(names)
+    ).first()
+
+
+async def convert_stored_result(
+    filename: str,
+    target_filename: str,
+    user_upload: Optional[UploadHistory],
+    fmt: OutputFormat,
+) -> bool:
+    """
+    Make sure a result is in OUTPUT_DIR in another format, converting the
+    stored file (fetched back from S3 if it was evicted locally)
+    Returns False when the stored result cannot be found
+    """
+    target_path = os.path.join(OUTPUT_DIR, target_filename)
+    if os.path.exists(target_path):
+        return True
+
+    file_path = os.path.join(OUTPUT_DIR, filename)
+    if not os.path.exists(file_path):
+        if not user_upload or not user_upload.s3_key:
+            return False
+        temp_path = result_cache.temp_path(file_path)
+        if not await s3_service.download_file_async(user_upload.s3_key, temp_path):
+            return False
+        await processing_pool.run_io(result_cache.store, temp_path, file_path)
+
+    temp_path = result_cache.temp_path(target_path)
+    try:
+        await processing_pool.run_cpu(convert_result, file_path, temp_path, fmt)
+        await processing_pool.run_io(result_cache.store, temp_path, target_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return True
+
+
 @app.get("/download/{filename}")
 async def download_file(
     filename: str,
+    output_format: Optional[str] = Query(None, alias="format"),
+    accept: Optional[str] = Header(None),
     current_user: Optional[User] = Depends(optional_get_current_user),
     db: Session = Depends(get_db)
 ) -> dict:
-    """Get download URL for a previously processed CSV file"""
+    """
+    Get download URL for a previously processed file
+    With ?format= or an Accept header naming another format, the result is
+    converted once and kept in that format alongside the original
+    """
+    stored_format = format_for_filename(filename)
+    if stored_format is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    try:
+        fmt = negotiate_format(output_format, accept, default=stored_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    target_filename = (
+        filename
+        if fmt == stored_format
+        else f"{os.path.splitext(filename)[0]}.{fmt.extension}"
+    )
+
     # If user is authenticated, verify they own this file and get S3 key
+    user_upload = None
+    s3_key = None
     if current_user:
-        user_upload = db.query(UploadHistory).filter(
-            UploadHistory.user_id == current_user.id,
-            UploadHistory.processed_filename == filename
-        ).first()
+        user_upload = await processing_pool.run_io(
+            find_upload, db, filename, current_user.id
+        )
         
         if not user_upload:
             raise HTTPException(status_code=403, detail="Access denied")
-        
-        # If file has S3 key, generate presigned URL
+
         if user_upload.s3_key:
-            download_url = s3_service.generate_presigned_url(user_upload.s3_key, expiration=3600)
-            if download_url:
-                return {"download_url": download_url, "expires_in": 3600}
+            if target_filename == filename:
+                s3_key = user_upload.s3_key
             else:
-                raise HTTPException(status_code=500, detail="Failed to generate download URL")
+                # Other formats live next to the user's copy of the result
+                converted_key = s3_service.generate_s3_key(
+                    current_user.id, target_filename
+                )
+                if await s3_service.file_exists_async(converted_key):
+                    s3_key = converted_key
+
+    if s3_key is None and target_filename != filename:
+        try:
+            found = await convert_stored_result(
+                filename, target_filename, user_upload, fmt
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error converting file: {str(e)}"
+            )
+        if not found:
+            raise HTTPException(status_code=404, detail="File not found")
+
+        # Keep the converted result in S3 too, like the original
+        if user_upload and user_upload.s3_key:
+            converted_key = s3_service.generate_s3_key(current_user.id, target_filename)
+            if await s3_service.upload_file_async(
+                os.path.join(OUTPUT_DIR, target_filename), converted_key
+            ):
+                s3_key = converted_key
+
+    # If file has S3 key, generate presigned URL
+    if s3_key:
+        presigned = s3_service.presign(s3_key, expiration=3600)
+        if presigned:
+            download_url, expires_in = presigned
+            return {"download_url": download_url, "expires_in": expires_in}
+        else:
+            raise HTTPException(
+                status_code=500, detail="Failed to generate download URL"
+            )
     
     # Fallback: check for local file
-    file_path = os.path.join(OUTPUT_DIR, filename)
-    if not os.path.exists(file_path) or not filename.endswith(".csv"):
+    file_path = os.path.join(OUTPUT_DIR, target_filename)
+    if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
 
     # For non-authenticated users or files without S3, use local file download
-    return {"download_url": f"/download-direct/{filename}", "expires_in": None}
+    return {"download_url": f"/download-direct/{target_filename}", "expires_in": None}
 
 
 @app.get("/download-direct/{filename}")
@@ -284,19 +982,19 @@ async def download_file_direct(
     """Direct download for local files (fallback)"""
     # Same security checks as original download
     if current_user:
-        user_upload = db.query(UploadHistory).filter(
-            UploadHistory.user_id == current_user.id,
-            UploadHistory.processed_filename == filename
-        ).first()
+        user_upload = await processing_pool.run_io(
+            find_user_result, db, current_user.id, filename
+        )
         
         if not user_upload:
             raise HTTPException(status_code=403, detail="Access denied")
     
+    fmt = format_for_filename(filename)
     file_path = os.path.join(OUTPUT_DIR, filename)
-    if not os.path.exists(file_path) or not filename.endswith(".csv"):
+    if not os.path.exists(file_path) or fmt is None:
         raise HTTPException(status_code=404, detail="File not found")
 
-    return FileResponse(path=file_path, filename=filename, media_type="text/csv")
+    return FileResponse(path=file_path, filename=filename, media_type=fmt.media_type)
 
 
 if __name__ == "__main__":
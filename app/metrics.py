@@ -0,0 +1,379 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from fast lookups to whole statement runs
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+# Fast buckets for single database statements
+QUERY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0
+)
+# 1KB up to 256MB in powers of four
+SIZE_BUCKETS = tuple(1024 * 4 ** n for n in range(10))
+THROUGHPUT_BUCKETS = (
+    100, 500, 1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000
+)
+
+# Starlette appends the utf-8 charset to text responses
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    type = "counter"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = registry.lock
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0.0) + value
+
+    def samples(self, merged: dict) -> list[str]:
+        return [
+            f"{self.name}_total{_format_labels(self.labelnames, labels)} "
+            f"{_format_value(value)}"
+            for labels, value in merged.items()
+        ]
+
+    def reset(self) -> None:
+        self._values.clear()
+
+
+class Histogram:
+    """Bucketed observations, their sum and count per label set"""
+
+    type = "histogram"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = registry.lock
+        # Per label set: a count per bucket plus the +Inf bucket, then the sum
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [
+                [list(labels), list(counts)] for labels, counts in self._values.items()
+            ]
+
+    @staticmethod
+    def merge(total, counts):
+        if total is None:
+            return list(counts)
+        return [a + b for a, b in zip(total, counts)]
+
+    def samples(self, merged: dict) -> list[str]:
+        lines = []
+        for labels, counts in merged.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                label_text = _format_labels(
+                    self.labelnames + ("le",), labels + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+    def reset(self) -> None:
+        self._values.clear()
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms in the Prometheus text format
+    Recording is a dict update under one lock. With METRICS_DIR set, every
+    process also writes its values to a file there every METRICS_FLUSH_SECONDS
+    and /metrics sums the files of all processes, so a scrape reaching any
+    uvicorn worker reports the whole server. Point each deployment at an
+    empty directory: files of exited workers keep counting, as their counts
+    are part of the totals.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics_dir = os.environ.get("METRICS_DIR") or None
+        self.flush_seconds = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+        self._metrics: list = []
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # A forked worker starts from zero, not from its parent's counts
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def counter(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> Counter:
+        metric = Counter(self, name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(self, name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> dict:
+        """Values recorded in this process, keyed by metric name"""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def start_flusher(self) -> None:
+        """Write this process's values to METRICS_DIR in the background"""
+        if self.metrics_dir is None or self._flusher is not None:
+            return
+        with self._flusher_lock:
+            if self._flusher is None:
+                os.makedirs(self.metrics_dir, exist_ok=True)
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="metrics-flush", daemon=True
+                )
+                self._flusher.start()
+
+    def flush(self) -> None:
+        """Write this process's values to its file in METRICS_DIR"""
+        if self.metrics_dir is None:
+            return
+        path = os.path.join(self.metrics_dir, f"metrics_{os.getpid()}.json")
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics to {path}: {e}")
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def _snapshots(self) -> list[dict]:
+        """Snapshots of every process: this one live, the others from METRICS_DIR"""
+        snapshots = [self.snapshot()]
+        if self.metrics_dir is None or not os.path.isdir(self.metrics_dir):
+            return snapshots
+        own_file = f"metrics_{os.getpid()}.json"
+        for name in os.listdir(self.metrics_dir):
+            if not name.endswith(".json") or name == own_file:
+                continue
+            try:
+                with open(os.path.join(self.metrics_dir, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable metrics file {name}: {e}")
+        return snapshots
+
+    def render(self) -> str:
+        """All metrics of all processes in the Prometheus text format"""
+        snapshots = self._snapshots()
+        lines = []
+        for metric in self._metrics:
+            merged: dict[tuple, object] = {}
+            for snapshot in snapshots:
+                for labels, value in snapshot.get(metric.name, []):
+                    key = tuple(labels)
+                    merged[key] = metric.merge(merged.get(key), value)
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples(merged))
+        return "\n".join(lines) + "\n"
+
+    def _reset_after_fork(self) -> None:
+        self.lock = threading.Lock()
+        for metric in self._metrics:
+            metric._lock = self.lock
+            metric.reset()
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+
+
+# Create singleton instance
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    "toll_http_requests",
+    "HTTP requests by route and status code",
+    ("method", "route", "status"),
+)
+http_request_duration = metrics.histogram(
+    "toll_http_request_duration_seconds",
+    "Time to serve a request, response body included",
+    ("method", "route"),
+)
+upload_size = metrics.histogram(
+    "toll_upload_size_bytes", "Size of uploaded statements and zip archives", ("kind",),
+    buckets=SIZE_BUCKETS,
+)
+pipeline_runs = metrics.counter("toll_pipeline_runs", "Completed TollProcessor runs")
+pipeline_rows = metrics.counter(
+    "toll_pipeline_rows",
+    "Rows read from statements and written to results",
+    ("direction",),
+)
+pipeline_stage_duration = metrics.histogram(
+    "toll_pipeline_stage_duration_seconds",
+    "Wall time of each TollProcessor stage",
+    ("stage",),
+)
+pipeline_throughput = metrics.histogram(
+    "toll_pipeline_rows_per_second",
+    "Statement rows read per second of processing, per run",
+    buckets=THROUGHPUT_BUCKETS,
+)
+parser_selections = metrics.counter(
+    "toll_statement_parser",
+    "Parser chosen for each statement",
+    ("format", "engine", "source"),
+)
+s3_request_duration = metrics.histogram(
+    "toll_s3_request_duration_seconds",
+    "Latency of S3 API requests, retries included",
+    ("operation",),
+)
+s3_request_errors = metrics.counter(
+    "toll_s3_request_errors", "Failed S3 API requests", ("operation",)
+)
+db_query_duration = metrics.histogram(
+    "toll_db_query_duration_seconds", "Latency of database statements", ("statement",),
+    buckets=QUERY_BUCKETS,
+)
+
+
+def observe_pipeline(report: dict) -> None:
+    """Record a TollProcessor profile report, see profiling.profile_report"""
+    pipeline_runs.inc()
+    for stage in report["stages"]:
+        pipeline_stage_duration.observe(stage["wall_seconds"], stage["stage"])
+    rows_in = report["rows_in"] or 0
+    pipeline_rows.inc("read", amount=rows_in)
+    pipeline_rows.inc("written", amount=report["rows_out"] or 0)
+    if report["wall_seconds"]:
+        pipeline_throughput.observe(rows_in / report["wall_seconds"])
+    parser = report.get("parser")
+    if parser:
+        parser_selections.inc(
+            parser["format"], parser["engine"] or "none", parser["source"]
+        )
+    metrics.start_flusher()
+
+
+def _start_s3_request(model, context, **kwargs) -> None:
+    # after-call-error is not given the operation, so keep it in the context
+    context["metrics_operation"] = model.name
+    context["metrics_started"] = time.perf_counter()
+
+
+def _end_s3_request(context, http_response=None, exception=None, **kwargs) -> None:
+    started = context.get("metrics_started")
+    if started is None:
+        return
+    operation = context["metrics_operation"]
+    s3_request_duration.observe(time.perf_counter() - started, operation)
+    if exception is not None or (
+        http_response is not None and http_response.status_code >= 400
+    ):
+        s3_request_errors.inc(operation)
+    metrics.start_flusher()
+
+
+def instrument_s3_client(client) -> None:
+    """Time every API request a boto3 S3 client makes"""
+    client.meta.events.register("before-call.s3", _start_s3_request)
+    client.meta.events.register("after-call.s3", _end_s3_request)
+    client.meta.events.register("after-call-error.s3", _end_s3_request)
+
+
+def statement_kind(statement: str) -> str:
+    """Label of a SQL statement, its leading keyword"""
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request by its route template, so
+    /download/{filename} is one series rather than one per file
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Unmatched paths share one series, so scans cannot add new ones
+            route_path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - started, scope["method"], route_path
+            )
+            http_requests.inc(scope["method"], route_path, str(status))
+            metrics.start_flusher()
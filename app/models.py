@@ -35,6 +35,7 @@ class UploadHistoryResponse(BaseModel):
     processed_filename: str
     file_size: int
     upload_date: datetime
+    download_url: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -43,4 +44,31 @@ class UploadHistoryResponse(BaseModel):
 class UserDashboard(BaseModel):
     user: UserResponse
     recent_uploads: list[UploadHistoryResponse]
-    total_uploads: int
\ No newline at end of file
+    total_uploads: int
+
+
+class UploadHistoryPage(BaseModel):
+    uploads: list[UploadHistoryResponse]
+    next_cursor: Optional[str] = None  # None on the last page
+
+
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    stage: Optional[str] = None
+    progress: dict[str, float] = {}
+    original_filename: str
+    file_size: int
+    processed_filename: Optional[str] = None
+    download_url: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class JobSubmitResponse(BaseModel):
+    jobs: list[JobResponse]
@@ -0,0 +1,230 @@
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+# pandas is imported where results are encoded, so negotiating a format does
+# not load it on a cold start
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Layout of the Date column in processed results, as TollProcessor writes it
+RESULT_DATE_FORMAT = "%d/%m/%Y"
+DATE_COLUMN = "Date"
+AMOUNT_COLUMN = "Total Amount"
+
+
+@dataclass
+class OutputFormat:
+    """A format processed results can be written in"""
+
+    name: str
+    extension: str
+    media_type: str
+    # Whether the format can be encoded chunk by chunk for a streamed response
+    streamable: bool = False
+
+
+OUTPUT_FORMATS = {
+    "csv": OutputFormat("csv", "csv", "text/csv", streamable=True),
+    "parquet": OutputFormat("parquet", "parquet", "application/vnd.apache.parquet"),
+    "arrow": OutputFormat("arrow", "arrow", "application/vnd.apache.arrow.file"),
+    "ndjson": OutputFormat("ndjson", "ndjson", "application/x-ndjson", streamable=True),
+    "xlsx": OutputFormat(
+        "xlsx",
+        "xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+}
+DEFAULT_FORMAT = OUTPUT_FORMATS["csv"]
+
+_BY_MEDIA_TYPE = {fmt.media_type: fmt for fmt in OUTPUT_FORMATS.values()}
+_BY_MEDIA_TYPE["application/x-parquet"] = OUTPUT_FORMATS["parquet"]
+_BY_MEDIA_TYPE["application/vnd.apache.arrow.stream"] = OUTPUT_FORMATS["arrow"]
+_BY_EXTENSION = {fmt.extension: fmt for fmt in OUTPUT_FORMATS.values()}
+
+
+def negotiate_format(
+    requested: Optional[str] = None,
+    accept: Optional[str] = None,
+    default: OutputFormat = DEFAULT_FORMAT,
+) -> OutputFormat:
+    """
+    Pick the output format from a query parameter, then the Accept header
+    Falls back to default (CSV) when the Accept header names no known format
+    """
+    if requested:
+        fmt = OUTPUT_FORMATS.get(requested.lower())
+        if fmt is None:
+            raise ValueError(
+                f"Unsupported output format '{requested}'. "
+                f"Choose one of: {', '.join(OUTPUT_FORMATS)}"
+            )
+        return fmt
+
+    best, best_q = default, 0.0
+    for entry in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in entry.split(";")]
+        fmt = _BY_MEDIA_TYPE.get(media_type.lower())
+        if fmt is None:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    pass
+        if q > best_q:
+            best, best_q = fmt, q
+    return best
+
+
+def format_for_filename(filename: str) -> Optional[OutputFormat]:
+    """Format of a stored result, from its extension"""
+    return _BY_EXTENSION.get(os.path.splitext(filename)[1].lstrip(".").lower())
+
+
+def _parsed_dates(values: "pd.Series") -> "pd.Series":
+    """
+    Result dates as datetimes; dates TollProcessor could not parse are kept
+    as text in the result, and come out as NaT here
+    """
+    import pandas as pd
+
+    return pd.to_datetime(values, format=RESULT_DATE_FORMAT, errors="coerce")
+
+
+def _typed_dates(values: "pd.Series") -> "pd.Series":
+    """Dates for typed columns, null where the result has no valid date"""
+    return _parsed_dates(values).dt.date
+
+
+def _arrow_table(df: "pd.DataFrame"):
+    """Result as an Arrow table with date32 dates and decimal amounts"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    arrays = []
+    for name in df.columns:
+        values = df[name]
+        if name == DATE_COLUMN:
+            arrays.append(
+                pa.array(_typed_dates(values), type=pa.date32(), from_pandas=True)
+            )
+        elif name == AMOUNT_COLUMN:
+            amounts = pa.array(values, type=pa.float64(), from_pandas=True)
+            arrays.append(pc.round(amounts, 2).cast(pa.decimal128(18, 2)))
+        else:
+            arrays.append(
+                pa.array(values.astype(object), type=pa.string(), from_pandas=True)
+            )
+    return pa.Table.from_arrays(arrays, names=list(df.columns))
+
+
+def _iso_dates(df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    NDJSON carries ISO dates so consumers need no day-first parsing; dates
+    that are not valid keep their original text
+    """
+    if DATE_COLUMN not in df.columns:
+        return df
+    parsed = _parsed_dates(df[DATE_COLUMN])
+    iso = parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), df[DATE_COLUMN])
+    return df.assign(**{DATE_COLUMN: iso})
+
+
+def encode_chunk(df: "pd.DataFrame", start: int, stop: int, fmt: OutputFormat) -> bytes:
+    """Encode rows start:stop of a streamable format"""
+    chunk = df.iloc[start:stop]
+    if fmt.name == "ndjson":
+        if chunk.empty:
+            return b""
+        encoded = _iso_dates(chunk).to_json(orient="records", lines=True)
+        return (encoded if encoded.endswith("\n") else encoded + "\n").encode()
+    return chunk.to_csv(index=False, header=start == 0).encode()
+
+
+def write_result(df: "pd.DataFrame", path: str, fmt: OutputFormat) -> None:
+    """Write a processed result to path in the given format"""
+    import pandas as pd
+
+    if fmt.name == "csv":
+        df.to_csv(path, index=False)
+    elif fmt.name == "ndjson":
+        if df.empty:
+            open(path, "wb").close()
+        else:
+            _iso_dates(df).to_json(path, orient="records", lines=True)
+    elif fmt.name == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(_arrow_table(df), path)
+    elif fmt.name == "arrow":
+        import pyarrow as pa
+
+        table = _arrow_table(df)
+        with (
+            pa.OSFile(path, "wb") as sink,
+            pa.ipc.new_file(sink, table.schema) as writer,
+        ):
+            writer.write_table(table)
+    elif fmt.name == "xlsx":
+        typed = df.copy()
+        if DATE_COLUMN in typed.columns:
+            # Dates that are not valid stay text cells
+            dates = _typed_dates(typed[DATE_COLUMN]).astype(object)
+            valid = _parsed_dates(typed[DATE_COLUMN]).notna()
+            typed[DATE_COLUMN] = dates.where(valid, typed[DATE_COLUMN])
+        # Real date cells shown as dd/mm/yyyy, like the VBA macro's sheet.
+        # Written through a handle since path may carry a temporary suffix
+        with open(path, "wb") as f, pd.ExcelWriter(
+            f, engine="openpyxl", date_format="DD/MM/YYYY"
+        ) as writer:
+            typed.to_excel(writer, index=False, sheet_name="Toll Data")
+    else:
+        raise ValueError(f"Unsupported output format '{fmt.name}'")
+
+
+def read_result(path: str, fmt: OutputFormat) -> "pd.DataFrame":
+    """Read a stored result back into the layout TollProcessor produces"""
+    import pandas as pd
+
+    if fmt.name == "csv":
+        df = pd.read_csv(path, dtype=str)
+        if AMOUNT_COLUMN in df.columns:
+            df[AMOUNT_COLUMN] = pd.to_numeric(df[AMOUNT_COLUMN])
+        return df
+
+    if fmt.name in ("parquet", "arrow"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if fmt.name == "parquet":
+            table = pq.read_table(path)
+        else:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+        df = table.to_pandas()
+        if AMOUNT_COLUMN in df.columns:
+            df[AMOUNT_COLUMN] = df[AMOUNT_COLUMN].astype(float)
+    elif fmt.name == "ndjson":
+        df = pd.read_json(path, lines=True, dtype=False)
+    elif fmt.name == "xlsx":
+        df = pd.read_excel(path, engine="openpyxl")
+    else:
+        raise ValueError(f"Unsupported output format '{fmt.name}'")
+
+    if DATE_COLUMN in df.columns:
+        # Typed formats hold dates or ISO text; text left by an unparseable
+        # statement date is passed through
+        parsed = pd.to_datetime(df[DATE_COLUMN], errors="coerce", format="ISO8601")
+        df[DATE_COLUMN] = parsed.dt.strftime(RESULT_DATE_FORMAT).where(
+            parsed.notna(), df[DATE_COLUMN]
+        )
+    return df
+
+
+def convert_result(source_path: str, target_path: str, fmt: OutputFormat) -> None:
+    """Write a stored result again in another format"""
+    df = read_result(source_path, format_for_filename(source_path))
+    write_result(df, target_path, fmt)
@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusyError(Exception):
+    """Raised when the processing queue is full and the request should be retried"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Processing queue is full")
+        self.retry_after = retry_after
+
+
+def _timed_call(fn: Callable, *args, **kwargs) -> tuple[float, Any]:
+    """Run fn in a worker and report when it actually started"""
+    started_at = time.time()
+    return started_at, fn(*args, **kwargs)
+
+
+class ProcessingPool:
+    """
+    Runs CPU-heavy statement processing in a worker pool and blocking I/O
+    (S3 transfers, database commits) in a thread pool, off the event loop.
+    Admission is bounded: once every worker is busy and the queue is full,
+    new work is refused with PoolBusyError instead of piling up.
+    """
+
+    def __init__(self):
+        # Lambda has no /dev/shm, so multiprocessing pools cannot start there
+        in_lambda = bool(os.environ.get("AWS_LAMBDA_FUNCTION_NAME"))
+        self.mode = os.environ.get(
+            "PROCESSING_POOL", "thread" if in_lambda else "process"
+        )
+        self.max_workers = int(
+            os.environ.get("PROCESSING_WORKERS", os.cpu_count() or 1)
+        )
+        self.max_queue = int(os.environ.get("PROCESSING_QUEUE_SIZE", "8"))
+        self.io_workers = int(os.environ.get("IO_WORKERS", "8"))
+        self.retry_after = int(os.environ.get("PROCESSING_RETRY_AFTER", "5"))
+
+        self._cpu_executor: Optional[Executor] = None
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _cpu_pool(self) -> Executor:
+        # Created on first use so importing the app does not start workers
+        if self._cpu_executor is None:
+            if self.mode == "process":
+                # Forking a process that runs I/O threads can copy locks held by
+                # those threads (SQLite, logging) into the child, so start
+                # workers from a clean forkserver instead
+                self._cpu_executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+            else:
+                self._cpu_executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="processing"
+                )
+        return self._cpu_executor
+
+    def _io_pool(self) -> ThreadPoolExecutor:
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(
+                max_workers=self.io_workers, thread_name_prefix="io"
+            )
+        return self._io_executor
+
+    async def run_cpu(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn in the processing pool, refusing work when the queue is full"""
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            logger.warning(f"Processing queue full ({self.in_flight} in flight)")
+            raise PoolBusyError(self.retry_after)
+
+        self.in_flight += 1
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(_timed_call, fn, *args, **kwargs)
+            started_at, result = await loop.run_in_executor(self._cpu_pool(), call)
+        finally:
+            self.in_flight -= 1
+
+        wait = max(0.0, started_at - submitted_at)
+        self.completed += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return result
+
+    async def run_io(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking I/O call in the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._io_pool(), functools.partial(fn, *args, **kwargs)
+        )
+
+    def stats(self) -> dict:
+        """Queue depth and wait time counters"""
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers,
+            "queue_size": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": (
+                self.total_wait / self.completed if self.completed else 0.0
+            ),
+            "max_wait_seconds": self.max_wait,
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker pools"""
+        for executor in (self._cpu_executor, self._io_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._cpu_executor = None
+        self._io_executor = None
+
+
+# Create singleton instance
+processing_pool = ProcessingPool()
@@ -0,0 +1,135 @@
+import json
+import threading
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from .metrics import observe_pipeline
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+@dataclass
+class StageProfile:
+    """Cost of one TollProcessor pipeline stage"""
+
+    stage: str
+    wall_seconds: float = 0.0
+    # CPU time of the thread running the stage, so work of concurrent
+    # requests in the same process is not counted
+    cpu_seconds: float = 0.0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    # High-water mark of the process RSS when the stage ended
+    max_rss_bytes: Optional[int] = None
+    # tracemalloc peak during the stage, only when memory tracking is on
+    peak_traced_bytes: Optional[int] = None
+
+
+def max_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def profile_report(stages: list[StageProfile], parser: Optional[dict] = None) -> dict:
+    """
+    Structured report of a pipeline run
+    parser names the format, engine and detection source of the statement
+    """
+    return {
+        "stages": [asdict(stage) for stage in stages],
+        "wall_seconds": sum(stage.wall_seconds for stage in stages),
+        "cpu_seconds": sum(stage.cpu_seconds for stage in stages),
+        # Rows read from the statement and rows in the result
+        "rows_in": stages[0].rows_out if stages else None,
+        "rows_out": stages[-1].rows_out if stages else None,
+        "parser": parser,
+    }
+
+
+def server_timing(report: dict) -> str:
+    """Server-Timing header value with the wall time of each stage"""
+    return ", ".join(
+        f"{stage['stage']};dur={stage['wall_seconds'] * 1000:.1f}"
+        for stage in report["stages"]
+    )
+
+
+def profile_header(report: dict) -> str:
+    """Compact JSON of a report, for the X-Processing-Profile header"""
+    return json.dumps(report, separators=(",", ":"))
+
+
+class ProfileAggregator:
+    """
+    Stage costs summed over every pipeline run of this process
+    Worker processes return their reports, so runs in the processing pool
+    are counted here too. Each report also feeds the /metrics series.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self._stages: dict[str, dict] = {}
+
+    def record(self, report: dict) -> None:
+        observe_pipeline(report)
+        with self._lock:
+            self.runs += 1
+            for stage in report["stages"]:
+                totals = self._stages.setdefault(stage["stage"], {
+                    "count": 0,
+                    "wall_seconds": 0.0,
+                    "max_wall_seconds": 0.0,
+                    "cpu_seconds": 0.0,
+                    "rows_in": 0,
+                    "rows_out": 0,
+                    "max_rss_bytes": 0,
+                    "max_peak_traced_bytes": 0,
+                })
+                totals["count"] += 1
+                totals["wall_seconds"] += stage["wall_seconds"]
+                totals["max_wall_seconds"] = max(
+                    totals["max_wall_seconds"], stage["wall_seconds"]
+                )
+                totals["cpu_seconds"] += stage["cpu_seconds"]
+                totals["rows_in"] += stage["rows_in"] or 0
+                totals["rows_out"] += stage["rows_out"] or 0
+                totals["max_rss_bytes"] = max(
+                    totals["max_rss_bytes"], stage["max_rss_bytes"] or 0
+                )
+                totals["max_peak_traced_bytes"] = max(
+                    totals["max_peak_traced_bytes"], stage["peak_traced_bytes"] or 0
+                )
+
+    def stats(self) -> dict:
+        """Per-stage averages, maxima and throughput"""
+        with self._lock:
+            stages = {}
+            for name, totals in self._stages.items():
+                count = totals["count"]
+                wall_seconds = totals["wall_seconds"]
+                rows = max(totals["rows_in"], totals["rows_out"])
+                stages[name] = {
+                    "count": count,
+                    "avg_wall_ms": totals["wall_seconds"] / count * 1000,
+                    "max_wall_ms": totals["max_wall_seconds"] * 1000,
+                    "avg_cpu_ms": totals["cpu_seconds"] / count * 1000,
+                    "rows_in": totals["rows_in"],
+                    "rows_out": totals["rows_out"],
+                    "rows_per_second": rows / wall_seconds if wall_seconds else 0.0,
+                    "max_rss_mb": totals["max_rss_bytes"] / (1024 * 1024),
+                    "max_peak_traced_mb": (
+                        totals["max_peak_traced_bytes"] / (1024 * 1024)
+                    ),
+                }
+            return {"runs": self.runs, "stages": stages}
+
+
+# Create singleton instance
+pipeline_profile = ProfileAggregator()
@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import os
+import time
+import uuid
+from typing import Optional, Union
+
+from .database import find_upload
+from .output_formats import format_for_filename
+from .s3_service import s3_service
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of processed CSVs
+    Outputs are named after a hash of the upload bytes and the processor
+    version, so re-uploading the same statement finds the CSV already in
+    output_dir, or in S3 through the upload history, instead of processing
+    it again. Local files are evicted by age and by total size.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.max_bytes = int(os.environ.get("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024
+        self.max_age = int(os.environ.get("RESULT_CACHE_MAX_AGE_HOURS", "24")) * 3600
+        self.local_hits = 0
+        self.s3_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, content: Union[bytes, str]) -> str:
+        """
+        Cache key for an upload under the current processor version
+        content is the upload's bytes or the path of its spooled copy
+        """
+        from .toll_processor import TollProcessor
+
+        digest = hashlib.sha256()
+        digest.update(f"{TollProcessor.VERSION}\0".encode())
+        if isinstance(content, str):
+            with open(content, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(content)
+        return digest.hexdigest()
+
+    def output_filename(self, key: str, extension: str = "csv") -> str:
+        return f"processed_toll_data_{key[:32]}.{extension}"
+
+    def temp_path(self, output_path: str) -> str:
+        """Where to write a result before moving it into place"""
+        return f"{output_path}.{uuid.uuid4().hex}.tmp"
+
+    def lookup(self, db, output_filename: str, fetch: bool = True) -> Optional[str]:
+        """
+        Find a cached result and, with fetch, make sure it is in output_dir
+        Returns "local" or "s3" for a hit and None for a miss
+        """
+        output_path = os.path.join(self.output_dir, output_filename)
+        if os.path.exists(output_path):
+            # Refresh the timestamp so eviction drops least recently used first
+            os.utime(output_path)
+            self.local_hits += 1
+            return "local"
+
+        upload = find_upload(db, output_filename)
+        if upload is not None and not fetch:
+            self.s3_hits += 1
+            return "s3"
+        if upload is not None:
+            temp_path = self.temp_path(output_path)
+            if s3_service.download_file(upload.s3_key, temp_path):
+                self.store(temp_path, output_path)
+                self.s3_hits += 1
+                return "s3"
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self.misses += 1
+        return None
+
+    def store(self, temp_path: str, output_path: str) -> None:
+        """Move a finished result into place, then evict to stay within limits"""
+        os.replace(temp_path, output_path)
+        self.evict(keep=os.path.basename(output_path))
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove expired outputs, then the oldest ones while over the size limit"""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.output_dir):
+            path = os.path.join(self.output_dir, name)
+            if (
+                name == keep
+                or format_for_filename(name) is None
+                or not os.path.isfile(path)
+            ):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if keep and os.path.exists(os.path.join(self.output_dir, keep)):
+            total += os.path.getsize(os.path.join(self.output_dir, keep))
+
+        for mtime, size, path in sorted(entries):
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+            logger.info(f"Evicted cached result {path}")
+
+    def stats(self) -> dict:
+        """Hit and miss counters"""
+        lookups = self.local_hits + self.s3_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "s3_hits": self.s3_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.s3_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
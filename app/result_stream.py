@@ -0,0 +1,59 @@
+import os
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Optional
+
+from .output_formats import DEFAULT_FORMAT, OutputFormat, encode_chunk
+from .processing_pool import processing_pool
+from .s3_service import S3MultipartUpload, s3_service
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Rows encoded per chunk of a streamed response
+CSV_CHUNK_ROWS = int(os.environ.get("CSV_CHUNK_ROWS", "50000"))
+# Bytes read per chunk when streaming a result back from S3
+S3_READ_SIZE = 1024 * 1024
+
+
+async def stream_result(
+    df: "pd.DataFrame",
+    fmt: OutputFormat = DEFAULT_FORMAT,
+    upload: Optional[S3MultipartUpload] = None,
+    on_complete: Optional[Callable[[bool], Awaitable[None]]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Encode df in chunks of a streamable format (CSV or NDJSON), yielding each
+    chunk as soon as it is ready
+    The same bytes are written to upload when given. on_complete is awaited
+    with whether the upload finished once the last chunk has been sent; an
+    interrupted response aborts the upload.
+    """
+    finished = False
+    try:
+        # An empty result still gets its CSV header
+        for start in range(0, max(len(df), 1), CSV_CHUNK_ROWS):
+            data = await processing_pool.run_io(
+                encode_chunk, df, start, start + CSV_CHUNK_ROWS, fmt
+            )
+            if upload is not None:
+                await s3_service.call(upload.write, data)
+            yield data
+
+        uploaded = upload is not None and await s3_service.call(upload.complete)
+        finished = True
+        if on_complete is not None:
+            await on_complete(uploaded)
+    finally:
+        if upload is not None and not finished:
+            await s3_service.call(upload.abort)
+
+
+async def stream_s3_object(body) -> AsyncIterator[bytes]:
+    """Relay an S3 object body to the client without storing it locally"""
+    try:
+        while True:
+            data = await s3_service.call(body.read, S3_READ_SIZE)
+            if not data:
+                break
+            yield data
+    finally:
+        body.close()
@@ -1,28 +1,270 @@
-import boto3
+import asyncio
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import os
-from botocore.exceptions import ClientError
-from typing import Optional
+from botocore.exceptions import BotoCoreError, ClientError
+from typing import Any, Callable, Optional
 import logging
 
+from .metrics import instrument_s3_client
+
 logger = logging.getLogger(__name__)
 
+class S3MultipartUpload:
+    """Upload a byte stream to S3 in parts as it is produced"""
+
+    # S3 requires every part but the last to be at least 5MB
+    PART_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, s3_client, bucket_name: str, s3_key: str, upload_id: str):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.s3_key = s3_key
+        self.upload_id = upload_id
+        self.buffer = bytearray()
+        self.parts = []
+        self.failed = False
+    
+    def write(self, data: bytes) -> None:
+        """Buffer data and upload every full part."""
+        if self.failed:
+            return
+        self.buffer += data
+        while len(self.buffer) >= self.PART_SIZE:
+            self._upload_part(bytes(self.buffer[:self.PART_SIZE]))
+            del self.buffer[:self.PART_SIZE]
+    
+    def _upload_part(self, data: bytes) -> None:
+        try:
+            part_number = len(self.parts) + 1
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket_name, Key=self.s3_key, UploadId=self.upload_id,
+                PartNumber=part_number, Body=data
+            )
+            self.parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+        except (ClientError, BotoCoreError) as e:
+            logger.error(
+                f"Failed to upload part to s3://{self.bucket_name}/{self.s3_key}: {e}"
+            )
+            self.failed = True
+            self.buffer.clear()
+    
+    def complete(self) -> bool:
+        """Upload the last part and finish the upload."""
+        if not self.failed and (self.buffer or not self.parts):
+            self._upload_part(bytes(self.buffer))
+            self.buffer.clear()
+        if self.failed:
+            self.abort()
+            return False
+        try:
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name, Key=self.s3_key, UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts}
+            )
+            logger.info(
+                f"Successfully uploaded stream to s3://{self.bucket_name}/{self.s3_key}"
+            )
+            return True
+        except (ClientError, BotoCoreError) as e:
+            logger.error(
+                f"Failed to complete upload to "
+                f"s3://{self.bucket_name}/{self.s3_key}: {e}"
+            )
+            self.abort()
+            return False
+    
+    def abort(self) -> None:
+        """Abandon the upload so S3 discards the parts already sent."""
+        self.failed = True
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=self.s3_key, UploadId=self.upload_id
+            )
+        except (ClientError, BotoCoreError) as e:
+            logger.error(
+                f"Failed to abort upload to s3://{self.bucket_name}/{self.s3_key}: {e}"
+            )
+
+
 class S3Service:
+    """
+    S3 access shared by the app and DatabaseBackup
+    One client with a sized connection pool and retries with exponential
+    backoff, created on first use; boto3 itself is only imported then, which
+    keeps it off the cold start of requests that never reach S3. Large
+    transfers are split into concurrent multipart uploads, and the *_async
+    methods run transfers in a dedicated thread pool so they never block the
+    event loop. S3_ENDPOINT_URL points the client at a local stand-in such as
+    moto or MinIO.
+    """
+
     def __init__(self):
-        self.s3_client = boto3.client('s3', region_name='us-east-1')
-        self.bucket_name = 'toll-automation-processed-files'
+        self.bucket_name = os.environ.get(
+            'S3_BUCKET', 'toll-automation-processed-files'
+        )
+        self.region_name = os.environ.get('AWS_REGION', 'us-east-1')
+        self.endpoint_url = os.environ.get('S3_ENDPOINT_URL') or None
+        self.max_connections = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '32'))
+        self.max_attempts = int(os.environ.get('S3_MAX_ATTEMPTS', '5'))
+        self.multipart_threshold = (
+            int(os.environ.get('S3_MULTIPART_THRESHOLD_MB', '8')) * 1024 * 1024
+        )
+        self.multipart_chunksize = (
+            int(os.environ.get('S3_MULTIPART_CHUNKSIZE_MB', '8')) * 1024 * 1024
+        )
+        self.max_concurrency = int(os.environ.get('S3_MAX_CONCURRENCY', '10'))
+        self._transfer_config = None
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Presigned URLs are reused until shortly before they expire, so
+        # polling dashboards do not re-sign the same keys
+        self.presigned_cache_size = int(
+            os.environ.get('PRESIGNED_URL_CACHE_SIZE', '1024')
+        )
+        self.presigned_safety_margin = int(
+            os.environ.get('PRESIGNED_URL_SAFETY_MARGIN', '300')
+        )
+        self._presigned_urls: OrderedDict = OrderedDict()
+        self._presigned_lock = threading.Lock()
+        self.presigned_hits = 0
+        self.presigned_misses = 0
+    
+    @property
+    def s3_client(self):
+        """The shared boto3 client, created on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import boto3
+                    from botocore.config import Config
+
+                    self._client = boto3.client(
+                        's3',
+                        region_name=self.region_name,
+                        endpoint_url=self.endpoint_url,
+                        config=Config(
+                            max_pool_connections=self.max_connections,
+                            retries={
+                                'total_max_attempts': self.max_attempts,
+                                'mode': 'standard',
+                            },
+                            tcp_keepalive=True,
+                        ),
+                    )
+                    instrument_s3_client(self._client)
+        return self._client
+    
+    @s3_client.setter
+    def s3_client(self, client) -> None:
+        # Lets tests substitute a stand-in client
+        self._client = client
+    
+    @property
+    def transfer_config(self):
+        """Multipart settings for managed transfers, built on first use."""
+        if self._transfer_config is None:
+            from boto3.s3.transfer import TransferConfig
+
+            self._transfer_config = TransferConfig(
+                multipart_threshold=self.multipart_threshold,
+                multipart_chunksize=self.multipart_chunksize,
+                max_concurrency=self.max_concurrency,
+            )
+        return self._transfer_config
+    
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking S3 call in the S3 thread pool, off the event loop."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_connections, thread_name_prefix="s3"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+    
+    def shutdown(self) -> None:
+        """Stop the S3 thread pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
     
     def upload_file(self, local_file_path: str, s3_key: str) -> bool:
         """Upload a file to S3 bucket."""
         try:
-            self.s3_client.upload_file(local_file_path, self.bucket_name, s3_key)
+            self.s3_client.upload_file(
+                local_file_path, self.bucket_name, s3_key, Config=self.transfer_config
+            )
             logger.info(f"Successfully uploaded {local_file_path} to s3://{self.bucket_name}/{s3_key}")
             return True
-        except ClientError as e:
+        except (ClientError, BotoCoreError) as e:
             logger.error(f"Failed to upload {local_file_path} to S3: {e}")
             return False
     
-    def generate_presigned_url(self, s3_key: str, expiration: int = 3600) -> Optional[str]:
-        """Generate a presigned URL for downloading a file from S3."""
+    def download_file(self, s3_key: str, local_file_path: str) -> bool:
+        """Download a file from S3 bucket."""
+        try:
+            self.s3_client.download_file(
+                self.bucket_name, s3_key, local_file_path, Config=self.transfer_config
+            )
+            logger.info(
+                f"Successfully downloaded s3://{self.bucket_name}/{s3_key} "
+                f"to {local_file_path}"
+            )
+            return True
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Failed to download {s3_key} from S3: {e}")
+            return False
+    
+    def start_multipart_upload(
+        self, s3_key: str, content_type: str = "text/csv"
+    ) -> Optional[S3MultipartUpload]:
+        """Start uploading a file to S3 bucket that is written in parts."""
+        try:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=s3_key, ContentType=content_type
+            )
+            return S3MultipartUpload(
+                self.s3_client, self.bucket_name, s3_key, response["UploadId"]
+            )
+        except (ClientError, BotoCoreError) as e:
+            logger.error(
+                f"Failed to start upload to s3://{self.bucket_name}/{s3_key}: {e}"
+            )
+            return None
+    
+    def open_file(self, s3_key: str):
+        """Open a file in S3 bucket for streaming its body."""
+        try:
+            return self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)[
+                "Body"
+            ]
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Failed to open {s3_key} from S3: {e}")
+            return None
+    
+    def presign(self, s3_key: str, expiration: int = 3600) -> Optional[tuple[str, int]]:
+        """
+        Get a presigned download URL and the seconds it stays valid
+        A URL is reused until less than the safety margin of its lifetime is
+        left; the least recently used URLs are dropped once the cache is full.
+        """
+        # Never hand out a URL with less than half its lifetime left
+        margin = min(self.presigned_safety_margin, expiration // 2)
+        now = time.time()
+        with self._presigned_lock:
+            cached = self._presigned_urls.get((s3_key, expiration))
+            if cached is not None and cached[1] - now > margin:
+                self._presigned_urls.move_to_end((s3_key, expiration))
+                self.presigned_hits += 1
+                return cached[0], int(cached[1] - now)
+
         try:
             # Extract filename from S3 key
             filename = s3_key.split('/')[-1]
@@ -36,11 +278,45 @@ class S3Service:
                 },
                 ExpiresIn=expiration
             )
-            logger.info(f"Generated presigned URL for {s3_key}: {response}")
-            return response
-        except ClientError as e:
+            # The URL itself is a credential, so it is not logged
+            logger.info(f"Generated presigned URL for {s3_key}")
+        except (ClientError, BotoCoreError) as e:
             logger.error(f"Failed to generate presigned URL for {s3_key}: {e}")
             return None
+
+        with self._presigned_lock:
+            self.presigned_misses += 1
+            self._presigned_urls[(s3_key, expiration)] = (response, now + expiration)
+            self._presigned_urls.move_to_end((s3_key, expiration))
+            while len(self._presigned_urls) > self.presigned_cache_size:
+                self._presigned_urls.popitem(last=False)
+        return response, expiration
+    
+    def generate_presigned_url(self, s3_key: str, expiration: int = 3600) -> Optional[str]:
+        """Generate a presigned URL for downloading a file from S3."""
+        presigned = self.presign(s3_key, expiration)
+        return presigned[0] if presigned else None
+    
+    def generate_presigned_urls(
+        self, s3_keys: list[str], expiration: int = 3600
+    ) -> dict[str, str]:
+        """Presigned URLs for several files at once, keyed by S3 key."""
+        urls = {}
+        for s3_key in dict.fromkeys(s3_keys):
+            presigned = self.presign(s3_key, expiration)
+            if presigned:
+                urls[s3_key] = presigned[0]
+        return urls
+    
+    def presigned_stats(self) -> dict:
+        """Presigned URL cache counters."""
+        lookups = self.presigned_hits + self.presigned_misses
+        return {
+            "size": len(self._presigned_urls),
+            "hits": self.presigned_hits,
+            "misses": self.presigned_misses,
+            "hit_rate": self.presigned_hits / lookups if lookups else 0.0,
+        }
     
     def generate_s3_key(self, user_id: int, filename: str) -> str:
         """Generate a structured S3 key for the file."""
@@ -51,8 +327,17 @@ class S3Service:
         try:
             self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
             return True
-        except ClientError:
+        except (ClientError, BotoCoreError):
             return False
+    
+    async def upload_file_async(self, local_file_path: str, s3_key: str) -> bool:
+        return await self.call(self.upload_file, local_file_path, s3_key)
+    
+    async def download_file_async(self, s3_key: str, local_file_path: str) -> bool:
+        return await self.call(self.download_file, s3_key, local_file_path)
+    
+    async def file_exists_async(self, s3_key: str) -> bool:
+        return await self.call(self.file_exists, s3_key)
 
 # Create a singleton instance
 s3_service = S3Service()
\ No newline at end of file
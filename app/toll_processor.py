@@ -1,11 +1,49 @@
+import codecs
+import csv
+import gc
+import io
 import logging
-from datetime import datetime
+import os
+import re
+import time
+import tracemalloc
+import zipfile
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import BinaryIO, Callable, Optional, Union
 
+import numpy as np
 import pandas as pd
 
+from .profiling import StageProfile, max_rss_bytes, profile_report
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# A statement can be read from a path or straight from the uploaded bytes
+FileSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+# Copy-free pipeline for the process_to_* helpers; PIPELINE_COPY_FREE=0 restores
+# the per-stage copies
+COPY_FREE = os.environ.get("PIPELINE_COPY_FREE", "1") != "0"
+
+
+@dataclass
+class ParsePlan:
+    """
+    How _import_data parses a file, decided once from a sample of its content
+    format is one of 'xlsx', 'xls', 'html', 'spreadsheetml' or 'delimited';
+    source says whether it came from the content or only from the extension;
+    engine is the reader that parsed it, set once parsing starts
+    """
+
+    format: str
+    encoding: Optional[str] = None
+    delimiter: Optional[str] = None
+    source: str = "content"
+    engine: Optional[str] = None
+
 
 class TollProcessor:
     """
@@ -13,116 +51,280 @@ class TollProcessor:
     Processes toll transaction data following the same workflow as the original VBA code
     """
 
-    def __init__(self) -> None:
+    # Bump whenever the output for a given input changes, so results cached
+    # under the previous version are not served again
+    VERSION = "2"
+
+    OUTPUT_DATE_FORMAT = "%d/%m/%Y"
+
+    # Date layouts seen in bank statement exports, parsed in bulk before the
+    # per-value fallback in _standardize_date_value
+    KNOWN_DATE_FORMATS = [
+        "%d-%b-%y",
+        "%d-%b-%y %H:%M:%S",
+        "%d-%b-%Y",
+        "%d/%m/%Y",
+        "%d/%m/%Y %H:%M:%S",
+        "%d-%m-%Y",
+        "%d-%m-%Y %H:%M:%S",
+        "%d/%m/%y",
+        "%d-%m-%y",
+        "ISO8601",
+    ]
+    DATE_SAMPLE_SIZE = 50
+
+    # Explicit dtypes for the required text columns; amounts and dates keep the
+    # cell types so numeric text and Excel date cells reach the later stages
+    IMPORT_DTYPES = {"TRANSACTIONTYPE": str, "TRANSACTIONID": str}
+    # Cell text read_excel treats as missing, pandas' default na_values
+    NA_TEXT = [
+        "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+        "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+        "nan", "null",
+    ]
+
+    # Bytes sampled from the start of a file to choose its parser
+    SNIFF_SIZE = 8192
+    DELIMITERS = ",\t;|"
+
+    # Formats each accepted extension is expected to contain
+    EXTENSION_FORMATS = {
+        "xlsx": ("xlsx",),
+        "xlsm": ("xlsx",),
+        "xls": ("xls",),
+        "csv": ("delimited",),
+    }
+
+    # Maximum transactions combined into one output row (VBA formatData())
+    ENTRIES_PER_ROW = 8
+
+    def __init__(
+        self,
+        copy_free: bool = False,
+        track_memory: bool = False,
+        streaming: bool = False,
+        on_stage: Optional[Callable[[str, Optional[float]], None]] = None,
+    ) -> None:
+        """
+        copy_free: keep only the required columns from import onward and let the
+            stages work on views under pandas copy-on-write instead of copying
+        track_memory: record the tracemalloc peak of each stage in
+            stage_peak_memory and the stage profiles
+        streaming: read .xlsx files row by row with openpyxl in read-only mode,
+            dropping rows _filter_data would reject before they are stored
+        on_stage: called with (stage, None) when a pipeline stage starts and
+            with (stage, seconds) when it finishes, for progress reporting
+        """
         self.required_columns = [
             "AMOUNT IN RS",
             "TRANSACTIONTYPE",
             "TRANSACTION_DATE",
             "TRANSACTIONID",
         ]
+        self.copy_free = copy_free
+        self.track_memory = track_memory
+        self.streaming = streaming
+        self.on_stage = on_stage
+        # Rows parsed per date format during the last run
+        self.date_format_stats: dict[str, int] = {}
+        # Peak traced bytes per stage during the last run (track_memory only)
+        self.stage_peak_memory: dict[str, int] = {}
+        # Time, memory and row counts of each stage of the last run
+        self.stage_profiles: list[StageProfile] = []
+        # Parser chosen for the last imported file and seconds spent per step
+        self.parse_plan: Optional[ParsePlan] = None
+        self.import_timings: dict[str, float] = {}
+        self._dates_standardized = False
 
-    def process_excel_file(self, file_path: str) -> pd.DataFrame:
+    def process_excel_file(
+        self, file_path: FileSource, filename: Optional[str] = None
+    ) -> pd.DataFrame:
         """
         Main processing function that mimics the VBA action() subroutine
         Processes the Excel file through all transformation steps
+        file_path may also be the file's bytes or a binary buffer, in which case
+        filename supplies the extension
         """
+        started_tracing = False
         try:
-            logger.info(f"Starting processing of file: {file_path}")
+            label = self._source_label(file_path, filename)
+            logger.info(f"Starting processing of file: {label}")
+            self.date_format_stats = {}
+            self.stage_peak_memory = {}
+            self.stage_profiles = []
+            self._dates_standardized = False
 
-            # Step 1: Import data (equivalent to importData())
-            df = self._import_data(file_path)
-            logger.info(f"Imported {len(df)} rows of data")
+            if self.track_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
 
-            # Step 2: Filter data (equivalent to filteredData())
-            filtered_df = self._filter_data(df)
-            logger.info(f"Filtered to {len(filtered_df)} rows")
+            # Each step replaces df so earlier intermediates can be freed
+            with self._pipeline_options():
+                # Step 1: Import data (equivalent to importData())
+                with self._stage("import") as stage:
+                    df = self._import_data(file_path, filename)
+                    stage.rows_out = len(df)
+                logger.info(f"Imported {len(df)} rows of data")
 
-            # Step 3: Format data (equivalent to formatData())
-            formatted_df = self._format_data(filtered_df)
-            logger.info(f"Formatted to {len(formatted_df)} rows")
+                # Step 2: Filter data (equivalent to filteredData())
+                with self._stage("filter", rows_in=len(df)) as stage:
+                    df = self._filter_data(df)
+                    stage.rows_out = len(df)
+                logger.info(f"Filtered to {len(df)} rows")
 
-            # Step 4: Convert date format (equivalent to ConvertDateFormat())
-            date_converted_df = self._convert_date_format(formatted_df)
+                # Step 3: Format data (equivalent to formatData())
+                with self._stage("format", rows_in=len(df)) as stage:
+                    df = self._format_data(df)
+                    stage.rows_out = len(df)
+                logger.info(f"Formatted to {len(df)} rows")
 
-            # Step 5: Apply final filter (equivalent to finalFilter())
-            final_df = self._final_filter(date_converted_df)
-            logger.info(f"Final output contains {len(final_df)} rows")
+                # Step 4: Convert date format (equivalent to ConvertDateFormat())
+                with self._stage("convert_dates", rows_in=len(df)) as stage:
+                    df = self._convert_date_format(df)
+                    stage.rows_out = len(df)
+                logger.info(f"Date formats parsed: {self.date_format_stats}")
 
-            return final_df
+                # Step 5: Apply final filter (equivalent to finalFilter())
+                with self._stage("final_filter", rows_in=len(df)) as stage:
+                    df = self._final_filter(df)
+                    stage.rows_out = len(df)
+                logger.info(f"Final output contains {len(df)} rows")
+
+            if self.track_memory:
+                peaks = {
+                    stage: f"{peak / (1024 * 1024):.1f}MB"
+                    for stage, peak in self.stage_peak_memory.items()
+                }
+                logger.info(f"Peak memory per stage: {peaks}")
+
+            return df
 
         except Exception as e:
-            logger.error(f"Error processing file {file_path}: {str(e)}")
+            logger.error(f"Error processing file {label}: {str(e)}")
             raise
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+    def _pipeline_options(self):
+        """
+        Pandas options for a pipeline run; copy-free mode relies on
+        copy-on-write so skipping the per-stage copies stays safe
+        """
+        if self.copy_free:
+            return pd.option_context("mode.copy_on_write", True)
+        return nullcontext()
+
+    @contextmanager
+    def _stage(self, name: str, rows_in: Optional[int] = None):
+        """
+        Report a pipeline stage and record its profile: wall and CPU time,
+        rows in and out (rows_out is set by the caller on the yielded
+        profile), the process RSS high-water mark and the traced peak
+        """
+        if self.on_stage:
+            self.on_stage(name, None)
+        tracing = self.track_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        profile = StageProfile(name, rows_in=rows_in)
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield profile
+            if self.on_stage:
+                self.on_stage(name, time.perf_counter() - start)
+        finally:
+            profile.wall_seconds = time.perf_counter() - start
+            profile.cpu_seconds = time.thread_time() - cpu_start
+            if self.copy_free:
+                # Copy-on-write block references form cycles, so the previous
+                # stage's frames are only released by the cycle collector
+                gc.collect()
+            if tracing:
+                self.stage_peak_memory[name] = tracemalloc.get_traced_memory()[1]
+                profile.peak_traced_bytes = self.stage_peak_memory[name]
+            profile.max_rss_bytes = max_rss_bytes()
+            self.stage_profiles.append(profile)
 
-    def _import_data(self, file_path: str) -> pd.DataFrame:
+    def profile_report(self) -> dict:
+        """Structured profile of the last run, see profiling.profile_report"""
+        parser = None
+        if self.parse_plan is not None:
+            parser = {
+                "format": self.parse_plan.format,
+                "engine": self.parse_plan.engine,
+                "source": self.parse_plan.source,
+            }
+        return profile_report(self.stage_profiles, parser)
+
+    def _working_copy(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Copy a stage's input, unless running in copy-free mode"""
+        return df if self.copy_free else df.copy()
+
+    def _import_data(
+        self, file_path: FileSource, filename: Optional[str] = None
+    ) -> pd.DataFrame:
         """
         Import data from Excel file (equivalent to VBA importData())
+        In-memory sources are parsed from their buffer without touching disk
         """
         import os
         
         try:
-            # Verify file exists and has content
-            if not os.path.exists(file_path):
-                raise ValueError(f"File not found: {file_path}")
-            
-            file_size = os.path.getsize(file_path)
+            label = self._source_label(file_path, filename)
+            if isinstance(file_path, str):
+                # Verify file exists and has content
+                if not os.path.exists(file_path):
+                    raise ValueError(f"File not found: {file_path}")
+                source = file_path
+                file_size = os.path.getsize(file_path)
+                filename = filename or file_path
+            else:
+                source = self._as_buffer(file_path)
+                file_size = source.seek(0, io.SEEK_END)
+
             if file_size == 0:
                 raise ValueError("File is empty")
                 
-            logger.info(f"Reading file: {file_path} (size: {file_size} bytes)")
-            
-            # Detect actual file format by reading file headers
-            actual_format = self._detect_file_format(file_path)
-            file_ext = file_path.lower().split('.')[-1]
-            logger.info(f"File extension: {file_ext}, Detected format: {actual_format}")
-            
+            logger.info(f"Reading file: {label} (size: {file_size} bytes)")
+            self.import_timings = {}
+
+            # Decide how to parse the file from a single sample of its content
+            file_ext = filename.lower().split('.')[-1] if filename else ''
+            with self._timed("sniff"):
+                plan = self._detect_parse_plan(source, file_ext)
+            self.parse_plan = plan
+            logger.info(f"File extension: {file_ext}, Parse plan: {plan}")
+
             # Warn if extension doesn't match detected format
-            if actual_format and actual_format != file_ext:
-                logger.warning(f"File extension '{file_ext}' doesn't match detected format '{actual_format}'. File may have incorrect extension.")
-            
-            df = None
-            last_error = None
-            engines_to_try = []
-            
-            # Determine engines to try based on detected format and extension
-            if actual_format == 'xlsx' or file_ext in ['xlsx', 'xlsm']:
-                engines_to_try = ['openpyxl', 'xlrd']
-            elif actual_format == 'xls' or file_ext == 'xls':
-                engines_to_try = ['xlrd', 'openpyxl']
-            elif actual_format == 'csv':
-                # File detected as CSV, skip Excel engines
-                engines_to_try = []
-            else:
-                # If detection failed, try both engines
-                engines_to_try = ['openpyxl', 'xlrd']
-            
-            # Try engines in order of preference
-            for engine in engines_to_try:
-                try:
-                    logger.info(f"Attempting to read file with {engine} engine")
-                    df = pd.read_excel(file_path, engine=engine)
-                    logger.info(f"Successfully read with {engine}")
-                    break
-                except Exception as e:
-                    last_error = e
-                    logger.warning(f"{engine} failed: {str(e)}")
-                    continue
-            
-            # Try reading as CSV/text format and convert to Excel
-            if df is None and (actual_format == 'csv' or file_ext == 'xls' or actual_format != file_ext):
-                logger.info("Attempting to read as text-based format and convert to Excel")
-                df = self._read_and_convert_text_format(file_path, file_ext)
-            
-            if df is None:
+            expected_formats = self.EXTENSION_FORMATS.get(file_ext, ())
+            mismatched = file_ext and plan.format not in expected_formats
+            if mismatched:
+                logger.warning(
+                    f"File extension '{file_ext}' doesn't match detected format "
+                    f"'{plan.format}'. File may have incorrect extension."
+                )
+
+            try:
+                df = self._run_parse_plan(plan, source)
+            except Exception as e:
                 # Provide more helpful error message
-                error_msg = f"Could not read file with any supported format (Excel engines or CSV). "
-                if actual_format and actual_format != file_ext:
-                    error_msg += f"The file appears to be in '{actual_format}' format but has a '{file_ext}' extension. "
+                error_msg = f"Could not read file as {plan}. "
+                if mismatched:
+                    error_msg += (
+                        f"The file appears to be in '{plan.format}' format "
+                        f"but has a '{file_ext}' extension. "
+                    )
                     error_msg += "The file may be corrupted, have an incorrect file extension, or be in an unsupported format. "
                     error_msg += "Please ensure the file is a valid Excel file (.xlsx, .xls) or try saving it in a different format. "
-                error_msg += f"Last error: {str(last_error)}"
+                error_msg += f"Last error: {str(e)}"
                 raise ValueError(error_msg)
 
+            timings = {
+                step: f"{seconds:.3f}s" for step, seconds in self.import_timings.items()
+            }
+            logger.info(f"Import steps for {plan.format}: {timings}")
             logger.info(f"Excel file loaded successfully with {len(df)} rows and {len(df.columns)} columns")
             
             # Clean column names (remove extra spaces, standardize case)
@@ -136,147 +338,364 @@ class TollProcessor:
                 available_cols = list(df.columns)
                 raise ValueError(f"Missing required columns: {missing_cols}. Available columns: {available_cols}")
 
+            if self.copy_free:
+                # Drop the rest of the statement's columns straight away
+                df = df[self.required_columns]
+
             return df
 
         except Exception as e:
             logger.error(f"Error importing Excel file: {str(e)}")
             raise ValueError(f"Error importing Excel file: {str(e)}")
 
-    def _detect_file_format(self, file_path: str) -> str:
+    def _as_buffer(self, data) -> BinaryIO:
         """
-        Detect actual file format by reading file headers/magic bytes
-        Returns 'xlsx', 'xls', or None if unknown
+        Wrap in-memory file content in a seekable buffer
+        BytesIO shares an immutable bytes object instead of copying it, and a
+        memoryview over a whole bytes object is unwrapped to that object
         """
-        try:
-            with open(file_path, 'rb') as f:
-                # Read first few bytes to check file signature
-                header = f.read(8)
-                
-                # ZIP signature (used by .xlsx, .xlsm) - starts with 'PK'
-                if header.startswith(b'PK'):
-                    return 'xlsx'
-                
-                # Old Excel binary format (.xls) - starts with specific signatures
-                # Microsoft Office documents often start with D0CF11E0 (OLE compound document)
-                if header.startswith(b'\xd0\xcf\x11\xe0'):
-                    return 'xls'
-                
-                # Additional signatures for Excel files
-                if header.startswith(b'\x09\x08'):  # Some .xls files
-                    return 'xls'
-                    
-                # Check for XML-based files (sometimes .xls files are actually XML)
-                if header.startswith(b'<?xml') or header.startswith(b'<html') or header.startswith(b'<HTML'):
-                    # This might be an HTML/XML file with wrong extension
-                    logger.warning("File appears to be HTML/XML format, not Excel")
-                    return 'xml'
-                
-                # Check for CSV-like content (text files saved as .xls)
-                try:
-                    # Try to decode as text to check if it looks like CSV
-                    text_content = header.decode('utf-8', errors='ignore')
-                    if ',' in text_content or '\t' in text_content:
-                        logger.info("File appears to contain delimited text (CSV/TSV)")
-                        return 'csv'
-                except Exception:
-                    pass
-                
-                logger.info(f"Unknown file signature: {header}")
-                return None
-                
-        except Exception as e:
-            logger.warning(f"Could not detect file format: {str(e)}")
-            return None
+        if isinstance(data, memoryview) and isinstance(data.obj, bytes):
+            if data.contiguous and data.nbytes == len(data.obj):
+                data = data.obj
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return io.BytesIO(data)
+        return data
+
+    def _open_source(self, source: FileSource) -> FileSource:
+        """Return a path unchanged, or an in-memory buffer rewound to its start"""
+        if not isinstance(source, str):
+            source.seek(0)
+        return source
 
-    def _read_and_convert_text_format(self, file_path: str, file_ext: str) -> pd.DataFrame:
+    def _read_text(self, source: FileSource, encoding: str) -> str:
+        """Read the whole source as text"""
+        if isinstance(source, str):
+            with open(source, 'r', encoding=encoding) as f:
+                return f.read()
+        return self._open_source(source).read().decode(encoding)
+
+    def _source_label(self, source: FileSource, filename: Optional[str]) -> str:
+        """Name a source for log and error messages"""
+        if isinstance(source, str):
+            return source
+        return filename or "<in-memory file>"
+
+    def _detect_parse_plan(self, source: FileSource, file_ext: str) -> ParsePlan:
         """
-        Read file as text format (CSV, TSV) and convert to proper Excel format
-        This handles files with wrong extensions or format mismatches
+        Detect the actual file format from the first few KB of the file
+        Signatures pick xlsx (zip containing xl/workbook.xml) or xls (OLE);
+        text content is checked for SpreadsheetML or HTML markup, otherwise
+        treated as delimited text with a sniffed encoding and delimiter.
+        Falls back to the file extension when the content is inconclusive.
         """
-        import os
-        import tempfile
-        
-        df = None
-        conversion_methods = [
-            # (description, read_function)
-            ("HTML table format", lambda fp: self._read_html_table(fp)),
-            ("XML Excel format", lambda fp: self._read_xml_excel(fp)),
-            ("CSV with comma separator", lambda fp: pd.read_csv(fp, encoding='utf-8')),
-            ("CSV with comma separator (latin-1)", lambda fp: pd.read_csv(fp, encoding='latin-1')),
-            ("TSV with tab separator", lambda fp: pd.read_csv(fp, sep='\t', encoding='utf-8')),
-            ("TSV with tab separator (latin-1)", lambda fp: pd.read_csv(fp, sep='\t', encoding='latin-1')),
-            ("Semicolon separated", lambda fp: pd.read_csv(fp, sep=';', encoding='utf-8')),
-            ("Pipe separated", lambda fp: pd.read_csv(fp, sep='|', encoding='utf-8')),
-        ]
-        
-        # Try each conversion method
-        for desc, read_func in conversion_methods:
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                sample = f.read(self.SNIFF_SIZE)
+        else:
+            sample = self._open_source(source).read(self.SNIFF_SIZE)
+
+        if sample.startswith(b'PK\x03\x04'):
             try:
-                logger.info(f"Trying to read as: {desc}")
-                df = read_func(file_path)
-                
-                if df is not None and not df.empty:
-                    logger.info(f"Successfully read as {desc} with {len(df)} rows and {len(df.columns)} columns")
-                    
-                    # Convert to proper Excel format
-                    converted_path = self._convert_to_excel_format(df, file_path)
-                    
-                    # Now read the converted file using Excel engines
-                    try:
-                        logger.info("Reading converted Excel file")
-                        df_excel = pd.read_excel(converted_path, engine="openpyxl")
-                        logger.info("Successfully read converted Excel file")
-                        
-                        # Clean up the temporary converted file
-                        os.remove(converted_path)
-                        return df_excel
-                        
-                    except Exception as e:
-                        logger.warning(f"Failed to read converted Excel file: {str(e)}")
-                        # Clean up and continue trying other methods
-                        if os.path.exists(converted_path):
-                            os.remove(converted_path)
-                        continue
-                        
-            except Exception as e:
-                logger.warning(f"Failed to read as {desc}: {str(e)}")
-                continue
-        
-        logger.warning("All text format conversion attempts failed")
-        return None
+                with zipfile.ZipFile(self._open_source(source)) as archive:
+                    if 'xl/workbook.xml' in archive.namelist():
+                        return ParsePlan('xlsx')
+            except zipfile.BadZipFile:
+                pass
+            logger.warning("Zip archive does not contain an Excel workbook")
 
-    def _convert_to_excel_format(self, df: pd.DataFrame, original_path: str) -> str:
+        # OLE compound document (D0CF11E0) or a bare BIFF record
+        elif sample.startswith((b'\xd0\xcf\x11\xe0', b'\x09\x08')):
+            return ParsePlan('xls')
+
+        else:
+            encoding = self._sniff_encoding(sample)
+            if encoding:
+                text = sample.decode(encoding, errors='ignore').lstrip('\ufeff \t\r\n')
+                head = text[:2048].lower()
+
+                # SpreadsheetML declares itself as XML; XHTML exports still say <html
+                if head.startswith('<?xml'):
+                    fmt = 'html' if '<html' in head else 'spreadsheetml'
+                    return ParsePlan(fmt, encoding=encoding)
+                if head.startswith('<') and any(
+                    tag in head for tag in ('<html', '<table', '<!doctype html')
+                ):
+                    return ParsePlan('html', encoding=encoding)
+                if not head.startswith('<'):
+                    return ParsePlan(
+                        'delimited',
+                        encoding=encoding,
+                        delimiter=self._sniff_delimiter(text),
+                    )
+
+        logger.info(f"Unknown file signature: {sample[:8]}")
+        for fmt in self.EXTENSION_FORMATS.get(file_ext, ()):
+            return ParsePlan(fmt, source='extension')
+        raise ValueError(f"Unrecognised file format: {sample[:8]}")
+
+    def _sniff_encoding(self, sample: bytes) -> Optional[str]:
         """
-        Convert DataFrame to a proper Excel (.xlsx) file
-        Returns path to the converted file
+        Pick the text encoding from a BOM, a declared charset, or by checking
+        the sample decodes as UTF-8, then cp1252; returns None for binary content
         """
-        import os
-        import tempfile
-        
-        # Create temporary file for conversion
-        temp_dir = os.path.dirname(original_path)
-        base_name = os.path.splitext(os.path.basename(original_path))[0]
-        converted_path = os.path.join(temp_dir, f"{base_name}_converted.xlsx")
-        
+        if sample.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return 'utf-16'
+
+        if b'\x00' in sample:
+            return None
+
+        declared = re.search(
+            rb'(?:charset|encoding)\s*=\s*["\']?([A-Za-z0-9_.:-]+)', sample[:2048]
+        )
+        if declared:
+            try:
+                return codecs.lookup(declared.group(1).decode('ascii')).name
+            except LookupError:
+                pass
+
         try:
-            # Save as proper Excel file
-            logger.info(f"Converting to Excel format: {converted_path}")
-            df.to_excel(converted_path, index=False, engine='openpyxl')
-            logger.info("Conversion to Excel format completed")
-            return converted_path
-            
-        except Exception as e:
-            logger.error(f"Failed to convert to Excel format: {str(e)}")
-            raise ValueError(f"Failed to convert file to Excel format: {str(e)}")
+            # A multi-byte character may be cut off at the end of the sample
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+        # Windows exports; latin-1 takes the bytes cp1252 leaves undefined
+        try:
+            sample.decode('cp1252')
+            return 'cp1252'
+        except UnicodeDecodeError:
+            return 'latin-1'
+
+    def _sniff_delimiter(self, text: str) -> str:
+        """Detect the delimiter of text data from its first complete lines"""
+        lines = text.splitlines()
+        if len(lines) > 1:
+            # The last line of the sample is probably cut off
+            lines = lines[:-1]
+        sample = '\n'.join(lines[:50])
+
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=self.DELIMITERS).delimiter
+        except csv.Error:
+            header = lines[0] if lines else ''
+            return max(self.DELIMITERS, key=header.count)
+
+    def _run_parse_plan(self, plan: ParsePlan, source: FileSource) -> pd.DataFrame:
+        """Run the single parser chosen for the file"""
+        with self._timed("parse"):
+            if plan.format == 'xlsx' and self.streaming:
+                plan.engine = 'openpyxl-streaming'
+                return self._stream_xlsx_rows(source)
+            if plan.format == 'xlsx':
+                plan.engine = 'openpyxl'
+                return self._read_required_columns(source, 'openpyxl')
+            if plan.format == 'xls':
+                plan.engine = 'xlrd'
+                return self._read_required_columns(source, 'xlrd')
+            if plan.format == 'html':
+                plan.engine = 'read_html'
+                df = self._read_html_table(source, plan.encoding)
+            elif plan.format == 'spreadsheetml':
+                plan.engine = 'elementtree'
+                df = self._read_xml_excel(source, plan.encoding)
+            else:
+                plan.engine = 'read_csv'
+                df = pd.read_csv(
+                    self._open_source(source),
+                    sep=plan.delimiter,
+                    encoding=plan.encoding,
+                )
+
+        if df is None or df.empty:
+            raise ValueError(f"No data found in {plan.format} content")
+
+        # Give text formats the column types the Excel reader would have produced
+        with self._timed("normalize"):
+            return self._normalize_to_excel_types(df)
+
+    @contextmanager
+    def _timed(self, step: str):
+        """Record the wall time of an import step in import_timings"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.import_timings[step] = time.perf_counter() - start
+
+    def _match_required_columns(self, header) -> dict:
+        """
+        Map each required column to its name in a header, matching after
+        strip/upper normalization; the first match wins
+        """
+        columns = {}
+        for name in header:
+            normalized = str(name).strip().upper()
+            if normalized in self.required_columns and normalized not in columns:
+                columns[normalized] = name
+        return columns
+
+    def _read_required_columns(self, source: FileSource, engine: str) -> pd.DataFrame:
+        """
+        Read only the required columns from the first sheet
+        The header row is read first and matched after strip/upper normalization,
+        so the rest of a wide statement export is never parsed
+        """
+        with pd.ExcelFile(self._open_source(source), engine=engine) as workbook:
+            header = workbook.parse(nrows=0).columns
+            columns = self._match_required_columns(header)
+
+            if len(columns) < len(self.required_columns):
+                # Leave reporting the missing columns to _import_data
+                return pd.DataFrame(columns=header)
+
+            dtype = {
+                columns[name]: column_dtype
+                for name, column_dtype in self.IMPORT_DTYPES.items()
+            }
+            return workbook.parse(usecols=list(columns.values()), dtype=dtype)
+
+    def _stream_xlsx_rows(self, source: FileSource) -> pd.DataFrame:
+        """
+        Stream the first sheet of an .xlsx file with openpyxl in read-only mode
+        Rows that are not debits or carry a non-positive amount are dropped as
+        they are read, so memory stays bounded by the rows actually kept.
+        Amounts stored as text are kept for _filter_data to coerce.
+        """
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(
+            self._open_source(source), read_only=True, data_only=True
+        )
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, ())
+
+            columns = self._match_required_columns(header)
+            positions = {
+                name: header.index(original) for name, original in columns.items()
+            }
+
+            if len(positions) < len(self.required_columns):
+                # Leave reporting the missing columns to _import_data
+                return pd.DataFrame(columns=[name for name in header if name])
+
+            type_at = positions["TRANSACTIONTYPE"]
+            amount_at = positions["AMOUNT IN RS"]
+            row_width = max(positions.values()) + 1
+            columns = {name: [] for name in positions}
+            rejected = 0
+
+            for row in rows:
+                if len(row) < row_width:
+                    row = row + (None,) * (row_width - len(row))
+
+                txn_type = row[type_at]
+                if not (isinstance(txn_type, str) and txn_type.upper() == "DEBIT"):
+                    rejected += 1
+                    continue
+
+                amount = row[amount_at]
+                if amount is None or (
+                    isinstance(amount, (int, float)) and not amount > 0
+                ):
+                    rejected += 1
+                    continue
 
-    def _read_html_table(self, file_path: str) -> pd.DataFrame:
+                for name, position in positions.items():
+                    columns[name].append(row[position])
+        finally:
+            workbook.close()
+
+        logger.info(
+            f"Streamed {len(columns['TRANSACTIONID'])} rows, "
+            f"skipped {rejected} rows while reading"
+        )
+
+        df = pd.DataFrame(columns)
+        for name in self.IMPORT_DTYPES:
+            df[name] = df[name].map(self._text_cell)
+        return df
+
+    def _text_cell(self, value):
+        """Convert a raw cell value to text the way read_excel(dtype=str) does"""
+        if value is None or value == "":
+            return np.nan
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value)
+
+    def _normalize_to_excel_types(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Give a DataFrame parsed from a text export the dtypes pd.read_excel
+        would have produced for the same sheet
+        Each required column is converted in one pass, so numeric text, NA
+        markers and the explicit import dtypes behave as they do in read_excel
+        """
+        columns = self._match_required_columns(df.columns)
+        if len(columns) < len(self.required_columns):
+            # Leave reporting the missing columns to _import_data
+            return df
+
+        text_columns = {columns[name] for name in self.IMPORT_DTYPES}
+        subset = df[list(columns.values())].reset_index(drop=True)
+        return pd.DataFrame({
+            column: self._excel_column(subset[column], column in text_columns)
+            for column in subset.columns
+        })
+
+    def _excel_column(self, values: pd.Series, as_text: bool) -> pd.Series:
+        """
+        Convert a parsed column to what read_excel returns for the same cells
+        Empty cells and NA markers are missing. Whole floats are integers, as
+        openpyxl returns them. Text columns keep their text; other columns are
+        numeric when every present value is
+        """
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(
+            values
+        ):
+            missing = values.isna()
+            whole = (values[~missing] % 1 == 0).all()
+            if as_text:
+                text = values.astype(object)
+                if whole:
+                    text[~missing] = values[~missing].astype("int64").astype(str)
+                else:
+                    text[~missing] = values[~missing].astype(str)
+                return text.where(~missing)
+            if whole and not missing.any():
+                return values.astype("int64")
+            return values
+
+        missing = values.isna() | values.isin(self.NA_TEXT)
+        present = values.where(~missing)
+        if as_text:
+            if pd.api.types.infer_dtype(present, skipna=True) != "string":
+                # Numbers among the text, written as openpyxl returns them
+                present = present.map(self._excel_cell, na_action="ignore")
+            return present.astype(object).where(missing, present.astype(str))
+        numbers = pd.to_numeric(present, errors="coerce")
+        if numbers.notna().sum() == (~missing).sum():
+            return numbers
+        return present
+
+    def _excel_cell(self, value):
+        """Convert a parsed value to what openpyxl returns for the same cell"""
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    def _read_html_table(
+        self, source: FileSource, encoding: str = 'utf-8'
+    ) -> pd.DataFrame:
         """
         Read HTML table from file (handles Excel HTML exports with .xls extension)
         """
         try:
             # Try pandas read_html first
             logger.info("Attempting to parse as HTML table")
-            tables = pd.read_html(file_path, encoding='utf-8')
+            tables = pd.read_html(self._open_source(source), encoding=encoding)
             
             if tables and len(tables) > 0:
                 # Use the first (or largest) table
@@ -291,9 +710,10 @@ class TollProcessor:
             try:
                 from bs4 import BeautifulSoup
                 logger.info("Attempting manual HTML parsing with BeautifulSoup")
+                if self.parse_plan is not None:
+                    self.parse_plan.engine = 'beautifulsoup'
                 
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                content = self._read_text(source, encoding)
                     
                 soup = BeautifulSoup(content, 'html.parser')
                 table = soup.find('table')
@@ -322,7 +742,9 @@ class TollProcessor:
         
         return None
 
-    def _read_xml_excel(self, file_path: str) -> pd.DataFrame:
+    def _read_xml_excel(
+        self, source: FileSource, encoding: str = 'utf-8'
+    ) -> pd.DataFrame:
         """
         Read XML-based Excel format (handles Excel XML exports)
         """
@@ -330,8 +752,7 @@ class TollProcessor:
             import xml.etree.ElementTree as ET
             logger.info("Attempting to parse as XML Excel format")
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = self._read_text(source, encoding)
             
             # Simple XML table parsing - look for common Excel XML patterns
             if 'Worksheet' in content and 'Row' in content:
@@ -372,7 +793,7 @@ class TollProcessor:
         """
         try:
             # Create copy to avoid modifying original
-            filtered_df = df.copy()
+            filtered_df = self._working_copy(df)
 
             # Filter for debit transactions with amount > 0
             if "TRANSACTIONTYPE" in filtered_df.columns:
@@ -404,58 +825,50 @@ class TollProcessor:
         """
         try:
             # Extract essential columns and convert dates first
-            essential_df = df[
-                ["TRANSACTIONID", "AMOUNT IN RS", "TRANSACTION_DATE"]
-            ].copy()
+            essential_df = df[["TRANSACTIONID", "AMOUNT IN RS", "TRANSACTION_DATE"]]
+            if not self.copy_free:
+                essential_df = essential_df.copy()
 
             # Convert dates to consistent format for grouping
             essential_df["TRANSACTION_DATE"] = self._standardize_dates(
                 essential_df["TRANSACTION_DATE"]
             )
 
+            self._dates_standardized = True
+
             # Sort by date to group consecutive entries
             essential_df = essential_df.sort_values("TRANSACTION_DATE")
 
-            # Process groups of up to 8 entries per day
-            formatted_rows = []
-
-            # Group by date
-            for date_val, group in essential_df.groupby("TRANSACTION_DATE"):
-                group_list = group.to_dict("records")
-
-                # If group has more than 8 entries, split into chunks
-                for i in range(0, len(group_list), 8):
-                    chunk = group_list[i : i + 8]
-
-                    if len(chunk) > 1:
-                        # Combine transaction IDs (last 4 digits)
-                        combined_txn_ids = "-".join(
-                            [str(row["TRANSACTIONID"])[-4:] for row in chunk]
-                        )
-                        total_amount = sum(row["AMOUNT IN RS"] for row in chunk)
-                        num_entries = len(chunk)
-
-                        formatted_rows.append(
-                            {
-                                "Transaction ID": combined_txn_ids,
-                                "No. Entries": num_entries,
-                                "Amount": total_amount,
-                                "Date": date_val,
-                            }
-                        )
-                    else:
-                        # Single entry - use last 4 digits of transaction ID
-                        row = chunk[0]
-                        formatted_rows.append(
-                            {
-                                "Transaction ID": str(row["TRANSACTIONID"])[-4:],
-                                "No. Entries": 1,
-                                "Amount": row["AMOUNT IN RS"],
-                                "Date": date_val,
-                            }
-                        )
-
-            return pd.DataFrame(formatted_rows)
+            if essential_df.empty:
+                return pd.DataFrame(
+                    columns=["Transaction ID", "No. Entries", "Amount", "Date"]
+                )
+
+            # Number each day's entries; every 8 consecutive ones form a chunk
+            entry_no = essential_df.groupby("TRANSACTION_DATE", sort=False).cumcount()
+            chunk = entry_no // self.ENTRIES_PER_ROW
+            slot = (entry_no - chunk * self.ENTRIES_PER_ROW).to_numpy()
+            chunk_start = slot == 0
+            chunk_no = chunk_start.cumsum() - 1
+
+            # Lay out each chunk's transaction IDs (last 4 digits) as one row of
+            # the grid and join them all with a single string reduction
+            txn_ids = essential_df["TRANSACTIONID"].astype(str).str[-4:].to_numpy()
+            grid_shape = (chunk_no[-1] + 1, self.ENTRIES_PER_ROW)
+            id_grid = np.full(grid_shape, "", dtype=object)
+            id_grid[chunk_no, slot] = np.where(chunk_start, txn_ids, "-" + txn_ids)
+
+            return pd.DataFrame(
+                {
+                    "Transaction ID": np.add.reduce(id_grid, axis=1),
+                    "No. Entries": np.bincount(chunk_no),
+                    "Amount": essential_df["AMOUNT IN RS"]
+                    .groupby(chunk_no)
+                    .sum()
+                    .to_numpy(),
+                    "Date": essential_df["TRANSACTION_DATE"].to_numpy()[chunk_start],
+                }
+            )
 
         except Exception as e:
             raise ValueError(f"Error formatting data: {str(e)}")
@@ -465,9 +878,10 @@ class TollProcessor:
         Convert date format to dd/mm/yyyy (equivalent to VBA ConvertDateFormat())
         """
         try:
-            result_df = df.copy()
+            result_df = self._working_copy(df)
 
-            if "Date" in result_df.columns:
+            # Dates were already standardized while grouping in _format_data
+            if "Date" in result_df.columns and not self._dates_standardized:
                 result_df["Date"] = self._standardize_dates(result_df["Date"])
 
             return result_df
@@ -482,7 +896,7 @@ class TollProcessor:
         """
         try:
             # Create final output with renamed columns
-            final_df = df.copy()
+            final_df = self._working_copy(df)
 
             # Filter out empty transaction IDs and zero amounts
             final_df = final_df[
@@ -515,54 +929,189 @@ class TollProcessor:
     def _standardize_dates(self, date_series: pd.Series) -> pd.Series:
         """
         Standardize date formats to dd/mm/yyyy
-        Handles various input formats like the VBA code
+        Parses the whole column in bulk against the known statement formats and
+        only sends the leftovers through the per-value fallback
         """
-        standardized_dates = []
+        values = date_series.reset_index(drop=True)
+        result = pd.Series("", index=values.index, dtype=object)
 
-        for date_val in date_series:
-            try:
-                if pd.isna(date_val):
-                    standardized_dates.append("")
-                    continue
+        if pd.api.types.is_datetime64_any_dtype(values):
+            ok = values.notna()
+            result[ok] = values[ok].dt.strftime(self.OUTPUT_DATE_FORMAT)
+            self._record_date_format("datetime", int(ok.sum()))
+            return result.set_axis(date_series.index)
+
+        remaining = values[values.notna()]
+        kind = pd.api.types.infer_dtype(remaining, skipna=True)
+
+        # Values Excel already gave us as datetimes need no string parsing
+        if kind != "string":
+            is_datetime = remaining.map(lambda v: isinstance(v, (datetime, date)))
+            if is_datetime.any():
+                parsed = pd.to_datetime(remaining[is_datetime], errors="coerce")
+                parsed = parsed[parsed.notna()]
+                result[parsed.index] = parsed.dt.strftime(self.OUTPUT_DATE_FORMAT)
+                self._record_date_format("datetime", len(parsed))
+                remaining = remaining.drop(parsed.index)
+
+        if kind == "string":
+            is_text = pd.Series(True, index=remaining.index)
+        else:
+            is_text = remaining.map(lambda v: isinstance(v, str))
+        text = remaining[is_text].astype(object).str.strip()
+
+        # Statements repeat the same few dates, so parse each distinct value once
+        codes, uniques = pd.factorize(text)
+        rows_per_value = np.bincount(codes, minlength=len(uniques))
+        formatted = np.full(len(uniques), None, dtype=object)
+        pending = pd.Series(uniques, dtype=object)
+        for fmt in self._rank_date_formats(pending):
+            if pending.empty:
+                break
+            parsed = pd.to_datetime(pending, format=fmt, errors="coerce")
+            ok = parsed.notna()
+            if not ok.any():
+                continue
+            matched = parsed.index[ok]
+            formatted[matched] = parsed[ok].dt.strftime(self.OUTPUT_DATE_FORMAT)
+            self._record_date_format(fmt, int(rows_per_value[matched].sum()))
+            pending = pending[~ok]
 
-                # Convert to string first
-                date_str = str(date_val)
+        row_dates = formatted[codes]
+        is_parsed = pd.notna(row_dates)
+        result[text.index[is_parsed]] = row_dates[is_parsed]
+        text = text[~is_parsed]
+
+        # Anything the bulk formats did not recognise goes through the slow path
+        leftovers = remaining[~is_text | remaining.index.isin(text.index)]
+        if not leftovers.empty:
+            result[leftovers.index] = leftovers.map(self._standardize_date_value)
+            self._record_date_format("fallback", len(leftovers))
+
+        return result.set_axis(date_series.index)
+
+    def _rank_date_formats(self, text: pd.Series) -> list:
+        """
+        Order the known date formats by how many of the first values they match,
+        so the statement's own format runs first over the full column
+        """
+        sample = text.head(self.DATE_SAMPLE_SIZE)
+        if sample.empty:
+            return []
 
-                # Try different parsing approaches
-                parsed_date = None
+        hits = {
+            fmt: int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+            for fmt in self.KNOWN_DATE_FORMATS
+        }
+        return sorted(self.KNOWN_DATE_FORMATS, key=lambda fmt: -hits[fmt])
 
-                # Try pandas to_datetime with various formats
+    def _record_date_format(self, fmt: str, count: int) -> None:
+        """Count how many rows were parsed by each date format during this run"""
+        if count:
+            self.date_format_stats[fmt] = self.date_format_stats.get(fmt, 0) + count
+
+    def _standardize_date_value(self, date_val) -> str:
+        """
+        Standardize a single date value to dd/mm/yyyy
+        Slow path for values none of the known formats matched
+        """
+        try:
+            if pd.isna(date_val):
+                return ""
+
+            # Convert to string first
+            date_str = str(date_val)
+
+            # Try different parsing approaches
+            parsed_date = None
+
+            # Try pandas to_datetime with various formats
+            try:
+                parsed_date = pd.to_datetime(date_val, dayfirst=True)
+            except Exception:
                 try:
-                    parsed_date = pd.to_datetime(date_val, dayfirst=True)
+                    # Handle format like "30-Jul-25"
+                    date_str_modified = date_str.replace("-", " ")
+                    parsed_date = pd.to_datetime(date_str_modified, dayfirst=True)
                 except Exception:
-                    try:
-                        # Handle format like "30-Jul-25"
-                        date_str_modified = date_str.replace("-", " ")
-                        parsed_date = pd.to_datetime(date_str_modified, dayfirst=True)
-                    except Exception:
-                        # Try other common formats
-                        for fmt in [
-                            "%d/%m/%Y",
-                            "%d-%m-%Y",
-                            "%Y-%m-%d",
-                            "%d/%m/%y",
-                            "%d-%m-%y",
-                        ]:
-                            try:
-                                parsed_date = datetime.strptime(date_str, fmt)
-                                break
-                            except Exception:
-                                continue
-
-                if parsed_date is not None:
-                    # Format as dd/mm/yyyy
-                    standardized_dates.append(parsed_date.strftime("%d/%m/%Y"))
-                else:
-                    # Keep original if parsing failed
-                    standardized_dates.append(date_str)
+                    # Try other common formats
+                    for fmt in [
+                        "%d/%m/%Y",
+                        "%d-%m-%Y",
+                        "%Y-%m-%d",
+                        "%d/%m/%y",
+                        "%d-%m-%y",
+                    ]:
+                        try:
+                            parsed_date = datetime.strptime(date_str, fmt)
+                            break
+                        except Exception:
+                            continue
 
-            except Exception:
-                # Keep original value if all parsing attempts fail
-                standardized_dates.append(str(date_val))
+            if parsed_date is not None:
+                # Format as dd/mm/yyyy
+                return parsed_date.strftime(self.OUTPUT_DATE_FORMAT)
+
+            # Keep original if parsing failed
+            return date_str
+
+        except Exception:
+            # Keep original value if all parsing attempts fail
+            return str(date_val)
+
+
+def process_to_frame(
+    source: FileSource,
+    filename: Optional[str] = None,
+    streaming: bool = False,
+    track_memory: bool = False,
+    copy_free: bool = COPY_FREE,
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Process a statement and return the result with its profile report
+    Module-level so it can run in a worker process
+    """
+    processor = TollProcessor(
+        copy_free=copy_free, streaming=streaming, track_memory=track_memory
+    )
+    processed_data = processor.process_excel_file(source, filename=filename)
+    return processed_data, processor.profile_report()
+
+
+def process_to_csv(
+    source: FileSource,
+    output_path: str,
+    filename: Optional[str] = None,
+    streaming: bool = False,
+    on_stage: Optional[Callable[[str, Optional[float]], None]] = None,
+    output_format: str = "csv",
+    track_memory: bool = False,
+    copy_free: bool = COPY_FREE,
+) -> dict:
+    """
+    Process a statement and write the result to output_path, as CSV unless
+    another of the formats in output_formats is given
+    Module-level so it can run in a worker process; returns the profile
+    report, whose rows_out is the row count
+    """
+    from .output_formats import OUTPUT_FORMATS, write_result
+
+    processor = TollProcessor(
+        copy_free=copy_free,
+        streaming=streaming,
+        on_stage=on_stage,
+        track_memory=track_memory,
+    )
+    processed_data = processor.process_excel_file(source, filename=filename)
 
-        return pd.Series(standardized_dates)
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        with processor._stage("write_output", rows_in=len(processed_data)) as stage:
+            write_result(processed_data, output_path, OUTPUT_FORMATS[output_format])
+            stage.rows_out = len(processed_data)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    return processor.profile_report()
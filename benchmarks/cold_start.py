@@ -0,0 +1,137 @@
+"""
+Cold-start benchmark for the Lambda handler
+
+Imports lambda_handler in fresh interpreters under `python -X importtime`
+and reports the median import time of each app module, then does the same
+with the modules that are now loaded on first use (pandas and the statement
+processor, boto3, passlib) imported up front, which is what every cold start
+paid before they were deferred. The parser libraries the processor loads per
+file format are timed alongside.
+
+    python benchmarks/cold_start.py            # table
+    python benchmarks/cold_start.py --json     # machine-readable
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported lazily by the app, so absent after importing lambda_handler
+STARTUP_MODULES = ["app.toll_processor", "boto3.s3.transfer", "passlib.context"]
+PARSER_MODULES = ["openpyxl", "xlrd", "bs4"]
+DEFERRED_MODULES = STARTUP_MODULES + PARSER_MODULES
+
+SCENARIOS = {
+    "lazy": "import lambda_handler",
+    "eager": "import lambda_handler; "
+    + "; ".join(f"import {m}" for m in DEFERRED_MODULES),
+}
+
+
+def import_times(statement: str, env: dict) -> dict[str, int]:
+    """Cumulative import time in microseconds of every module, for one run"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        # A module imported twice in a run (never normally) keeps the first time
+        times.setdefault(module.strip(), int(cumulative))
+    return times
+
+
+def run_scenario(statement: str, runs: int, env: dict) -> dict[str, float]:
+    """Median cumulative import time per module, in milliseconds"""
+    samples: dict[str, list[int]] = {}
+    for _ in range(runs):
+        for module, micros in import_times(statement, env).items():
+            samples.setdefault(module, []).append(micros)
+    return {
+        module: statistics.median(values) / 1000 for module, values in samples.items()
+    }
+
+
+def report(runs: int) -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        # Import as the Lambda would, without touching the development database
+        env = dict(
+            os.environ,
+            AWS_LAMBDA_FUNCTION_NAME="cold-start-benchmark",
+            DATABASE_URL=f"sqlite:///{scratch}/benchmark.db",
+            PYTHONPATH=REPO_ROOT,
+        )
+        results = {
+            name: run_scenario(statement, runs, env)
+            for name, statement in SCENARIOS.items()
+        }
+
+    lazy = results["lazy"]
+    return {
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "lazy_total_ms": round(lazy["lambda_handler"], 1),
+        "eager_total_ms": round(
+            sum(
+                results["eager"].get(module, 0.0)
+                for module in ["lambda_handler", *STARTUP_MODULES]
+            ),
+            1,
+        ),
+        "app_modules_ms": {
+            module: round(ms, 1)
+            for module, ms in sorted(lazy.items(), key=lambda item: -item[1])
+            if module.startswith("app.")
+            or module in ("fastapi", "sqlalchemy", "mangum")
+        },
+        "deferred_modules_ms": {
+            module: round(results["eager"].get(module, 0.0), 1)
+            for module in DEFERRED_MODULES
+        },
+        "deferred_loaded_at_startup": [
+            module for module in DEFERRED_MODULES if module in lazy
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--runs", type=int, default=5, help="fresh interpreters per scenario"
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    result = report(args.runs)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"lambda_handler import, median of {result['runs']} runs")
+    print(f"  cold start:             {result['lazy_total_ms']:8.1f} ms")
+    print(f"  loading them eagerly:   {result['eager_total_ms']:8.1f} ms")
+    print("\nPer module at cold start (cumulative):")
+    for module, ms in result["app_modules_ms"].items():
+        print(f"  {module:<24}{ms:8.1f} ms")
+    print("\nDeferred until first use:")
+    for module, ms in result["deferred_modules_ms"].items():
+        print(f"  {module:<24}{ms:8.1f} ms")
+    if result["deferred_loaded_at_startup"]:
+        loaded = ", ".join(result["deferred_loaded_at_startup"])
+        print(f"\nLoaded at startup anyway: {loaded}")
+
+
+if __name__ == "__main__":
+    main()
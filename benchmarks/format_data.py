@@ -0,0 +1,136 @@
+"""
+_format_data benchmark
+
+Times TollProcessor._format_data, which combines up to eight debits per day
+into one output row, against the row-by-row loop it replaced, on synthetic
+debits spread over --days days. Both get the same frame and must give the
+same result. Both standardize the dates first, which is most of the time on
+the columnar side. The row loop is skipped above --max-loop-rows.
+
+    python benchmarks/format_data.py                    # 10k, 100k and 1M rows
+    python benchmarks/format_data.py --rows 50000 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.toll_processor import TollProcessor  # noqa: E402
+
+
+def format_data_by_rows(processor: TollProcessor, df: pd.DataFrame) -> pd.DataFrame:
+    """The row-by-row _format_data, as shipped before the columnar rewrite"""
+    essential_df = df[["TRANSACTIONID", "AMOUNT IN RS", "TRANSACTION_DATE"]].copy()
+    essential_df["TRANSACTION_DATE"] = processor._standardize_dates(
+        essential_df["TRANSACTION_DATE"]
+    )
+    essential_df = essential_df.sort_values("TRANSACTION_DATE")
+
+    formatted_rows = []
+    for date_val, group in essential_df.groupby("TRANSACTION_DATE"):
+        group_list = group.to_dict("records")
+        for i in range(0, len(group_list), 8):
+            chunk = group_list[i : i + 8]
+            formatted_rows.append(
+                {
+                    "Transaction ID": "-".join(
+                        str(row["TRANSACTIONID"])[-4:] for row in chunk
+                    ),
+                    "No. Entries": len(chunk),
+                    "Amount": sum(row["AMOUNT IN RS"] for row in chunk),
+                    "Date": date_val,
+                }
+            )
+    return pd.DataFrame(formatted_rows)
+
+
+def debits(rows: int, days: int, seed: int) -> pd.DataFrame:
+    """Filtered debits as _format_data receives them, in export order"""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2025-01-01") + pd.to_timedelta(
+        rng.integers(0, days, rows), unit="D"
+    )
+    return pd.DataFrame(
+        {
+            "TRANSACTIONID": rng.integers(10**9, 10**10, rows),
+            "AMOUNT IN RS": rng.choice([35.0, 65.0, 90.0, 125.5], rows),
+            "TRANSACTION_DATE": dates.strftime("%d-%b-%y"),
+            "TRANSACTIONTYPE": "Debit",
+        }
+    )
+
+
+def median_ms(fn, repeat: int) -> tuple[float, pd.DataFrame]:
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 2), result
+
+
+def run(
+    row_counts: list[int], days: int, seed: int, repeat: int, max_loop_rows: int
+) -> dict:
+    cases = {}
+    for rows in row_counts:
+        df = debits(rows, days, seed)
+        processor = TollProcessor()
+        columnar_ms, result = median_ms(lambda: processor._format_data(df), repeat)
+        case = {"rows": rows, "rows_out": len(result), "columnar_ms": columnar_ms}
+        if rows <= max_loop_rows:
+            loop_ms, expected = median_ms(
+                lambda: format_data_by_rows(processor, df), repeat
+            )
+            pd.testing.assert_frame_equal(result, expected)
+            case["row_loop_ms"] = loop_ms
+            case["speedup"] = round(loop_ms / columnar_ms, 1) if columnar_ms else None
+        cases[str(rows)] = case
+    return {
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "days": days,
+        "repeat": repeat,
+        "cases": cases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-loop-rows", type=int, default=1_000_000,
+                        help="largest statement the row loop is timed on")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    result = run(args.rows, args.days, args.seed, args.repeat, args.max_loop_rows)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"python {result['python']}, pandas {result['pandas']}, "
+          f"{result['days']} days, median of {result['repeat']} runs")
+    print(
+        f"\n{'rows':>10}{'rows out':>10}{'columnar':>11}{'row loop':>11}{'speedup':>9}"
+    )
+    for case in result["cases"].values():
+        loop_ms = f"{case['row_loop_ms']:.1f}" if "row_loop_ms" in case else "-"
+        speedup = f"{case['speedup']}x" if case.get("speedup") else "-"
+        print(f"{case['rows']:>10,}{case['rows_out']:>10,}{case['columnar_ms']:>11.1f}"
+              f"{loop_ms:>11}{speedup:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Upload history query benchmark
+
+Fills a scratch SQLite database with synthetic upload history (a million
+rows by default, one heavy user among many light ones) and times the
+history, ownership and cache lookups the API runs, first without the
+upload_history indexes and then after create_tables() has added them the
+way it migrates an existing database. Deep history pages are timed both
+with keyset cursors and with the OFFSET they replace.
+
+    python benchmarks/history_queries.py                # table
+    python benchmarks/history_queries.py --rows 200000 --json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import database  # noqa: E402
+from app.database import (  # noqa: E402
+    UploadHistory,
+    find_upload,
+    get_user_uploads,
+    get_user_uploads_page,
+)
+
+HEAVY_USER = 1
+PAGE_SIZE = 20
+HISTORY_DAYS = 730
+
+
+def fill(engine, rows: int, users: int, heavy_share: float, seed: int) -> None:
+    """Insert synthetic history rows in upload order"""
+    rng = random.Random(seed)
+    # Spread over the last two years, so the dashboard window holds recent rows
+    start = datetime.utcnow() - timedelta(days=HISTORY_DAYS)
+    step = timedelta(days=HISTORY_DAYS) / rows
+
+    def generate():
+        for n in range(rows):
+            user_id = (
+                HEAVY_USER if rng.random() < heavy_share else rng.randint(2, users)
+            )
+            yield (
+                user_id,
+                f"statement_{n}.xlsx",
+                f"processed_toll_data_{n:032x}.csv",
+                rng.randint(10_000, 5_000_000),
+                (start + step * n).isoformat(sep=" "),
+                f"users/{user_id}/processed/processed_toll_data_{n:032x}.csv",
+            )
+
+    connection = engine.raw_connection()
+    try:
+        connection.executemany(
+            "INSERT INTO upload_history (user_id, original_filename, "
+            "processed_filename, file_size, upload_date, s3_key) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            generate(),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def timed(fn, repeat: int) -> float:
+    """Median milliseconds of fn over repeat calls"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def page_by_offset(db, user_id: int, page: int):
+    return db.query(UploadHistory).filter(UploadHistory.user_id == user_id).order_by(
+        UploadHistory.upload_date.desc(), UploadHistory.id.desc()
+    ).offset(page * PAGE_SIZE).limit(PAGE_SIZE).all()
+
+
+def measure(Session, rows: int, depth: int, repeat: int) -> dict[str, float]:
+    db = Session()
+    try:
+        latest = (
+            db.query(UploadHistory)
+            .filter(UploadHistory.user_id == HEAVY_USER)
+            .order_by(UploadHistory.upload_date.desc(), UploadHistory.id.desc())
+            .first()
+        )
+        heavy_rows = (
+            db.query(UploadHistory).filter(UploadHistory.user_id == HEAVY_USER).count()
+        )
+        depth = max(1, min(depth, heavy_rows // PAGE_SIZE - 1))
+        # Cursor of the page before the deep one, as a client walking there holds
+        deep = page_by_offset(db, HEAVY_USER, depth - 1)[-1]
+        filename = f"processed_toll_data_{rows // 2:032x}.csv"
+
+        return {
+            "dashboard (30 days, 10 rows)": timed(
+                lambda: get_user_uploads(db, HEAVY_USER, days=30, limit=10), repeat
+            ),
+            "history first page": timed(
+                lambda: get_user_uploads_page(db, HEAVY_USER, limit=PAGE_SIZE), repeat
+            ),
+            f"history page {depth + 1}, keyset": timed(
+                lambda: get_user_uploads_page(
+                    db, HEAVY_USER, limit=PAGE_SIZE, before=(deep.upload_date, deep.id)
+                ),
+                repeat,
+            ),
+            f"history page {depth + 1}, offset": timed(
+                lambda: page_by_offset(db, HEAVY_USER, depth), repeat
+            ),
+            "ownership check": timed(
+                lambda: find_upload(db, latest.processed_filename, HEAVY_USER), repeat
+            ),
+            "result cache lookup": timed(lambda: find_upload(db, filename), repeat),
+        }
+    finally:
+        db.close()
+
+
+def report(
+    rows: int, users: int, heavy_share: float, depth: int, repeat: int, seed: int
+) -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        engine = create_engine(f"sqlite:///{scratch}/history.db")
+        Session = sessionmaker(bind=engine)
+        database.Base.metadata.create_all(bind=engine)
+        # Start from the schema as it was before the history indexes
+        for index in UploadHistory.__table__.indexes:
+            if index.name != "ix_upload_history_id":
+                index.drop(bind=engine)
+
+        started = time.perf_counter()
+        fill(engine, rows, users, heavy_share, seed)
+        fill_seconds = time.perf_counter() - started
+
+        before = measure(Session, rows, depth, repeat)
+
+        # What create_tables() does on startup against an existing database
+        started = time.perf_counter()
+        for index in UploadHistory.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+        migration_seconds = time.perf_counter() - started
+
+        after = measure(Session, rows, depth, repeat)
+        engine.dispose()
+
+    return {
+        "rows": rows,
+        "users": users,
+        "heavy_user_share": heavy_share,
+        "repeat": repeat,
+        "fill_seconds": round(fill_seconds, 2),
+        "migration_seconds": round(migration_seconds, 2),
+        "queries_ms": {
+            name: {
+                "unindexed": round(before[name], 3),
+                "indexed": round(after[name], 3),
+            }
+            for name in before
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--heavy-share", type=float, default=0.1,
+                        help="fraction of rows belonging to the heavy user")
+    parser.add_argument(
+        "--depth", type=int, default=1000, help="history page timed deep in the list"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    result = report(
+        args.rows, args.users, args.heavy_share, args.depth, args.repeat, args.seed
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(
+        f"{result['rows']:,} history rows, {result['users']:,} users "
+        f"(filled in {result['fill_seconds']}s, "
+        f"indexes built in {result['migration_seconds']}s)"
+    )
+    print(f"\n{'median ms':<34}{'unindexed':>12}{'indexed':>12}")
+    for name, times in result["queries_ms"].items():
+        print(f"  {name:<32}{times['unindexed']:>12.3f}{times['indexed']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Login throughput benchmark
+
+Signs up a set of users in a scratch database, then logs them in from
+several concurrent clients through the ASGI app while a probe polls
+/health. Reports logins per second, login latency and the /health latency
+seen during the storm, which stays low only while bcrypt runs off the
+event loop.
+
+    python benchmarks/login_throughput.py                     # table
+    python benchmarks/login_throughput.py --rounds 10 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE_INTERVAL = 0.02
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def storm(
+    client, users: list[str], password: str, concurrency: int, logins: int
+) -> dict:
+    """Log users in from concurrency threads while probing /health"""
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    probes: list[float] = []
+    lock = threading.Lock()
+    remaining = iter(range(logins))
+    done = threading.Event()
+
+    def login_worker():
+        while True:
+            with lock:
+                n = next(remaining, None)
+            if n is None:
+                return
+            started = time.perf_counter()
+            response = client.post(
+                "/auth/login",
+                json={"email": users[n % len(users)], "password": password},
+            )
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+
+    def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get("/health")
+            probes.append(time.perf_counter() - started)
+            time.sleep(PROBE_INTERVAL)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    workers = [threading.Thread(target=login_worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+    done.set()
+    prober.join()
+
+    return {
+        "concurrency": concurrency,
+        "logins": logins,
+        "statuses": statuses,
+        "logins_per_second": round(logins / wall, 1),
+        "login_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "login_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "health_p50_ms": round(statistics.median(probes) * 1000, 1) if probes else None,
+        "health_p99_ms": round(percentile(probes, 0.99) * 1000, 1) if probes else None,
+    }
+
+
+def report(concurrency_levels: list[int], logins: int, users: int) -> dict:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.database import BCRYPT_ROUNDS
+
+    password = "benchmark-password"
+    emails = [f"user{n}@benchmark.example" for n in range(users)]
+    with TestClient(app) as client:
+        for email in emails:
+            response = client.post(
+                "/auth/signup", json={"email": email, "password": password}
+            )
+            response.raise_for_status()
+        results = [
+            storm(client, emails, password, level, logins)
+            for level in concurrency_levels
+        ]
+        stats = client.get("/stats").json().get("password_hashing")
+
+    return {
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        "cpus": os.cpu_count(),
+        "runs": results,
+        "password_hashing": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument(
+        "--logins", type=int, default=64, help="logins per concurrency level"
+    )
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--rounds", type=int, help="BCRYPT_ROUNDS for the run")
+    parser.add_argument("--workers", type=int, help="PASSWORD_HASH_WORKERS for the run")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    # Every client is the test client, so per-client limiting would only
+    # measure the limiter
+    os.environ["LOGIN_RATE_PER_MINUTE"] = "0"
+    if args.rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    if args.workers:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+
+    sys.path.insert(0, REPO_ROOT)
+    with tempfile.TemporaryDirectory() as scratch:
+        # The app keeps its database and outputs in the working directory
+        os.chdir(scratch)
+        result = report(args.concurrency, args.logins, args.users)
+        os.chdir(REPO_ROOT)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"bcrypt rounds {result['bcrypt_rounds']}, {result['cpus']} CPUs")
+    print(f"\n{'clients':>8}{'logins/s':>10}{'login p50':>11}{'login p95':>11}"
+          f"{'health p50':>12}{'health p99':>12}  statuses")
+    for run in result["runs"]:
+        print(
+            f"{run['concurrency']:>8}{run['logins_per_second']:>10}"
+            f"{run['login_p50_ms']:>9}ms{run['login_p95_ms']:>9}ms"
+            f"{run['health_p50_ms']:>10}ms{run['health_p99_ms']:>10}ms"
+            f"  {run['statuses']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
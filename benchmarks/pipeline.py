@@ -0,0 +1,283 @@
+"""
+Statement processing benchmark
+
+Generates synthetic statements (see statements.py) in every accepted format
+and times them three ways: the full TollProcessor pipeline with its output
+written as by /process-toll-data, each pipeline stage from the processor's
+profile report, and the /process-toll-data endpoint through a TestClient.
+Results are medians over --repeat runs. The JSON report records the commit
+and library versions, so reports from two commits can be compared with
+--compare, which exits non-zero when a case got slower than --threshold.
+
+    python benchmarks/pipeline.py                                    # table
+    python benchmarks/pipeline.py --rows 1000 50000 --json > before.json
+    python benchmarks/pipeline.py --rows 1000 50000 --compare before.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, replace
+
+from statements import DATE_FORMATS, FORMATS, XLS_MAX_ROWS, StatementSpec, generate
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    dirty = subprocess.run(
+        ["git", "diff", "--quiet", "HEAD", "--", "app"], cwd=REPO_ROOT
+    ).returncode
+    return result.stdout.strip() + ("-dirty" if dirty else "")
+
+
+def median_ms(samples: list[float]) -> float:
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def time_pipeline(filename: str, content: bytes, scratch: str, repeat: int) -> dict:
+    """Median wall time of the whole pipeline and of each stage"""
+    from app.toll_processor import process_to_csv
+
+    output_path = os.path.join(scratch, "benchmark_output.csv")
+    totals, stages, report = [], {}, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        report = process_to_csv(content, output_path, filename=filename)
+        totals.append(time.perf_counter() - started)
+        for stage in report["stages"]:
+            stages.setdefault(stage["stage"], []).append(stage["wall_seconds"])
+
+    with open(output_path, "rb") as f:
+        # Every format of the same spec must give the same result
+        output_digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    pipeline_ms = median_ms(totals)
+    return {
+        "rows_in": report["rows_in"],
+        "rows_out": report["rows_out"],
+        "parser": report["parser"],
+        "output_digest": output_digest,
+        "pipeline_ms": pipeline_ms,
+        "rows_per_second": (
+            round(report["rows_in"] / (pipeline_ms / 1000)) if pipeline_ms else None
+        ),
+        "stages_ms": {stage: median_ms(samples) for stage, samples in stages.items()},
+    }
+
+
+def time_endpoint(client, fmt: str, spec: StatementSpec, repeat: int) -> float:
+    """
+    Median time of /process-toll-data for the statement
+    Each run uploads a statement from another seed, the same shape but new
+    bytes, so the result cache never answers
+    """
+    samples = []
+    for n in range(repeat):
+        filename, content = generate(fmt, replace(spec, seed=spec.seed + 1000 + n))
+        started = time.perf_counter()
+        response = client.post(
+            "/process-toll-data", files={"file": (filename, content)}
+        )
+        samples.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return median_ms(samples)
+
+
+def run(formats: list[str], row_counts: list[int], spec: StatementSpec, repeat: int,
+        endpoint: bool) -> dict:
+    import pandas as pd
+
+    cases = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        client = None
+        if endpoint:
+            from fastapi.testclient import TestClient
+
+            from app.main import app
+
+            client = TestClient(app)
+            client.__enter__()
+            # Start the processing pool's workers before anything is timed
+            filename, content = generate("csv", replace(spec, rows=100))
+            client.post(
+                "/process-toll-data", files={"file": (filename, content)}
+            ).raise_for_status()
+        try:
+            for rows in row_counts:
+                case_spec = replace(spec, rows=rows)
+                for fmt in formats:
+                    if fmt == "xls" and rows >= XLS_MAX_ROWS:
+                        continue
+                    filename, content = generate(fmt, case_spec)
+                    case = {"format": fmt, "rows": rows, "file_bytes": len(content)}
+                    case.update(time_pipeline(filename, content, scratch, repeat))
+                    if client is not None:
+                        case["endpoint_ms"] = time_endpoint(
+                            client, fmt, case_spec, repeat
+                        )
+                    cases[f"{fmt}/{rows}"] = case
+        finally:
+            if client is not None:
+                client.__exit__(None, None, None)
+
+    return {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+        "spec": {key: value for key, value in asdict(spec).items() if key != "rows"},
+        "cases": cases,
+    }
+
+
+def compare(
+    result: dict, baseline: dict, threshold: float, min_delta_ms: float
+) -> list[str]:
+    """
+    Lines describing each timing that got slower than threshold allows
+    Differences under min_delta_ms are noise on stages that take a moment
+    """
+    regressions = []
+    for name, case in result["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        timings = [("pipeline", case["pipeline_ms"], before["pipeline_ms"])]
+        if "endpoint_ms" in case and "endpoint_ms" in before:
+            timings.append(("endpoint", case["endpoint_ms"], before["endpoint_ms"]))
+        timings.extend(
+            (stage, ms, before["stages_ms"][stage])
+            for stage, ms in case["stages_ms"].items()
+            if stage in before["stages_ms"]
+        )
+        for label, now, then in timings:
+            if then and now > then * (1 + threshold) and now - then >= min_delta_ms:
+                regressions.append(
+                    f"{name} {label}: {then:.1f}ms -> {now:.1f}ms "
+                    f"({now / then - 1:+.0%})"
+                )
+        if case["output_digest"] != before["output_digest"]:
+            regressions.append(f"{name}: output changed")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--date-format", default=StatementSpec.date_format,
+                        help=f"one of {', '.join(DATE_FORMATS)} or a strftime layout")
+    parser.add_argument(
+        "--columns", type=int, default=StatementSpec.columns, help="extra columns"
+    )
+    parser.add_argument("--cell-width", type=int, default=StatementSpec.cell_width)
+    parser.add_argument("--debit-share", type=float, default=StatementSpec.debit_share)
+    parser.add_argument(
+        "--unusable-share", type=float, default=StatementSpec.unusable_share
+    )
+    parser.add_argument("--days", type=int, default=StatementSpec.days)
+    parser.add_argument("--seed", type=int, default=StatementSpec.seed)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--no-endpoint", action="store_true", help="skip the /process-toll-data timings"
+    )
+    parser.add_argument(
+        "--compare", help="JSON report of an earlier run to check against"
+    )
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="slowdown over the baseline reported as a regression")
+    parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=10.0,
+        help="smallest slowdown in milliseconds reported as a regression",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    spec = StatementSpec(
+        date_format=args.date_format,
+        columns=args.columns,
+        cell_width=args.cell_width,
+        debit_share=args.debit_share,
+        unusable_share=args.unusable_share,
+        days=args.days,
+        seed=args.seed,
+    )
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    sys.path.insert(0, REPO_ROOT)
+    with tempfile.TemporaryDirectory() as scratch:
+        # The app keeps its database and outputs in the working directory
+        os.chdir(scratch)
+        result = run(args.formats, args.rows, spec, args.repeat, not args.no_endpoint)
+        os.chdir(REPO_ROOT)
+
+    regressions = (
+        compare(result, baseline, args.threshold, args.min_delta_ms) if baseline else []
+    )
+    if args.json:
+        if baseline:
+            result["regressions"] = regressions
+        print(json.dumps(result, indent=2))
+    else:
+        stages = list(dict.fromkeys(
+            stage for case in result["cases"].values() for stage in case["stages_ms"]
+        ))
+        print(
+            f"commit {result['commit']}, python {result['python']}, "
+            f"pandas {result['pandas']}, "
+            f"{result['cpus']} CPUs, median of {result['repeat']} runs"
+        )
+        print(
+            f"\n{'case':<22}{'bytes':>11}{'rows out':>9}{'pipeline':>10}"
+            f"{'rows/s':>9}{'endpoint':>10}"
+            + "".join(f"{stage[:12]:>13}" for stage in stages)
+        )
+        for name, case in result["cases"].items():
+            endpoint_ms = f"{case['endpoint_ms']:.1f}" if "endpoint_ms" in case else "-"
+            print(
+                f"{name:<22}{case['file_bytes']:>11,}{case['rows_out']:>9}"
+                f"{case['pipeline_ms']:>10.1f}"
+                f"{case['rows_per_second']:>9,}{endpoint_ms:>10}"
+                + "".join(
+                    f"{case['stages_ms'].get(stage, 0):>13.1f}" for stage in stages
+                )
+            )
+        if baseline:
+            print(
+                f"\nAgainst {baseline.get('commit')}: "
+                + (
+                    f"{len(regressions)} regressions"
+                    if regressions
+                    else "no regressions"
+                )
+            )
+            for line in regressions:
+                print(f"  {line}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+"""
+Synthetic toll statement generator
+
+Builds statements shaped like bank exports, in every format
+TollProcessor._import_data accepts: xlsx, real BIFF8 xls, HTML and
+SpreadsheetML saved as .xls, and comma, tab, semicolon and pipe delimited
+text. Row count, date layout, extra columns and their width, and the mix of
+debits, credits and unusable amounts are configurable, and the same seed
+always gives the same bytes, so statements can be shared and benchmarks
+compared without real customer data.
+
+    python benchmarks/statements.py --format html --rows 10000 -o statement.xls
+    python benchmarks/statements.py --format xlsx --date-format excel \
+        --columns 12 -o wide.xlsx
+"""
+import argparse
+import io
+import random
+import re
+import struct
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+from xml.sax.saxutils import escape
+
+REQUIRED_HEADER = [
+    "SR NO",
+    "TRANSACTION_DATE",
+    "TRANSACTIONID",
+    "TRANSACTIONTYPE",
+    "AMOUNT IN RS",
+]
+
+# Named date layouts; "excel" writes real date cells where the format has them
+DATE_FORMATS = {
+    "dd-mon-yy": "%d-%b-%y",
+    "dd-mon-yy-time": "%d-%b-%y %H:%M:%S",
+    "dd/mm/yyyy": "%d/%m/%Y",
+    "dd-mm-yyyy-time": "%d-%m-%Y %H:%M:%S",
+    "iso": "%Y-%m-%d %H:%M:%S",
+    "mixed": None,
+    "excel": None,
+}
+# Layouts drawn from per row by "mixed", as in statements merged from exports
+MIXED_DATE_FORMATS = ["%d-%b-%y", "%d/%m/%Y", "%d-%m-%Y %H:%M:%S", "%Y-%m-%d"]
+# Text rendering of dates for formats without date cells
+EXCEL_TEXT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+TOLL_AMOUNTS = [35, 40, 65, 85, 95, 120, 120.5, 155, 240, 315]
+# Amounts the pipeline has to drop: zero, blank and placeholder text
+UNUSABLE_AMOUNTS = [0, None, "N/A"]
+FILLER_NAMES = [
+    "PLAZA",
+    "VEHICLE_NO",
+    "TAG_ID",
+    "LANE",
+    "DESCRIPTION",
+    "BALANCE",
+    "REMARKS",
+]
+
+XLS_MAX_ROWS = 65536
+
+
+@dataclass
+class StatementSpec:
+    """Shape of a synthetic statement"""
+
+    rows: int = 1000
+    date_format: str = "dd-mon-yy"
+    # Extra columns after the required ones, and the characters in each cell
+    columns: int = 2
+    cell_width: int = 12
+    # Share of debits among the rows, and of rows with an unusable amount
+    debit_share: float = 0.6
+    unusable_share: float = 0.05
+    # Days the transactions are spread over; fewer days means larger groups
+    days: int = 60
+    seed: int = 25
+
+
+def header(spec: StatementSpec) -> list[str]:
+    fillers = [
+        FILLER_NAMES[n] if n < len(FILLER_NAMES) else f"EXTRA_{n}"
+        for n in range(spec.columns)
+    ]
+    return REQUIRED_HEADER + fillers
+
+
+def generate_rows(spec: StatementSpec) -> list[list]:
+    """
+    Data rows of a statement; dates are datetimes, rendered by each writer
+    Transaction ids mix the numeric and prefixed styles of real exports
+    """
+    rng = random.Random(spec.seed)
+    start = datetime(2025, 4, 1)
+    filler_alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    rows = []
+    for n in range(spec.rows):
+        when = start + timedelta(
+            days=rng.randrange(spec.days), seconds=rng.randrange(86400)
+        )
+        if rng.random() < spec.unusable_share:
+            amount = rng.choice(UNUSABLE_AMOUNTS)
+        else:
+            amount = rng.choice(TOLL_AMOUNTS)
+        txn_id = f"{1_000_000_000 + n}" if n % 3 else f"TXN{n:09d}"
+        row = [
+            n + 1,
+            when,
+            txn_id,
+            "Debit" if rng.random() < spec.debit_share else "Credit",
+            amount,
+        ]
+        row.extend(
+            "".join(rng.choices(filler_alphabet, k=spec.cell_width))
+            for _ in range(spec.columns)
+        )
+        rows.append(row)
+    return rows
+
+
+def date_renderer(spec: StatementSpec, date_cells: bool) -> Callable:
+    """
+    Turn a row's datetime into its cell value: kept as a datetime when the
+    format writes date cells, otherwise text in the chosen layout
+    """
+    if spec.date_format == "excel":
+        if date_cells:
+            return lambda when: when
+        return lambda when: when.strftime(EXCEL_TEXT_DATE_FORMAT)
+    if spec.date_format == "mixed":
+        rng = random.Random(spec.seed + 1)
+        return lambda when: when.strftime(rng.choice(MIXED_DATE_FORMATS))
+    layout = DATE_FORMATS.get(spec.date_format, spec.date_format)
+    return lambda when: when.strftime(layout)
+
+
+def _cells(spec: StatementSpec, date_cells: bool):
+    """Header and rows with dates rendered for the target format"""
+    render = date_renderer(spec, date_cells)
+    rows = generate_rows(spec)
+    for row in rows:
+        row[1] = render(row[1])
+    return header(spec), rows
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime(EXCEL_TEXT_DATE_FORMAT)
+    return str(value)
+
+
+def write_xlsx(spec: StatementSpec) -> bytes:
+    from openpyxl import Workbook
+
+    head, rows = _cells(spec, date_cells=True)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Statement")
+    sheet.append(head)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return _fixed_timestamps(buffer.getvalue())
+
+
+def _fixed_timestamps(xlsx: bytes) -> bytes:
+    """
+    Rewrite a saved workbook with a fixed save time in its properties and
+    zip entries, so the same spec always gives the same bytes
+    """
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(xlsx)) as source, \
+            zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == "docProps/core.xml":
+                data = re.sub(
+                    rb"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z",
+                    b"2025-01-01T00:00:00Z",
+                    data,
+                )
+            target.writestr(
+                zipfile.ZipInfo(item.filename, date_time=(2025, 1, 1, 0, 0, 0)),
+                data,
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+    return output.getvalue()
+
+
+def write_html(spec: StatementSpec) -> bytes:
+    """An HTML table, as banks export "Excel" statements"""
+    head, rows = _cells(spec, date_cells=False)
+    parts = [
+        '<html><head>'
+        '<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'
+        '</head><body><table border="1">',
+        "<tr>" + "".join(f"<th>{escape(name)}</th>" for name in head) + "</tr>",
+    ]
+    for row in rows:
+        parts.append(
+            "<tr>"
+            + "".join(f"<td>{escape(_text(value))}</td>" for value in row)
+            + "</tr>"
+        )
+    parts.append("</table></body></html>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def write_spreadsheetml(spec: StatementSpec) -> bytes:
+    """An Excel 2003 XML workbook"""
+    head, rows = _cells(spec, date_cells=True)
+
+    def cell(value) -> str:
+        if value is None:
+            return "<Cell/>"
+        if isinstance(value, datetime):
+            stamp = value.strftime("%Y-%m-%dT%H:%M:%S.000")
+            return f'<Cell><Data ss:Type="DateTime">{stamp}</Data></Cell>'
+        kind = "Number" if isinstance(value, (int, float)) else "String"
+        return f'<Cell><Data ss:Type="{kind}">{escape(str(value))}</Data></Cell>'
+
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<?mso-application progid="Excel.Sheet"?>',
+        '<Workbook xmlns="urn:schemas-microsoft-com:office:spreadsheet" '
+        'xmlns:ss="urn:schemas-microsoft-com:office:spreadsheet">',
+        '<Worksheet ss:Name="Statement"><Table>',
+        "<Row>" + "".join(cell(name) for name in head) + "</Row>",
+    ]
+    for row in rows:
+        parts.append("<Row>" + "".join(cell(value) for value in row) + "</Row>")
+    parts.append("</Table></Worksheet></Workbook>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def delimited_writer(delimiter: str) -> Callable[[StatementSpec], bytes]:
+    def write(spec: StatementSpec) -> bytes:
+        head, rows = _cells(spec, date_cells=False)
+        lines = [delimiter.join(head)]
+        lines.extend(delimiter.join(_text(value) for value in row) for row in rows)
+        return ("\n".join(lines) + "\n").encode("utf-8")
+    return write
+
+
+# BIFF8 records of a minimal Excel 97-2003 workbook
+XLS_BOF, XLS_EOF, XLS_CODEPAGE, XLS_FONT = 0x0809, 0x000A, 0x0042, 0x0031
+XLS_XF, XLS_BOUNDSHEET, XLS_DIMENSIONS = 0x00E0, 0x0085, 0x0200
+XLS_NUMBER, XLS_LABEL = 0x0203, 0x0204
+# Built-in number format 22 is "m/d/yy h:mm", which marks a number as a date
+XLS_GENERAL_XF, XLS_DATE_XF = 0, 1
+XLS_EPOCH = datetime(1899, 12, 30)
+
+
+def _record(kind: int, data: bytes) -> bytes:
+    return struct.pack("<HH", kind, len(data)) + data
+
+
+def _xls_string(text: str, length_format: str) -> bytes:
+    try:
+        return struct.pack(length_format, len(text)) + b"\x00" + text.encode("latin-1")
+    except UnicodeEncodeError:
+        return (
+            struct.pack(length_format, len(text)) + b"\x01" + text.encode("utf-16-le")
+        )
+
+
+def _xls_cell(row: int, col: int, value) -> bytes:
+    if value is None:
+        return b""
+    if isinstance(value, datetime):
+        serial = (value - XLS_EPOCH).total_seconds() / 86400
+        return _record(XLS_NUMBER, struct.pack("<HHHd", row, col, XLS_DATE_XF, serial))
+    if isinstance(value, (int, float)):
+        return _record(
+            XLS_NUMBER, struct.pack("<HHHd", row, col, XLS_GENERAL_XF, value)
+        )
+    return _record(
+        XLS_LABEL,
+        struct.pack("<HHH", row, col, XLS_GENERAL_XF) + _xls_string(str(value), "<H"),
+    )
+
+
+def _xls_workbook_stream(head: list, rows: list[list]) -> bytes:
+    """The BIFF8 Workbook stream: globals, then the one worksheet"""
+    bof = struct.pack("<HHHHII", 0x0600, 0x0005, 0x0DBB, 0x07CC, 0, 6)
+    font = struct.pack("<HHHHHBBBB", 200, 0, 0x7FFF, 400, 0, 0, 0, 0, 0) + _xls_string(
+        "Arial", "<B"
+    )
+    xf = struct.pack("<HHHBBBBIIH", 0, 0, 0x0001, 0x20, 0, 0, 0, 0, 0, 0x20C0)
+    date_xf = struct.pack("<HHHBBBBIIH", 0, 22, 0x0001, 0x20, 0, 0, 0, 0, 0, 0x20C0)
+    name = _xls_string("Statement", "<B")
+
+    cells = bytearray()
+    for row_number, row in enumerate([head, *rows]):
+        for col, value in enumerate(row):
+            cells += _xls_cell(row_number, col, value)
+    sheet = (
+        _record(XLS_BOF, struct.pack("<HHHHII", 0x0600, 0x0010, 0x0DBB, 0x07CC, 0, 6))
+        + _record(
+            XLS_DIMENSIONS, struct.pack("<IIHHH", 0, len(rows) + 1, 0, len(head), 0)
+        )
+        + bytes(cells)
+        + _record(XLS_EOF, b"")
+    )
+
+    def workbook_globals(sheet_offset: int) -> bytes:
+        return (
+            _record(XLS_BOF, bof)
+            + _record(XLS_CODEPAGE, struct.pack("<H", 1200))
+            + _record(XLS_FONT, font)
+            + _record(XLS_XF, xf)
+            + _record(XLS_XF, date_xf)
+            + _record(XLS_BOUNDSHEET, struct.pack("<IBB", sheet_offset, 0, 0) + name)
+            + _record(XLS_EOF, b"")
+        )
+
+    # The sheet follows the globals, whose size does not depend on the offset
+    return workbook_globals(len(workbook_globals(0))) + sheet
+
+
+# OLE2 compound document layout, for the container of an xls file
+OLE_SECTOR = 512
+OLE_FREE, OLE_END_OF_CHAIN, OLE_FAT_SECTOR, OLE_DIFAT_SECTOR = (
+    0xFFFFFFFF,
+    0xFFFFFFFE,
+    0xFFFFFFFD,
+    0xFFFFFFFC,
+)
+OLE_MINI_STREAM_CUTOFF = 4096
+OLE_HEADER_DIFAT = 109
+
+
+def _ole_entry(name: str, kind: int, child: int, start: int, size: int) -> bytes:
+    encoded = (name + "\0").encode("utf-16-le") if name else b""
+    return struct.pack(
+        "<64sHBBIII16sIQQIQ",
+        encoded,
+        len(encoded),
+        kind,
+        1,
+        OLE_FREE,
+        OLE_FREE,
+        child,
+        b"",
+        0,
+        0,
+        0,
+        start,
+        size,
+    )
+
+
+def _ole_document(stream: bytes) -> bytes:
+    """
+    A compound document holding one Workbook stream
+    The stream is padded past the mini stream cutoff so it lives in regular
+    sectors, which leaves the document without a mini FAT
+    """
+    stream = stream.ljust(OLE_MINI_STREAM_CUTOFF, b"\0")
+    stream_sectors = -(-len(stream) // OLE_SECTOR)
+    fat_sectors = difat_sectors = 0
+    while True:
+        total = stream_sectors + 1 + fat_sectors + difat_sectors
+        needed_fat = -(-total // (OLE_SECTOR // 4))
+        needed_difat = -(
+            -max(0, needed_fat - OLE_HEADER_DIFAT) // (OLE_SECTOR // 4 - 1)
+        )
+        if (needed_fat, needed_difat) == (fat_sectors, difat_sectors):
+            break
+        fat_sectors, difat_sectors = needed_fat, needed_difat
+
+    directory_sector = stream_sectors
+    first_fat = directory_sector + 1
+    first_difat = first_fat + fat_sectors
+    fat = [OLE_FREE] * (fat_sectors * OLE_SECTOR // 4)
+    for sector in range(stream_sectors - 1):
+        fat[sector] = sector + 1
+    fat[stream_sectors - 1] = OLE_END_OF_CHAIN
+    fat[directory_sector] = OLE_END_OF_CHAIN
+    for sector in range(first_fat, first_difat):
+        fat[sector] = OLE_FAT_SECTOR
+    for sector in range(first_difat, first_difat + difat_sectors):
+        fat[sector] = OLE_DIFAT_SECTOR
+
+    fat_locations = list(range(first_fat, first_difat))
+    header_difat = fat_locations[:OLE_HEADER_DIFAT]
+    header_difat += [OLE_FREE] * (OLE_HEADER_DIFAT - len(header_difat))
+    header = struct.pack(
+        "<8s16sHHHHH6sIIIIIIIII",
+        b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",
+        b"",
+        0x003E,
+        0x0003,
+        0xFFFE,
+        9,
+        6,
+        b"",
+        0,
+        fat_sectors,
+        directory_sector,
+        0,
+        OLE_MINI_STREAM_CUTOFF,
+        OLE_END_OF_CHAIN,
+        0,
+        first_difat if difat_sectors else OLE_END_OF_CHAIN,
+        difat_sectors,
+    ) + struct.pack(f"<{OLE_HEADER_DIFAT}I", *header_difat)
+
+    directory = (
+        _ole_entry("Root Entry", 5, 1, OLE_END_OF_CHAIN, 0)
+        + _ole_entry("Workbook", 2, OLE_FREE, 0, len(stream))
+        + _ole_entry("", 0, OLE_FREE, 0, 0) * 2
+    )
+
+    difat = bytearray()
+    remaining = fat_locations[OLE_HEADER_DIFAT:]
+    per_sector = OLE_SECTOR // 4 - 1
+    for n in range(difat_sectors):
+        entries = remaining[n * per_sector:(n + 1) * per_sector]
+        entries += [OLE_FREE] * (per_sector - len(entries))
+        following = first_difat + n + 1 if n < difat_sectors - 1 else OLE_END_OF_CHAIN
+        difat += struct.pack(f"<{per_sector + 1}I", *entries, following)
+
+    return b"".join([
+        header,
+        stream.ljust(stream_sectors * OLE_SECTOR, b"\0"),
+        directory,
+        struct.pack(f"<{len(fat)}I", *fat),
+        bytes(difat),
+    ])
+
+
+def write_xls(spec: StatementSpec) -> bytes:
+    """A real Excel 97-2003 workbook, limited to its 65536 rows"""
+    if spec.rows + 1 > XLS_MAX_ROWS:
+        raise ValueError(f"xls holds at most {XLS_MAX_ROWS - 1} data rows")
+    head, rows = _cells(spec, date_cells=True)
+    return _ole_document(_xls_workbook_stream(head, rows))
+
+
+# Format name: (file extension, writer). Exports of every kind except xlsx
+# reach the service named .xls, whatever their content
+FORMATS: dict[str, tuple[str, Callable[[StatementSpec], bytes]]] = {
+    "xlsx": ("xlsx", write_xlsx),
+    "xls": ("xls", write_xls),
+    "html": ("xls", write_html),
+    "spreadsheetml": ("xls", write_spreadsheetml),
+    "csv": ("xls", delimited_writer(",")),
+    "tsv": ("xls", delimited_writer("\t")),
+    "semicolon": ("xls", delimited_writer(";")),
+    "pipe": ("xls", delimited_writer("|")),
+}
+
+
+def generate(fmt: str, spec: StatementSpec) -> tuple[str, bytes]:
+    """Filename and content of a synthetic statement in the given format"""
+    extension, writer = FORMATS[fmt]
+    return f"statement_{fmt}_{spec.rows}.{extension}", writer(spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--format", choices=FORMATS, default="xlsx")
+    parser.add_argument("--rows", type=int, default=StatementSpec.rows)
+    parser.add_argument("--date-format", default=StatementSpec.date_format,
+                        help=f"one of {', '.join(DATE_FORMATS)} or a strftime layout")
+    parser.add_argument(
+        "--columns", type=int, default=StatementSpec.columns, help="extra columns"
+    )
+    parser.add_argument("--cell-width", type=int, default=StatementSpec.cell_width)
+    parser.add_argument("--debit-share", type=float, default=StatementSpec.debit_share)
+    parser.add_argument(
+        "--unusable-share", type=float, default=StatementSpec.unusable_share
+    )
+    parser.add_argument("--days", type=int, default=StatementSpec.days)
+    parser.add_argument("--seed", type=int, default=StatementSpec.seed)
+    parser.add_argument(
+        "-o", "--output", help="file to write, named after the format by default"
+    )
+    args = parser.parse_args()
+
+    spec = StatementSpec(
+        rows=args.rows,
+        date_format=args.date_format,
+        columns=args.columns,
+        cell_width=args.cell_width,
+        debit_share=args.debit_share,
+        unusable_share=args.unusable_share,
+        days=args.days,
+        seed=args.seed,
+    )
+    filename, content = generate(args.format, spec)
+    output = args.output or filename
+    with open(output, "wb") as f:
+        f.write(content)
+    print(f"{output}: {args.rows:,} rows, {len(content):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
 from mangum import Mangum
-from app.main import app
+from app.main import app, startup_event
 
 # Create the Mangum handler for AWS Lambda
+# Mangum's lifespan support runs startup and shutdown around every invocation,
+# so the startup work runs once per container from lambda_handler instead
 handler = Mangum(app, lifespan="off")
 
+_started = False
+
 def lambda_handler(event, context):
     """
     AWS Lambda entry point
-    Uses Mangum to adapt FastAPI for Lambda
+    Uses Mangum to adapt FastAPI for Lambda; the first invocation of a
+    container restores the database from S3 and creates the tables
     """
-    return handler(event, context)
\ No newline at end of file
+    global _started
+    if not _started:
+        startup_event()
+        _started = True
+    return handler(event, context)
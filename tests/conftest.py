@@ -0,0 +1,78 @@
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("PROCESSING_POOL", "thread")
+
+
+def pytest_configure(config):
+    # The app keeps its database and outputs in the working directory, set
+    # up when it is imported, so tests run it from a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="toll-tests-"))
+
+
+def make_statement(rows: int = 20, start_day: int = 1) -> bytes:
+    """A small delimited statement as banks export it, debits on a few days"""
+    lines = ["SR NO,TRANSACTION_DATE,TRANSACTIONID,TRANSACTIONTYPE,AMOUNT IN RS"]
+    for n in range(rows):
+        day = start_day + n % 3
+        kind = "Debit" if n % 4 else "Credit"
+        lines.append(f"{n + 1},{day:02d}-Jun-25,{1000000000 + n},{kind},{65 + n}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+@pytest.fixture
+def statement() -> bytes:
+    return make_statement()
+
+
+@pytest.fixture
+def statement_factory():
+    return make_statement
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db():
+    from app.database import SessionLocal, create_tables
+
+    create_tables()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    """A user with no password, for tests that only need an owner"""
+    import uuid
+
+    from app.database import User
+
+    user = User(email=f"{uuid.uuid4().hex}@example.com", hashed_password="-")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+@pytest.fixture
+def auth_headers(user):
+    from app.auth import create_access_token, token_claims
+
+    return {"Authorization": f"Bearer {create_access_token(data=token_claims(user))}"}
@@ -0,0 +1,70 @@
+import io
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from app.output_formats import OUTPUT_FORMATS
+
+COLUMNS = ["Toll Route", "Total Amount", "Date"]
+
+
+def read_body(name: str, body: bytes) -> pd.DataFrame:
+    """A downloaded result as a frame of strings, whatever its format"""
+    if name == "csv":
+        df = pd.read_csv(io.BytesIO(body), dtype=str)
+    elif name == "parquet":
+        df = pd.read_parquet(io.BytesIO(body))
+    elif name == "arrow":
+        df = pa.ipc.open_file(pa.BufferReader(body)).read_pandas()
+    elif name == "ndjson":
+        df = pd.DataFrame([json.loads(line) for line in body.splitlines()])
+    else:
+        df = pd.read_excel(io.BytesIO(body))
+    dates = pd.to_datetime(df["Date"], dayfirst=name == "csv")
+    df["Date"] = dates.dt.strftime("%d/%m/%Y")
+    df["Total Amount"] = df["Total Amount"].astype(float)
+    df["Toll Route"] = df["Toll Route"].astype(str)
+    return df[COLUMNS]
+
+
+def process(client, content: bytes, **params):
+    return client.post(
+        "/process-toll-data", params=params, files={"file": ("statement.xls", content)}
+    )
+
+
+@pytest.fixture
+def expected(client, statement):
+    response = process(client, statement)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    return read_body("csv", response.content)
+
+
+@pytest.mark.parametrize("name", list(OUTPUT_FORMATS))
+def test_every_output_format_holds_the_same_result(client, statement, expected, name):
+    fmt = OUTPUT_FORMATS[name]
+    response = process(client, statement, format=name)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(fmt.media_type)
+    disposition = response.headers["content-disposition"]
+    assert disposition.endswith(f'.{fmt.extension}"')
+    pd.testing.assert_frame_equal(read_body(name, response.content), expected)
+
+
+def test_format_from_accept_header(client, statement, expected):
+    response = client.post(
+        "/process-toll-data",
+        files={"file": ("statement.xls", statement)},
+        headers={"Accept": "text/csv;q=0.5, application/x-ndjson"},
+    )
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    pd.testing.assert_frame_equal(read_body("ndjson", response.content), expected)
+
+
+def test_unknown_format_is_rejected(client, statement):
+    response = process(client, statement, format="pdf")
+    assert response.status_code == 400
+    assert "Unsupported output format" in response.json()["detail"]
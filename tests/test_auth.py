@@ -0,0 +1,172 @@
+import uuid
+
+import pytest
+
+from app import auth
+from app.auth import RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth.time, "monotonic", clock)
+    return clock
+
+
+def test_burst_then_limited_until_refilled(clock):
+    limiter = RateLimiter(rate_per_minute=6, burst=3)
+
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    # One attempt every 10 seconds after the burst
+    assert limiter.acquire("a") == 10
+    clock.now += 4
+    assert limiter.acquire("a") == 6
+    clock.now += 6
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == 10
+    assert limiter.limited == 3
+
+
+def test_clients_have_separate_buckets(clock):
+    limiter = RateLimiter(rate_per_minute=1, burst=1)
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") > 0
+    assert limiter.acquire("b") == 0
+
+
+def test_idle_client_refills_to_burst_only(clock):
+    limiter = RateLimiter(rate_per_minute=60, burst=2)
+    limiter.acquire("a")
+    clock.now += 3600
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 1]
+
+
+def test_zero_rate_turns_limiting_off(clock):
+    limiter = RateLimiter(rate_per_minute=0, burst=1)
+    assert all(limiter.acquire("a") == 0 for _ in range(100))
+    assert limiter.limited == 0
+
+
+def test_least_recently_seen_clients_are_dropped(clock):
+    limiter = RateLimiter(rate_per_minute=1, burst=1, max_clients=2)
+    for client in ("a", "b", "c"):
+        assert limiter.acquire(client) == 0
+    # "a" was dropped, so it starts again from a full bucket
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("c") > 0
+
+
+def test_login_endpoint_returns_retry_after(client, monkeypatch, clock):
+    monkeypatch.setattr(auth, "login_limiter", RateLimiter(rate_per_minute=2, burst=2))
+    credentials = {"email": "nobody@example.com", "password": "wrong password"}
+
+    statuses = [client.post("/auth/login", json=credentials) for _ in range(3)]
+    assert [r.status_code for r in statuses] == [401, 401, 429]
+    assert statuses[-1].headers["retry-after"] == "30"
+
+
+@pytest.fixture
+def count_email_lookups(monkeypatch):
+    lookups = []
+    get_user_by_email = auth.get_user_by_email
+
+    def counted(db, email):
+        lookups.append(email)
+        return get_user_by_email(db, email)
+
+    monkeypatch.setattr(auth, "get_user_by_email", counted)
+    return lookups
+
+
+def bearer(claims: dict) -> dict:
+    return {"Authorization": f"Bearer {auth.create_access_token(data=claims)}"}
+
+
+def test_cached_user_expires_after_the_ttl(clock, user):
+    cache = auth.UserCache()
+    cache.ttl = 60
+    cache.put(user)
+    clock.now += 59
+    assert cache.get(user.email) is user
+    clock.now += 1
+    assert cache.get(user.email) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_zero_ttl_turns_the_cache_off(clock, user):
+    cache = auth.UserCache()
+    cache.ttl = 0
+    cache.put(user)
+    assert cache.get(user.email) is None
+
+
+def test_least_recently_used_user_is_dropped(clock):
+    cache = auth.UserCache()
+    cache.max_size = 2
+    users = [auth.User(email=f"{name}@example.com") for name in "abc"]
+    cache.put(users[0])
+    cache.put(users[1])
+    assert cache.get("a@example.com") is users[0]
+    cache.put(users[2])
+    assert cache.get("b@example.com") is None
+    assert cache.get("a@example.com") is users[0]
+
+
+def test_requests_reuse_the_cached_user(
+    client, user, auth_headers, count_email_lookups
+):
+    auth.user_cache.invalidate(user.email)
+    hits = auth.user_cache.hits
+    for _ in range(3):
+        assert client.get("/auth/me", headers=auth_headers).json()["id"] == user.id
+    assert auth.user_cache.hits - hits == 2
+    assert count_email_lookups == []
+
+
+def test_token_user_id_loads_by_primary_key(client, user, count_email_lookups):
+    auth.user_cache.invalidate(user.email)
+    headers = bearer({"sub": user.email, "uid": user.id})
+    assert client.get("/auth/me", headers=headers).json()["id"] == user.id
+    assert count_email_lookups == []
+
+
+@pytest.mark.parametrize("uid", [None, "someone else's"])
+def test_email_lookup_without_a_matching_user_id(
+    client, db, user, count_email_lookups, uid
+):
+    claims = {"sub": user.email}
+    if uid is not None:
+        other = auth.User(email=f"other-{user.email}", hashed_password="-")
+        db.add(other)
+        db.commit()
+        claims["uid"] = other.id
+    auth.user_cache.invalidate(user.email)
+
+    assert client.get("/auth/me", headers=bearer(claims)).json()["id"] == user.id
+    assert count_email_lookups == [user.email]
+
+
+def test_signup_and_login_drop_the_cached_user(client):
+    email = f"{uuid.uuid4().hex}@example.com"
+    credentials = {"email": email, "password": "a long password"}
+    # A user cached before the email was (re)registered
+    auth.user_cache.put(auth.User(id=-1, email=email))
+
+    signup = client.post("/auth/signup", json=credentials)
+    assert signup.status_code == 200
+    assert auth.user_cache.get(email) is None
+
+    headers = {"Authorization": f"Bearer {signup.json()['access_token']}"}
+    client.get("/auth/me", headers=headers)
+    assert auth.user_cache.get(email) is not None
+
+    assert client.post("/auth/login", json=credentials).status_code == 200
+    assert auth.user_cache.get(email) is None
@@ -0,0 +1,105 @@
+import io
+import json
+import zipfile
+
+import pandas as pd
+import pytest
+
+from app.batch import expand_upload
+
+MB = 1024 * 1024
+
+
+def make_zip(members: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def no_extraction(monkeypatch):
+    """Fail the test if a member is read out of the zip"""
+    def read(self, name, pwd=None):
+        raise AssertionError(f"{name} was extracted")
+
+    monkeypatch.setattr(zipfile.ZipFile, "read", read)
+
+
+def test_statements_are_extracted_and_other_members_skipped():
+    content = make_zip({
+        "june.xlsx": b"a", "july.XLS": b"b", "notes.txt": b"c", "folder/": b"",
+    })
+    statements = expand_upload(
+        "batch.zip", content, MB, max_files=10, max_total_size=MB
+    )
+    assert statements == [("batch.zip/june.xlsx", b"a"), ("batch.zip/july.XLS", b"b")]
+
+
+def test_non_zip_upload_is_returned_as_is():
+    assert expand_upload("june.xlsx", b"a", MB, max_files=1, max_total_size=MB) == [
+        ("june.xlsx", b"a")
+    ]
+
+
+def test_too_many_members_rejected_before_extraction(no_extraction):
+    content = make_zip({f"{n}.xlsx": b"x" for n in range(4)})
+    with pytest.raises(ValueError, match="more than 3 statements"):
+        expand_upload("batch.zip", content, MB, max_files=3, max_total_size=MB)
+
+
+def test_oversized_member_rejected_before_extraction(no_extraction):
+    content = make_zip({"big.xlsx": b"\0" * (2 * MB)})
+    with pytest.raises(ValueError, match="big.xlsx in batch.zip"):
+        expand_upload("batch.zip", content, MB, max_files=10, max_total_size=10 * MB)
+
+
+def test_total_uncompressed_size_rejected_before_extraction(no_extraction):
+    # Each member is under the per-file limit and compresses to almost nothing
+    content = make_zip({f"{n}.xlsx": b"\0" * (MB // 2) for n in range(5)})
+    assert len(content) < MB // 10
+    with pytest.raises(ValueError, match="in total"):
+        expand_upload("batch.zip", content, MB, max_files=10, max_total_size=2 * MB)
+
+
+def test_invalid_zip_rejected():
+    with pytest.raises(ValueError, match="not a valid zip"):
+        expand_upload("batch.zip", b"not a zip", MB, max_files=10, max_total_size=MB)
+
+
+def test_batch_endpoint_limits_span_uploads(client, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, "MAX_BATCH_FILES", 3)
+    files = [
+        ("files", ("first.zip", make_zip({"a.xlsx": b"a", "b.xlsx": b"b"}))),
+        ("files", ("second.zip", make_zip({"c.xlsx": b"c", "d.xlsx": b"d"}))),
+    ]
+    response = client.post("/process-toll-data/batch", files=files)
+    assert response.status_code == 400
+    assert "more than 1 statements" in response.json()["detail"]
+
+    monkeypatch.setattr(main, "MAX_BATCH_FILES", 10)
+    monkeypatch.setattr(main, "MAX_BATCH_SIZE", 3)
+    response = client.post("/process-toll-data/batch", files=files)
+    assert response.status_code == 400
+    assert "in total" in response.json()["detail"]
+
+
+def test_batch_merges_results_with_their_source(client, statement, statement_factory):
+    second = statement_factory(rows=12, start_day=20)
+    response = client.post(
+        "/process-toll-data/batch",
+        files=[
+            ("files", ("june.xls", statement)),
+            ("files", ("july.xls", second)),
+            ("files", ("broken.xls", b"not a statement")),
+        ],
+    )
+    assert response.status_code == 200
+    merged = pd.read_csv(io.BytesIO(response.content), dtype=str)
+    assert list(merged.columns) == ["Source File", "Toll Route", "Total Amount", "Date"]
+    assert set(merged["Source File"]) == {"june.xls", "july.xls"}
+    failures = json.loads(response.headers["x-failed-files"])
+    assert [failure["file"] for failure in failures] == ["broken.xls"]
@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import zlib
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto import mock_s3
+
+from app import database_backup
+from app.database_backup import DELTA_HEADER, DELTA_MAGIC, DatabaseBackup
+from app.s3_service import s3_service
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "toll-automation")
+    with mock_s3():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=s3_service.bucket_name)
+        monkeypatch.setattr(s3_service, "_client", client)
+        yield client
+
+
+@pytest.fixture
+def make_backup(bucket, tmp_path):
+    """A backup of its own local database, as in a separate Lambda container"""
+    count = 0
+
+    def make() -> DatabaseBackup:
+        nonlocal count
+        count += 1
+        backup = DatabaseBackup()
+        backup.local_db_path = str(tmp_path / f"container{count}.db")
+        return backup
+
+    return make
+
+
+def write_rows(path: str, *values: str) -> None:
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE IF NOT EXISTS uploads (name TEXT)")
+    db.executemany("INSERT INTO uploads VALUES (?)", [(v,) for v in values])
+    db.commit()
+    db.close()
+
+
+def add_history(path: str, pages: int) -> None:
+    """Incompressible rows, so deltas stay smaller than the snapshot"""
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE history (data BLOB)")
+    db.executemany(
+        "INSERT INTO history VALUES (?)", [(os.urandom(3000),) for _ in range(pages)]
+    )
+    db.commit()
+    db.close()
+
+
+def read_rows(path: str) -> list[str]:
+    db = sqlite3.connect(path)
+    try:
+        assert db.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+        return [name for (name,) in db.execute("SELECT name FROM uploads")]
+    finally:
+        db.close()
+
+
+def objects(bucket) -> list[str]:
+    listing = bucket.list_objects_v2(Bucket=s3_service.bucket_name)
+    return sorted(item["Key"] for item in listing.get("Contents", []))
+
+
+def test_first_backup_ships_a_snapshot(bucket, make_backup):
+    writer = make_backup()
+    write_rows(writer.local_db_path, "june.xls")
+    assert writer.backup_database_to_s3()
+
+    keys = objects(bucket)
+    assert len(keys) == 1 and keys[0].endswith("/snapshot.db")
+
+    reader = make_backup()
+    assert reader.restore_database_from_s3()
+    assert read_rows(reader.local_db_path) == ["june.xls"]
+
+
+def test_later_backups_chain_deltas(bucket, make_backup):
+    writer = make_backup()
+    add_history(writer.local_db_path, pages=50)
+    write_rows(writer.local_db_path, "june.xls")
+    writer.backup_database_to_s3()
+    write_rows(writer.local_db_path, "july.xls")
+    writer.backup_database_to_s3()
+    write_rows(writer.local_db_path, "august.xls")
+    writer.backup_database_to_s3()
+
+    keys = objects(bucket)
+    assert [key.rsplit("/", 1)[1] for key in keys] == [
+        "0000000001.delta", "0000000002.delta", "snapshot.db"
+    ]
+
+    reader = make_backup()
+    assert reader.restore_database_from_s3()
+    assert reader._sequence == 2
+    assert read_rows(reader.local_db_path) == ["june.xls", "july.xls", "august.xls"]
+
+
+def test_unchanged_database_ships_nothing(bucket, make_backup):
+    writer = make_backup()
+    write_rows(writer.local_db_path, "june.xls")
+    writer.backup_database_to_s3()
+    assert writer.backup_database_to_s3()
+    assert len(objects(bucket)) == 1
+
+
+def test_restore_stops_at_a_delta_that_does_not_chain(bucket, make_backup):
+    writer = make_backup()
+    add_history(writer.local_db_path, pages=50)
+    write_rows(writer.local_db_path, "june.xls")
+    writer.backup_database_to_s3()
+    write_rows(writer.local_db_path, "july.xls")
+    writer.backup_database_to_s3()
+
+    # A delta made from some other image of the database
+    stray = DELTA_HEADER.pack(DELTA_MAGIC, 4096, 2, 0, b"\0" * 32, b"\0" * 32)
+    writer._put(f"{writer._generation}0000000002.delta", zlib.compress(stray))
+
+    reader = make_backup()
+    assert reader.restore_database_from_s3()
+    assert reader._sequence == 1
+    assert read_rows(reader.local_db_path) == ["june.xls", "july.xls"]
+
+
+def test_writer_whose_chain_was_continued_starts_a_new_generation(
+    bucket, make_backup
+):
+    first = make_backup()
+    add_history(first.local_db_path, pages=50)
+    write_rows(first.local_db_path, "june.xls")
+    first.backup_database_to_s3()
+    taken_over = first._generation
+
+    # A second container restores the same generation and extends it first
+    second = make_backup()
+    second.restore_database_from_s3()
+    write_rows(second.local_db_path, "from second")
+    second.backup_database_to_s3()
+    assert (second._generation, second._sequence) == (taken_over, 1)
+
+    write_rows(first.local_db_path, "from first")
+    assert first.backup_database_to_s3()
+    assert first._generation > taken_over
+    assert first._sequence == 0
+
+    reader = make_backup()
+    reader.restore_database_from_s3()
+    assert reader._generation == first._generation
+    assert read_rows(reader.local_db_path) == ["june.xls", "from first"]
+
+
+def test_generations_sort_in_the_order_they_were_started(
+    bucket, make_backup, monkeypatch
+):
+    # Every generation starts at the same instant
+    instant = SimpleNamespace(time_ns=lambda: 1760000000 * 10**9)
+    monkeypatch.setattr(database_backup, "time", instant)
+    writer = make_backup()
+    writer.snapshot_interval = 0
+    writer.generations_kept = 5
+
+    started = []
+    for n in range(4):
+        write_rows(writer.local_db_path, f"statement {n}")
+        writer.backup_database_to_s3()
+        started.append(writer._generation)
+
+    assert writer._generations() == started
+    reader = make_backup()
+    reader.restore_database_from_s3()
+    assert reader._generation == started[-1]
+    assert read_rows(reader.local_db_path) == [f"statement {n}" for n in range(4)]
+
+
+def test_old_generations_are_dropped(bucket, make_backup):
+    writer = make_backup()
+    writer.snapshot_interval = 0
+    for n in range(4):
+        write_rows(writer.local_db_path, f"statement {n}")
+        writer.backup_database_to_s3()
+
+    generations = writer._generations()
+    assert len(generations) == writer.generations_kept
+    assert generations[-1] == writer._generation
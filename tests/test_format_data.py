@@ -0,0 +1,82 @@
+import random
+
+import pandas as pd
+import pytest
+
+from app.toll_processor import TollProcessor
+
+
+def format_data_by_rows(processor: TollProcessor, df: pd.DataFrame) -> pd.DataFrame:
+    """The row-by-row _format_data this repo shipped before the columnar rewrite"""
+    essential_df = df[["TRANSACTIONID", "AMOUNT IN RS", "TRANSACTION_DATE"]].copy()
+    essential_df["TRANSACTION_DATE"] = processor._standardize_dates(
+        essential_df["TRANSACTION_DATE"]
+    )
+    essential_df = essential_df.sort_values("TRANSACTION_DATE")
+
+    formatted_rows = []
+    for date_val, group in essential_df.groupby("TRANSACTION_DATE"):
+        group_list = group.to_dict("records")
+        for i in range(0, len(group_list), 8):
+            chunk = group_list[i : i + 8]
+            formatted_rows.append(
+                {
+                    "Transaction ID": "-".join(
+                        str(row["TRANSACTIONID"])[-4:] for row in chunk
+                    ),
+                    "No. Entries": len(chunk),
+                    "Amount": sum(row["AMOUNT IN RS"] for row in chunk),
+                    "Date": date_val,
+                }
+            )
+    return pd.DataFrame(formatted_rows)
+
+
+def debits(per_day: list[int], seed: int = 0) -> pd.DataFrame:
+    """Debit rows, per_day[n] of them on day n + 1, shuffled as in an export"""
+    rng = random.Random(seed)
+    rows = [
+        {
+            "TRANSACTIONID": 1000000000 + rng.randrange(10**8),
+            "AMOUNT IN RS": rng.choice([35, 65, 90, 125.5]),
+            "TRANSACTION_DATE": f"{day + 1:02d}-Jun-25",
+            "TRANSACTIONTYPE": "Debit",
+        }
+        for day, count in enumerate(per_day)
+        for _ in range(count)
+    ]
+    rng.shuffle(rows)
+    return pd.DataFrame(rows)
+
+
+def format_data(df: pd.DataFrame, copy_free: bool = False) -> pd.DataFrame:
+    processor = TollProcessor(copy_free=copy_free)
+    with processor._pipeline_options():
+        return processor._format_data(df)
+
+
+@pytest.mark.parametrize("copy_free", [False, True])
+@pytest.mark.parametrize("entries", [1, 7, 8, 9, 17])
+def test_matches_row_loop_for_one_day(entries, copy_free):
+    df = debits([entries])
+    expected = format_data_by_rows(TollProcessor(), df)
+    result = format_data(df, copy_free)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("copy_free", [False, True])
+def test_matches_row_loop_across_days(copy_free):
+    df = debits([1, 7, 8, 9, 17, 0, 16, 3], seed=1)
+    expected = format_data_by_rows(TollProcessor(), df)
+    result = format_data(df, copy_free)
+    pd.testing.assert_frame_equal(result, expected)
+    assert list(result["No. Entries"]) == [1, 7, 8, 8, 1, 8, 8, 1, 8, 8, 3]
+
+
+def test_string_transaction_ids_and_mixed_date_layouts():
+    df = debits([9, 2], seed=2)
+    df["TRANSACTIONID"] = df["TRANSACTIONID"].astype(str).radd("TXN")
+    df.loc[df.index[:3], "TRANSACTION_DATE"] = "01/06/2025"
+    expected = format_data_by_rows(TollProcessor(), df)
+    result = format_data(df)
+    pd.testing.assert_frame_equal(result, expected)
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import UploadHistory, get_user_uploads_page
+
+
+@pytest.fixture
+def uploads(db, user):
+    """25 uploads, several of them sharing an upload time"""
+    start = datetime(2025, 6, 1, 12, 0, 0)
+    records = [
+        UploadHistory(
+            user_id=user.id,
+            original_filename=f"statement_{n}.xlsx",
+            processed_filename=f"processed_{user.id}_{n}.csv",
+            file_size=1000 + n,
+            upload_date=start + timedelta(minutes=n // 3),
+        )
+        for n in range(25)
+    ]
+    db.add_all(records)
+    db.commit()
+    # Newest first, the later insert first among uploads of the same time
+    return sorted(records, key=lambda r: (r.upload_date, r.id), reverse=True)
+
+
+def test_pages_follow_each_other_without_gaps(db, user, uploads):
+    seen, before = [], None
+    while True:
+        page = get_user_uploads_page(db, user.id, limit=4, before=before)
+        seen.extend(page)
+        if len(page) < 4:
+            break
+        before = (page[-1].upload_date, page[-1].id)
+    assert [r.id for r in seen] == [r.id for r in uploads]
+
+
+def test_history_endpoint_pages_with_cursors(client, user, uploads, auth_headers):
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/history", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        body = response.json()
+        ids.extend(upload["id"] for upload in body["uploads"])
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == 3
+    assert ids == [r.id for r in uploads]
+
+
+def test_exact_last_page_has_no_next_cursor(client, user, uploads, auth_headers):
+    response = client.get("/history", params={"limit": 25}, headers=auth_headers)
+    body = response.json()
+    assert len(body["uploads"]) == 25
+    assert body["next_cursor"] is None
+
+
+def test_invalid_cursor_is_rejected(client, auth_headers):
+    response = client.get("/history", params={"cursor": "@@@"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_history_needs_a_login(client):
+    assert client.get("/history").status_code in (401, 403)
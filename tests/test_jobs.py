@@ -0,0 +1,128 @@
+import asyncio
+import os
+import time
+import uuid
+
+import pytest
+
+from app import jobs as jobs_module
+from app.database import SessionLocal, create_job, create_tables, get_job
+from app.jobs import JobRunner
+
+
+@pytest.fixture
+def runner(tmp_path):
+    create_tables()
+    return JobRunner(str(tmp_path / "jobs"), str(tmp_path / "outputs"))
+
+
+def submit_job(runner: JobRunner, content: bytes) -> tuple[str, str]:
+    job_id = str(uuid.uuid4())
+    input_path = runner.input_path(job_id, "statement.xls")
+    with open(input_path, "wb") as f:
+        f.write(content)
+    db = SessionLocal()
+    try:
+        create_job(db, job_id=job_id, user_id=None,
+                   original_filename="statement.xls", file_size=len(content))
+    finally:
+        db.close()
+    return job_id, input_path
+
+
+def job_status(job_id: str) -> str:
+    db = SessionLocal()
+    try:
+        return get_job(db, job_id).status
+    finally:
+        db.close()
+
+
+async def wait_for_status(job_id: str, *statuses: str) -> str:
+    for _ in range(200):
+        status = await asyncio.to_thread(job_status, job_id)
+        if status in statuses:
+            return status
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job {job_id} never reached {statuses}")
+
+
+def test_job_cancelled_by_shutdown_keeps_input_and_resumes(
+    runner, statement, monkeypatch, tmp_path
+):
+    os.makedirs(runner.output_dir, exist_ok=True)
+    job_id, input_path = submit_job(runner, statement)
+    started = asyncio.Event()
+
+    async def hang(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(3600)
+
+    async def interrupted_run():
+        monkeypatch.setattr(jobs_module.processing_pool, "run_cpu", hang)
+        await runner.submit(job_id)
+        await asyncio.wait_for(started.wait(), 5)
+        workers = runner._workers
+        runner.shutdown()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    asyncio.run(interrupted_run())
+    assert os.path.exists(input_path)
+    monkeypatch.undo()
+
+    async def restarted():
+        restarted_runner = JobRunner(runner.jobs_dir, runner.output_dir)
+        await restarted_runner.resume()
+        status = await wait_for_status(job_id, "completed", "failed")
+        restarted_runner.shutdown()
+        return status
+
+    assert asyncio.run(restarted()) == "completed"
+    assert not os.path.exists(input_path)
+
+
+def test_failed_job_removes_input(runner):
+    job_id, input_path = submit_job(runner, b"not a statement at all")
+
+    async def run():
+        await runner.submit(job_id)
+        status = await wait_for_status(job_id, "completed", "failed")
+        runner.shutdown()
+        return status
+
+    assert asyncio.run(run()) == "failed"
+    assert not os.path.exists(input_path)
+
+
+def test_jobs_endpoint_runs_each_upload(client, statement, statement_factory):
+    files = [
+        ("files", ("june.xls", statement)),
+        ("files", ("july.xls", statement_factory(rows=9, start_day=20))),
+    ]
+    response = client.post("/jobs", files=files)
+    assert response.status_code == 202
+    job_ids = [job["id"] for job in response.json()["jobs"]]
+    assert len(job_ids) == 2
+
+    for job_id in job_ids:
+        for _ in range(200):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] in ("completed", "failed"):
+                break
+            time.sleep(0.05)
+        assert job["status"] == "completed", job
+        assert set(job["progress"]) >= {"import", "format", "write_output"}
+        link = client.get(job["download_url"]).json()["download_url"]
+        download = client.get(link)
+        assert download.status_code == 200
+        assert download.content.startswith(b"Toll Route,Total Amount,Date")
+
+    assert client.get("/jobs/no-such-job").status_code == 404
+
+
+def test_jobs_are_refused_in_lambda(client, statement, monkeypatch):
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "toll-automation")
+    response = client.post("/jobs", files=[("files", ("june.xls", statement))])
+    assert response.status_code == 501
+    assert "/process-toll-data" in response.json()["detail"]
+    assert client.get("/jobs/any-job").status_code == 501
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import pytest
+
+
+def http_event(path: str) -> dict:
+    """An API Gateway HTTP API (payload 2.0) request"""
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"host": "example.execute-api.us-east-1.amazonaws.com"},
+        "requestContext": {
+            "http": {
+                "method": "GET",
+                "path": path,
+                "protocol": "HTTP/1.1",
+                "sourceIp": "203.0.113.1",
+                "userAgent": "pytest",
+            },
+            "stage": "$default",
+        },
+        "isBase64Encoded": False,
+    }
+
+
+@pytest.fixture
+def lambda_module(monkeypatch):
+    import lambda_handler
+    from app import main
+
+    calls = []
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "toll-automation")
+    monkeypatch.setattr(
+        main.db_backup, "restore_database_from_s3", lambda: calls.append("restore")
+    )
+    monkeypatch.setattr(main, "create_tables", lambda: calls.append("create_tables"))
+    monkeypatch.setattr(lambda_handler, "_started", False)
+    # Mangum runs the app on the thread's event loop, which asyncio.run in
+    # other tests leaves closed
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield lambda_handler, calls
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+def test_first_invocation_restores_database_once(lambda_module):
+    module, calls = lambda_module
+
+    for _ in range(2):
+        response = module.lambda_handler(http_event("/health"), None)
+        assert response["statusCode"] == 200
+        assert json.loads(response["body"])["status"]
+
+    assert calls == ["restore", "create_tables"]
+
+
+def test_failed_startup_is_retried(lambda_module, monkeypatch):
+    module, calls = lambda_module
+    from app import main
+
+    def unavailable():
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(main, "create_tables", unavailable)
+    with pytest.raises(RuntimeError):
+        module.lambda_handler(http_event("/health"), None)
+
+    monkeypatch.setattr(main, "create_tables", lambda: calls.append("create_tables"))
+    assert module.lambda_handler(http_event("/health"), None)["statusCode"] == 200
+    assert calls == ["restore", "restore", "create_tables"]
@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+from app.metrics import CONTENT_TYPE, MetricsRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.delenv("METRICS_DIR", raising=False)
+    registry = MetricsRegistry()
+    registry.metrics_dir = str(tmp_path)
+    return registry
+
+
+def test_render_counters_and_histograms(registry):
+    requests = registry.counter("app_requests", "Requests served", ("route",))
+    latency = registry.histogram("app_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc("/a")
+    requests.inc("/a")
+    requests.inc('/b"quoted"', amount=3)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5.0)
+
+    assert registry.render().splitlines() == [
+        "# HELP app_requests Requests served",
+        "# TYPE app_requests counter",
+        'app_requests_total{route="/a"} 2.0',
+        'app_requests_total{route="/b\\"quoted\\""} 3.0',
+        "# HELP app_latency_seconds Latency",
+        "# TYPE app_latency_seconds histogram",
+        'app_latency_seconds_bucket{le="0.1"} 1',
+        'app_latency_seconds_bucket{le="1.0"} 2',
+        'app_latency_seconds_bucket{le="+Inf"} 3',
+        "app_latency_seconds_sum 5.55",
+        "app_latency_seconds_count 3",
+    ]
+
+
+def test_render_sums_the_files_of_other_workers(registry, tmp_path):
+    requests = registry.counter("app_requests", "Requests served", ("route",))
+    latency = registry.histogram("app_latency_seconds", "Latency", buckets=(1.0,))
+    requests.inc("/a")
+    latency.observe(0.5)
+
+    # Another worker's flushed values, and one half-written file
+    other = {"app_requests": [[["/a"], 4.0], [["/c"], 1.0]],
+             "app_latency_seconds": [[[], [0, 2, 7.0]]]}
+    (tmp_path / "metrics_99999.json").write_text(json.dumps(other))
+    (tmp_path / "metrics_99998.json").write_text('{"app_requests": [')
+
+    lines = registry.render().splitlines()
+    assert 'app_requests_total{route="/a"} 5.0' in lines
+    assert 'app_requests_total{route="/c"} 1.0' in lines
+    assert 'app_latency_seconds_bucket{le="1.0"} 1' in lines
+    assert 'app_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "app_latency_seconds_sum 7.5" in lines
+
+
+def test_flush_writes_this_process_file(registry, tmp_path):
+    registry.counter("app_requests", "Requests served").inc()
+    registry.flush()
+    with open(tmp_path / f"metrics_{os.getpid()}.json") as f:
+        assert json.load(f) == {"app_requests": [[[], 1.0]]}
+    # The process's own file is not counted twice
+    assert "app_requests_total 1.0" in registry.render().splitlines()
+
+
+def test_metrics_endpoint(client):
+    client.get("/health")
+    client.get("/no-such-page")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == f"{CONTENT_TYPE}; charset=utf-8"
+    lines = response.text.splitlines()
+    assert "# TYPE toll_http_requests counter" in lines
+    health = 'toll_http_requests_total{method="GET",route="/health",status="200"}'
+    assert any(line.startswith(health + " ") for line in lines)
+    unmatched = 'toll_http_requests_total{method="GET",route="unmatched",status="404"}'
+    assert any(line.startswith(unmatched + " ") for line in lines)
@@ -0,0 +1,65 @@
+import json
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from app.output_formats import OUTPUT_FORMATS, encode_chunk, read_result, write_result
+
+
+@pytest.fixture
+def result():
+    """A processed result in which one statement date could not be parsed"""
+    return pd.DataFrame(
+        {
+            "Toll Route": ["0001-0002", "0003", "0004"],
+            "Total Amount": [185.0, 65.0, 120.5],
+            "Date": ["01/06/2025", "not a date", "15/06/2025"],
+        }
+    )
+
+
+@pytest.mark.parametrize("name", list(OUTPUT_FORMATS))
+def test_write_result_with_unparseable_date(tmp_path, result, name):
+    fmt = OUTPUT_FORMATS[name]
+    path = str(tmp_path / f"result.{fmt.extension}")
+
+    write_result(result, path, fmt)
+    back = read_result(path, fmt)
+
+    assert back["Date"].iloc[0] == "01/06/2025"
+    assert back["Date"].iloc[2] == "15/06/2025"
+    assert list(back["Total Amount"]) == [185.0, 65.0, 120.5]
+
+
+@pytest.mark.parametrize("name", ["parquet", "arrow"])
+def test_typed_formats_store_unparseable_date_as_null(tmp_path, result, name):
+    fmt = OUTPUT_FORMATS[name]
+    path = str(tmp_path / f"result.{fmt.extension}")
+
+    write_result(result, path, fmt)
+
+    back = read_result(path, fmt)
+    assert back["Date"].isna().tolist() == [False, True, False]
+    if name == "parquet":
+        assert str(pq.read_schema(path).field("Date").type) == "date32[day]"
+
+
+@pytest.mark.parametrize("name", ["ndjson", "xlsx", "csv"])
+def test_text_capable_formats_keep_unparseable_date(tmp_path, result, name):
+    fmt = OUTPUT_FORMATS[name]
+    path = str(tmp_path / f"result.{fmt.extension}")
+
+    write_result(result, path, fmt)
+
+    assert read_result(path, fmt)["Date"].iloc[1] == "not a date"
+
+
+def test_ndjson_chunk_with_unparseable_date(result):
+    lines = encode_chunk(result, 0, 3, OUTPUT_FORMATS["ndjson"]).decode().splitlines()
+
+    assert [json.loads(line)["Date"] for line in lines] == [
+        "2025-06-01",
+        "not a date",
+        "2025-06-15",
+    ]
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from app.result_cache import ResultCache
+from app.toll_processor import TollProcessor
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.max_bytes = 1000
+    return cache
+
+
+def add_result(cache: ResultCache, name: str, size: int, age: float = 0) -> str:
+    path = os.path.join(cache.output_dir, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_repeated_upload_is_served_from_the_cache(client, statement_factory):
+    from app import main
+
+    content = statement_factory(rows=17, start_day=4)
+    before = main.result_cache.stats()
+    first = client.post("/process-toll-data", files={"file": ("a.xls", content)})
+    again = client.post("/process-toll-data", files={"file": ("b.xls", content)})
+    after = main.result_cache.stats()
+
+    assert first.status_code == again.status_code == 200
+    assert again.content == first.content
+    assert after["misses"] - before["misses"] == 1
+    assert after["local_hits"] - before["local_hits"] == 1
+
+
+def test_key_changes_with_the_processor_version(monkeypatch, statement, tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = cache.key(statement)
+    assert cache.key(statement) == key
+
+    path = tmp_path / "statement.xls"
+    path.write_bytes(statement)
+    assert cache.key(str(path)) == key
+
+    monkeypatch.setattr(TollProcessor, "VERSION", TollProcessor.VERSION + "-next")
+    assert cache.key(statement) != key
+    assert cache.output_filename(cache.key(statement)) != cache.output_filename(key)
+
+
+def test_eviction_drops_oldest_results_over_the_size_limit(cache):
+    oldest = add_result(cache, "processed_toll_data_a.csv", 400, age=300)
+    older = add_result(cache, "processed_toll_data_b.parquet", 400, age=200)
+    newer = add_result(cache, "processed_toll_data_c.csv", 400, age=100)
+    unrelated = add_result(cache, "notes.txt", 5000, age=400)
+
+    cache.evict()
+    assert [os.path.exists(p) for p in (oldest, older, newer, unrelated)] == [
+        False, True, True, True
+    ]
+    assert cache.evictions == 1
+
+
+def test_eviction_drops_expired_results_and_spares_the_kept_one(cache):
+    expired = add_result(cache, "processed_toll_data_a.csv", 10, age=cache.max_age + 60)
+    kept = add_result(cache, "processed_toll_data_b.csv", 10, age=cache.max_age + 60)
+    fresh = add_result(cache, "processed_toll_data_c.csv", 10)
+
+    cache.evict(keep="processed_toll_data_b.csv")
+    assert [os.path.exists(p) for p in (expired, kept, fresh)] == [False, True, True]
+
+
+def test_storing_a_result_evicts(cache):
+    old = add_result(cache, "processed_toll_data_a.csv", 600, age=100)
+    output_path = os.path.join(cache.output_dir, "processed_toll_data_b.csv")
+    temp_path = cache.temp_path(output_path)
+    with open(temp_path, "wb") as f:
+        f.write(b"x" * 600)
+
+    cache.store(temp_path, output_path)
+    assert os.path.exists(output_path) and not os.path.exists(temp_path)
+    assert not os.path.exists(old)
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import pandas as pd
+import pytest
+
+from app import result_stream
+from app.result_stream import stream_result
+
+
+class RecordingUpload:
+    """Stands in for S3MultipartUpload, noting the thread each call runs on"""
+
+    def __init__(self):
+        self.written = bytearray()
+        self.calls = []
+
+    def write(self, data: bytes) -> None:
+        self.written += data
+
+    def complete(self) -> bool:
+        self.calls.append(("complete", threading.current_thread()))
+        return True
+
+    def abort(self) -> None:
+        self.calls.append(("abort", threading.current_thread()))
+
+
+def frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Toll Route": [f"{n:04d}" for n in range(rows)],
+            "Total Amount": [65.0] * rows,
+            "Date": ["01/06/2025"] * rows,
+        }
+    )
+
+
+def test_interrupted_stream_aborts_upload_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(result_stream, "CSV_CHUNK_ROWS", 2)
+    upload = RecordingUpload()
+
+    async def read_first_chunk():
+        chunks = stream_result(frame(5), upload=upload)
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        return first, threading.current_thread()
+
+    first, loop_thread = asyncio.run(read_first_chunk())
+    assert first.startswith(b"Toll Route,Total Amount,Date")
+    [(call, thread)] = upload.calls
+    assert call == "abort"
+    assert thread is not loop_thread
+
+
+def test_finished_stream_completes_upload():
+    upload = RecordingUpload()
+    completed = []
+
+    async def on_complete(uploaded: bool):
+        completed.append(uploaded)
+
+    async def read_all():
+        return b"".join([chunk async for chunk in stream_result(
+            frame(3), upload=upload, on_complete=on_complete
+        )])
+
+    body = asyncio.run(read_all())
+    assert bytes(upload.written) == body
+    assert [call for call, _ in upload.calls] == ["complete"]
+    assert completed == [True]
+
+
+@pytest.mark.parametrize("name", ["csv", "ndjson"])
+def test_streamed_response_matches_the_file_response(client, statement_factory, name):
+    content = statement_factory(rows=50, start_day=10)
+
+    def process(**params):
+        return client.post(
+            "/process-toll-data",
+            params={"format": name, **params},
+            files={"file": ("statement.xls", content)},
+        )
+
+    streamed = process(stream_output="true")
+    stored = process()
+    assert streamed.status_code == stored.status_code == 200
+    assert streamed.content == stored.content
@@ -0,0 +1,39 @@
+import pytest
+
+from app.database import add_upload_record
+from app.main import find_user_result
+
+
+def record(db, user, processed_filename: str):
+    return add_upload_record(
+        db,
+        user_id=user.id,
+        original_filename="statement.xlsx",
+        processed_filename=processed_filename,
+        file_size=100,
+        s3_key=f"users/{user.id}/processed/{processed_filename}",
+    )
+
+
+@pytest.mark.parametrize(
+    "stored", ["june_2025.csv", "june_2025.parquet", "june_2025.xlsx"]
+)
+def test_finds_result_stored_in_any_format(db, user, stored):
+    record(db, user, stored)
+    found = find_user_result(db, user.id, "june_2025.ndjson")
+    assert found is not None and found.processed_filename == stored
+
+
+@pytest.mark.parametrize(
+    "stored", ["juneX2025.csv", "june_2025.backup.csv", "june_2025.txt"]
+)
+def test_other_names_are_not_matched(db, user, stored):
+    # "_" and "%" are LIKE wildcards and "." is followed by any extension there
+    record(db, user, stored)
+    assert find_user_result(db, user.id, "june_2025.csv") is None
+    assert find_user_result(db, user.id, "june%.csv") is None
+
+
+def test_results_of_other_users_are_not_matched(db, user):
+    record(db, user, "june_2025.csv")
+    assert find_user_result(db, user.id + 1, "june_2025.csv") is None
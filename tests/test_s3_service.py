@@ -0,0 +1,106 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from app import s3_service as s3_module
+from app.s3_service import S3Service
+
+
+class Clock:
+    """Wall clock the presigned URL cache reads, moved by hand"""
+
+    def __init__(self):
+        self.now = 1_750_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class SigningClient:
+    """Stand-in S3 client that signs each URL differently and counts calls"""
+
+    def __init__(self):
+        self.signed = 0
+        self.fail = False
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        if self.fail:
+            raise ClientError({"Error": {"Code": "AccessDenied"}}, operation)
+        self.signed += 1
+        return f"https://s3.test/{Params['Key']}?expires={ExpiresIn}&n={self.signed}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(s3_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def service(clock):
+    service = S3Service()
+    service.s3_client = SigningClient()
+    service.presigned_safety_margin = 300
+    return service
+
+
+def test_url_is_reused_until_the_safety_margin(service, clock):
+    url = service.generate_presigned_url("users/1/a.csv")
+    clock.now += 3600 - 301
+    assert service.generate_presigned_url("users/1/a.csv") == url
+    assert service.presign("users/1/a.csv") == (url, 301)
+
+    clock.now += 1
+    renewed = service.generate_presigned_url("users/1/a.csv")
+    assert renewed != url
+    assert service.s3_client.signed == 2
+    assert service.presigned_stats()["hits"] == 2
+    assert service.presigned_stats()["misses"] == 2
+
+
+def test_short_lived_urls_keep_half_their_lifetime(service, clock):
+    url = service.generate_presigned_url("users/1/a.csv", expiration=60)
+    clock.now += 30
+    assert service.generate_presigned_url("users/1/a.csv", expiration=60) != url
+
+
+def test_urls_are_cached_per_key_and_expiration(service):
+    urls = {
+        service.generate_presigned_url(key, expiration)
+        for key in ("users/1/a.csv", "users/1/b.csv")
+        for expiration in (600, 3600)
+    }
+    assert len(urls) == 4
+    assert service.generate_presigned_url("users/1/b.csv", 600) in urls
+    assert service.s3_client.signed == 4
+
+
+def test_least_recently_used_url_is_dropped_when_full(service):
+    service.presigned_cache_size = 2
+    first = service.generate_presigned_url("users/1/a.csv")
+    service.generate_presigned_url("users/1/b.csv")
+    # Using a.csv again makes b.csv the least recently used
+    assert service.generate_presigned_url("users/1/a.csv") == first
+    service.generate_presigned_url("users/1/c.csv")
+
+    assert service.presigned_stats()["size"] == 2
+    assert service.generate_presigned_url("users/1/a.csv") == first
+    signed = service.s3_client.signed
+    service.generate_presigned_url("users/1/b.csv")
+    assert service.s3_client.signed == signed + 1
+
+
+def test_batch_signs_each_distinct_key_once(service):
+    keys = ["users/1/a.csv", "users/1/b.csv", "users/1/a.csv"]
+    urls = service.generate_presigned_urls(keys)
+    assert list(urls) == ["users/1/a.csv", "users/1/b.csv"]
+    assert service.generate_presigned_urls(keys) == urls
+    assert service.s3_client.signed == 2
+
+
+def test_failed_signing_is_not_cached(service):
+    service.s3_client.fail = True
+    assert service.generate_presigned_url("users/1/a.csv") is None
+    service.s3_client.fail = False
+    assert service.generate_presigned_url("users/1/a.csv") is not None
+    assert service.presigned_stats()["size"] == 1
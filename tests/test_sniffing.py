@@ -0,0 +1,104 @@
+import codecs
+import io
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+from app.toll_processor import TollProcessor
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks")
+sys.path.insert(0, BENCHMARKS)
+
+from statements import FORMATS, StatementSpec, generate  # noqa: E402
+
+SPEC = StatementSpec(rows=60, date_format="dd-mon-yy", columns=2, days=5)
+
+# Parse plan each synthetic format should be given, from its content alone
+EXPECTED_PLANS = {
+    "xlsx": ("xlsx", None),
+    "xls": ("xls", None),
+    "html": ("html", None),
+    "spreadsheetml": ("spreadsheetml", None),
+    "csv": ("delimited", ","),
+    "tsv": ("delimited", "\t"),
+    "semicolon": ("delimited", ";"),
+    "pipe": ("delimited", "|"),
+}
+
+
+def process(content: bytes, filename: str) -> tuple[pd.DataFrame, TollProcessor]:
+    processor = TollProcessor()
+    return processor.process_excel_file(content, filename=filename), processor
+
+
+@pytest.fixture(scope="module")
+def expected() -> pd.DataFrame:
+    filename, content = generate("csv", SPEC)
+    return process(content, filename)[0]
+
+
+def reencoded(encoding: str, bom: bytes = b"") -> bytes:
+    """The comma delimited statement, with a non-ASCII plaza name"""
+    text = generate("csv", SPEC)[1].decode("utf-8").replace("PLAZA", "PLAZA ‘Ré’")
+    return bom + text.encode(encoding)
+
+
+def test_every_generated_format_is_covered():
+    assert set(EXPECTED_PLANS) == set(FORMATS)
+
+
+@pytest.mark.parametrize("fmt", list(EXPECTED_PLANS))
+def test_format_is_sniffed_from_content(fmt, expected):
+    filename, content = generate(fmt, SPEC)
+    result, processor = process(content, filename)
+    plan = processor.parse_plan
+    assert (plan.format, plan.delimiter) == EXPECTED_PLANS[fmt]
+    assert plan.source == "content"
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize(
+    "content, encoding",
+    [
+        (reencoded("utf-8", codecs.BOM_UTF8), "utf-8-sig"),
+        (reencoded("utf-16"), "utf-16"),
+        (reencoded("cp1252"), "cp1252"),
+    ],
+    ids=["utf-8-bom", "utf-16", "cp1252"],
+)
+def test_text_encoding_is_sniffed(content, encoding, expected):
+    result, processor = process(content, "statement.csv")
+    assert processor.parse_plan.encoding == encoding
+    assert processor.parse_plan.delimiter == ","
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_undefined_cp1252_bytes_fall_back_to_latin_1():
+    sample = b"SR NO,PLAZA\n1,Caf\x81\n"
+    assert TollProcessor()._sniff_encoding(sample) == "latin-1"
+
+
+@pytest.mark.parametrize(
+    "fmt, wrong_name",
+    [
+        ("xlsx", "statement.csv"),
+        ("csv", "statement.xlsx"),
+        ("html", "statement.xlsx"),
+        ("xls", "statement.txt"),
+    ],
+)
+def test_content_wins_over_a_wrong_extension(fmt, wrong_name, expected):
+    content = generate(fmt, SPEC)[1]
+    result, processor = process(content, wrong_name)
+    assert processor.parse_plan.format == EXPECTED_PLANS[fmt][0]
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_inconclusive_content_falls_back_to_the_extension():
+    # Markup that is neither HTML nor SpreadsheetML says nothing about the format
+    plan = TollProcessor()._detect_parse_plan(io.BytesIO(b"<statement/>"), "xls")
+    assert (plan.format, plan.source) == ("xls", "extension")
+    with pytest.raises(ValueError, match="Unrecognised file format"):
+        TollProcessor()._detect_parse_plan(io.BytesIO(b"<statement/>"), "pdf")
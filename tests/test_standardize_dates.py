@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from app.toll_processor import TollProcessor
+
+# Date cells as they come out of the statement exports, with the expected
+# dd/mm/yyyy output
+EXPORTED_DATES = [
+    ("30-Jul-25", "30/07/2025"),
+    ("01-Aug-25 14:05:09", "01/08/2025"),
+    ("02-Aug-2025", "02/08/2025"),
+    ("03/08/2025", "03/08/2025"),
+    ("04/08/2025 09:30:00", "04/08/2025"),
+    ("05-08-2025", "05/08/2025"),
+    ("06-08-2025 23:59:59", "06/08/2025"),
+    ("07/08/25", "07/08/2025"),
+    ("08-08-25", "08/08/2025"),
+    ("2025-08-09", "09/08/2025"),
+    (datetime(2025, 8, 10, 8, 0), "10/08/2025"),
+    (None, ""),
+    ("not a date", "not a date"),
+]
+
+
+@pytest.fixture
+def processor():
+    return TollProcessor()
+
+
+def test_bulk_formats_agree_with_the_per_value_path(processor):
+    values = pd.Series([value for value, _ in EXPORTED_DATES] * 3)
+    result = processor._standardize_dates(values)
+    assert result.tolist() == [expected for _, expected in EXPORTED_DATES] * 3
+
+    # The per-value path reads ISO text day first, which the bulk one fixes
+    per_value = values.map(processor._standardize_date_value)
+    is_iso = values.eq("2025-08-09")
+    assert result[~is_iso].tolist() == per_value[~is_iso].tolist()
+    assert set(per_value[is_iso]) == {"08/09/2025"}
+
+
+def test_iso_text_keeps_year_month_day(processor):
+    # Day-first parsing must not swap an ISO month and day
+    values = pd.Series(["2025-06-03", "2025-06-03 10:15:00", "2025-12-01"])
+    assert processor._standardize_dates(values).tolist() == [
+        "03/06/2025", "03/06/2025", "01/12/2025"
+    ]
+    assert processor.date_format_stats == {"ISO8601": 3}
+
+
+def test_mixed_day_month_and_month_day_column(processor):
+    # Mostly dd/mm/yyyy with a few mm/dd/yyyy rows that only fit month first
+    values = pd.Series(["05/06/2025", "13/06/2025", "06/14/2025", "07/06/2025"])
+    result = processor._standardize_dates(values)
+    assert result.tolist() == ["05/06/2025", "13/06/2025", "14/06/2025", "07/06/2025"]
+    assert processor.date_format_stats == {"%d/%m/%Y": 3, "fallback": 1}
+
+
+def test_result_keeps_the_input_index(processor):
+    # Filtered frames reach the date stage with gaps in their index
+    df = pd.DataFrame(
+        {"TRANSACTION_DATE": ["01-Jun-25", None, "03-Jun-25", "garbage"]},
+        index=[7, 3, 12, 40],
+    )
+    result = processor._standardize_dates(df["TRANSACTION_DATE"])
+    assert list(result.index) == [7, 3, 12, 40]
+    df["TRANSACTION_DATE"] = result
+    assert df["TRANSACTION_DATE"].tolist() == [
+        "01/06/2025", "", "03/06/2025", "garbage"
+    ]
+
+
+def test_datetime_column_is_formatted_directly(processor):
+    values = pd.Series(pd.to_datetime(["2025-06-03", None]), index=[5, 9])
+    result = processor._standardize_dates(values)
+    assert result.to_dict() == {5: "03/06/2025", 9: ""}
+    assert processor.date_format_stats == {"datetime": 1}
+
+
+def test_stats_count_rows_per_format(processor):
+    values = pd.Series(
+        ["01-Jun-25"] * 4 + ["02/06/2025"] * 2 + [datetime(2025, 6, 3)] + ["n/a"]
+    )
+    processor._standardize_dates(values)
+    assert processor.date_format_stats == {
+        "datetime": 1, "%d-%b-%y": 4, "%d/%m/%Y": 2, "fallback": 1
+    }
+
+
+def test_stats_cover_one_run(processor, statement):
+    processor.process_excel_file(statement, filename="statement.csv")
+    first = dict(processor.date_format_stats)
+    processor.process_excel_file(statement, filename="statement.csv")
+    assert processor.date_format_stats == first
+    assert sum(first.values()) > 0
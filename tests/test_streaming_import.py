@@ -0,0 +1,105 @@
+import io
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+from app.toll_processor import TollProcessor, process_to_frame
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks")
+sys.path.insert(0, BENCHMARKS)
+
+from statements import StatementSpec, generate  # noqa: E402
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    """Where read_upload spools streamed statements during the test"""
+    import tempfile
+
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(spool))
+    return spool
+
+
+def read_every_column(self, source, engine):
+    """The whole sheet, as read before imports were pruned to the needed columns"""
+    return pd.read_excel(
+        self._open_source(source), engine=engine, dtype=self.IMPORT_DTYPES
+    )
+
+
+@pytest.mark.parametrize("date_format", ["excel", "dd-mon-yy", "mixed"])
+def test_streamed_pruned_xlsx_matches_the_full_read(
+    tmp_path, monkeypatch, date_format
+):
+    # Wide rows, so pruning drops most of each one
+    spec = StatementSpec(rows=400, date_format=date_format, columns=7, cell_width=30)
+    filename, content = generate("xlsx", spec)
+    path = tmp_path / filename
+    path.write_bytes(content)
+
+    pruned, report = process_to_frame(content, filename=filename)
+    assert report["parser"]["engine"] == "openpyxl"
+    with monkeypatch.context() as patch:
+        patch.setattr(TollProcessor, "_read_required_columns", read_every_column)
+        full, _ = process_to_frame(content, filename=filename)
+    pd.testing.assert_frame_equal(pruned, full)
+
+    for source in (content, str(path)):
+        streamed, report = process_to_frame(source, filename=filename, streaming=True)
+        assert report["parser"]["engine"] == "openpyxl-streaming"
+        pd.testing.assert_frame_equal(streamed, full)
+
+
+def test_streamed_upload_is_spooled_and_removed(client, spool_dir, monkeypatch):
+    from app import main
+
+    spec = StatementSpec(rows=300, columns=4)
+    filename, content = generate("xlsx", spec)
+    spooled = []
+    spool_upload = main.spool_upload
+
+    def record(upload, max_size, suffix):
+        path, size = spool_upload(upload, max_size, suffix)
+        spooled.append((path, size))
+        return path, size
+
+    monkeypatch.setattr(main, "spool_upload", record)
+    monkeypatch.setattr(main, "UPLOAD_CHUNK_SIZE", 4096)
+
+    responses = [
+        client.post(
+            "/process-toll-data",
+            params={"streaming": streaming},
+            files={"file": (filename, content)},
+        )
+        for streaming in ("true", "false")
+    ]
+    assert [r.status_code for r in responses] == [200, 200]
+    streamed, full = (pd.read_csv(io.BytesIO(r.content)) for r in responses)
+    pd.testing.assert_frame_equal(streamed, full)
+
+    assert [(os.path.dirname(path), size) for path, size in spooled] == [
+        (str(spool_dir), len(content))
+    ]
+    assert os.listdir(spool_dir) == []
+
+
+def test_oversized_streamed_upload_is_refused_while_spooling(
+    client, spool_dir, monkeypatch
+):
+    from app import main
+
+    monkeypatch.setattr(main, "MAX_STREAMING_UPLOAD_SIZE", 10_000)
+    monkeypatch.setattr(main, "UPLOAD_CHUNK_SIZE", 4096)
+    filename, content = generate("xlsx", StatementSpec(rows=2000))
+    response = client.post(
+        "/process-toll-data",
+        params={"streaming": "true"},
+        files={"file": (filename, content)},
+    )
+    assert response.status_code == 413
+    assert os.listdir(spool_dir) == []
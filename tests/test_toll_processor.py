@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from app import toll_processor
+from app.toll_processor import process_to_csv, process_to_frame
+
+
+def test_helpers_run_copy_free_by_default(statement, monkeypatch):
+    built = []
+    init = toll_processor.TollProcessor.__init__
+
+    def record(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        built.append(self.copy_free)
+
+    monkeypatch.setattr(toll_processor.TollProcessor, "__init__", record)
+    process_to_frame(statement, filename="statement.csv")
+    assert built == [toll_processor.COPY_FREE] == [True]
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_copy_free_gives_the_same_result(statement, tmp_path, output_format):
+    outputs = []
+    for copy_free in (False, True):
+        output_path = tmp_path / f"{copy_free}.{output_format}"
+        report = process_to_csv(
+            statement,
+            str(output_path),
+            filename="statement.csv",
+            output_format=output_format,
+            copy_free=copy_free,
+        )
+        assert report["rows_out"] > 0
+        outputs.append(output_path.read_bytes())
+    assert outputs[0] == outputs[1]
+
+    df, _ = process_to_frame(statement, filename="statement.csv", copy_free=False)
+    copy_free_df, _ = process_to_frame(statement, filename="statement.csv")
+    pd.testing.assert_frame_equal(df, copy_free_df)
+
+
+def test_text_exports_get_the_excel_column_types():
+    header = ["SR NO", "TRANSACTION_DATE", "TRANSACTIONID", "TRANSACTIONTYPE",
+              "AMOUNT IN RS", "PLAZA"]
+    df = pd.DataFrame(
+        [
+            [1.0, "01-Jun-25", 1000000001.0, "Debit", "65", "A"],
+            [2.0, "N/A", "TXN0002", "", "70.5", "B"],
+            [3.0, "", "0003", "Credit", "", "C"],
+        ],
+        columns=header,
+    )
+    result = toll_processor.TollProcessor()._normalize_to_excel_types(df)
+
+    # Only the required columns are kept
+    assert list(result.columns) == header[1:5]
+    assert result["TRANSACTION_DATE"].tolist()[0] == "01-Jun-25"
+    assert result["TRANSACTION_DATE"].isna().tolist() == [False, True, True]
+    # Ids stay text, with whole numbers written as openpyxl reads them
+    assert result["TRANSACTIONID"].tolist() == ["1000000001", "TXN0002", "0003"]
+    assert result["TRANSACTIONTYPE"].isna().tolist() == [False, True, False]
+    assert result["AMOUNT IN RS"].dtype == "float64"
+    assert result["AMOUNT IN RS"].tolist()[:2] == [65.0, 70.5]
+
+
+def test_text_amounts_stay_text_unless_all_numeric():
+    df = pd.DataFrame(
+        {
+            "TRANSACTION_DATE": ["01-Jun-25", "02-Jun-25"],
+            "TRANSACTIONID": ["1", "2"],
+            "TRANSACTIONTYPE": ["Debit", "Debit"],
+            "AMOUNT IN RS": ["65", "sixty"],
+        }
+    )
+    result = toll_processor.TollProcessor()._normalize_to_excel_types(df)
+    assert result["AMOUNT IN RS"].tolist() == ["65", "sixty"]
+
+    df["AMOUNT IN RS"] = ["65", "70"]
+    result = toll_processor.TollProcessor()._normalize_to_excel_types(df)
+    assert result["AMOUNT IN RS"].dtype == "int64"